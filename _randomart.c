@@ -1,6 +1,9 @@
 #include <stdint.h>
 #include <math.h>
 #include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
 
 
 struct qcolor {
@@ -10,11 +13,54 @@ struct qcolor {
 };
 
 
+// Profiling, see randomart/profiling.py
+//
+// ra_profile_tree makes the nodes of a transforminfo tree count and time
+// their evaluations, subexpressions included, by swapping in an apply
+// function that wraps their own. While ra_profile_enabled is set the VM
+// counts and times every instruction it runs over a block. Counters are
+// updated atomically, so threaded renders can be profiled too; unprofiled
+// trees and programs never look at them.
+
+struct transforminfo;
+
+struct ra_profile_counter {
+    uint64_t calls;
+    uint64_t nanos;
+    // the node's own apply, while profiled
+    struct qcolor (* apply)(struct transforminfo *info, double x, double y);
+};
+
+
+static int ra_profile_enabled = 0;
+
+
+static inline uint64_t ra_profile_clock(void) {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (uint64_t) ts.tv_sec * 1000000000u + ts.tv_nsec;
+}
+
+
+static inline void ra_profile_count(
+    struct ra_profile_counter *counter, uint64_t calls, uint64_t start
+) {
+    __sync_fetch_and_add(&counter->calls, calls);
+    __sync_fetch_and_add(&counter->nanos, ra_profile_clock() - start);
+}
+
+
+void ra_profile_set(int enabled) {
+    ra_profile_enabled = enabled;
+}
+
+
 struct transforminfo {
     struct qcolor (* apply)(struct transforminfo *info, double x, double y);
     int (* inspect)(struct transforminfo *info, char *buf, size_t buflen);
     struct transforminfo* subslots[4];
     char data[80];
+    struct ra_profile_counter profile;
 };
 
 
@@ -41,13 +87,42 @@ struct ra_level_data {
 };
 
 
-inline double well(double x) {
+static inline double well(double x) {
     return 1.0 - 2.0 / pow(1 + x * x, 8);
 }
 
 
-inline double tent(double x) {
-    return 1.0 - 2.0 * abs(x);
+static inline double tent(double x) {
+    return 1.0 - 2.0 * fabs(x);
+}
+
+
+// Matches qcolor._color_quantize: max(0, min(255, int(128 * (val + 1))))
+static inline uint8_t quantize(double val) {
+    double scaled = 128 * (val + 1);
+    if (!(scaled >= 0.0)) {
+        return 0;
+    }
+    if (scaled >= 255.0) {
+        return 255;
+    }
+    return (uint8_t) scaled;
+}
+
+
+// Matches BaseArt.get_pixel for a square size of 1
+static inline double pixel_coord(int pos, int size) {
+    return 2.0 * pos / size - 1.0;
+}
+
+
+// Inverse of pixel_coord, or -1 if `coord` is not exactly a pixel position
+static inline int pixel_index(double coord, int size) {
+    int pos = (int) floor((coord + 1.0) * size / 2.0 + 0.5);
+    if (pos < 0 || pos >= size || pixel_coord(pos, size) != coord) {
+        return -1;
+    }
+    return pos;
 }
 
 
@@ -56,6 +131,33 @@ struct qcolor ra_transforminfo_apply(struct transforminfo *info, double x, doubl
 }
 
 
+static struct qcolor ra_profile_apply(struct transforminfo *info, double x, double y) {
+    uint64_t start = ra_profile_clock();
+    struct qcolor out = info->profile.apply(info, x, y);
+    ra_profile_count(&info->profile, 1, start);
+    return out;
+}
+
+
+void ra_profile_tree(struct transforminfo *info, int enabled) {
+    int i;
+    if (enabled && info->apply != &ra_profile_apply) {
+        info->profile.apply = info->apply;
+        info->apply = &ra_profile_apply;
+    } else if (!enabled && info->apply == &ra_profile_apply) {
+        info->apply = info->profile.apply;
+    } else {
+        // already done, through another parent of a shared node
+        return;
+    }
+    for (i = 0; i < 4; i++) {
+        if (info->subslots[i] != NULL) {
+            ra_profile_tree(info->subslots[i], enabled);
+        }
+    }
+}
+
+
 void qcolor_average(struct qcolor c1, struct qcolor c2, double weight, struct qcolor *output) {
     output->r = weight * c1.r + (1 - weight) * c2.r;
     output->g = weight * c1.g + (1 - weight) * c2.g;
@@ -116,6 +218,138 @@ void qcolor_level(
 }
 
 
+// Array-at-a-time kernels
+//
+// Batch counterparts of the qcolor_* functions above, over n points. Each
+// color is passed as three separate channel buffers of n doubles, so callers
+// can hand over the arrays they already hold, and the loops run over one
+// channel at a time with independent iterations that the compiler can
+// vectorize. The output may be one of the inputs.
+
+struct qcolor_soa {
+    double *c[3];
+};
+
+
+void qcolor_average_n(
+    size_t n, struct qcolor_soa c1, struct qcolor_soa c2, double weight,
+    struct qcolor_soa out
+) {
+    size_t c, i;
+    for (c = 0; c < 3; c++) {
+        const double *a = c1.c[c], *b = c2.c[c];
+        double *d = out.c[c];
+        for (i = 0; i < n; i++) {
+            d[i] = weight * a[i] + (1 - weight) * b[i];
+        }
+    }
+}
+
+
+// qcolor_average_n with a weight per point
+void qcolor_average_weights_n(
+    size_t n, struct qcolor_soa c1, struct qcolor_soa c2,
+    const double *weights, struct qcolor_soa out
+) {
+    size_t c, i;
+    for (c = 0; c < 3; c++) {
+        const double *a = c1.c[c], *b = c2.c[c];
+        double *d = out.c[c];
+        for (i = 0; i < n; i++) {
+            d[i] = weights[i] * a[i] + (1 - weights[i]) * b[i];
+        }
+    }
+}
+
+
+void qcolor_tent_n(size_t n, struct qcolor_soa c1, struct qcolor_soa out) {
+    size_t c, i;
+    for (c = 0; c < 3; c++) {
+        const double *a = c1.c[c];
+        double *d = out.c[c];
+        for (i = 0; i < n; i++) {
+            d[i] = tent(a[i]);
+        }
+    }
+}
+
+
+void qcolor_well_n(size_t n, struct qcolor_soa c1, struct qcolor_soa out) {
+    size_t c, i;
+    for (c = 0; c < 3; c++) {
+        const double *a = c1.c[c];
+        double *d = out.c[c];
+        for (i = 0; i < n; i++) {
+            d[i] = well(a[i]);
+        }
+    }
+}
+
+
+void qcolor_product_n(
+    size_t n, struct qcolor_soa c1, struct qcolor_soa c2,
+    struct qcolor_soa out
+) {
+    size_t c, i;
+    for (c = 0; c < 3; c++) {
+        const double *a = c1.c[c], *b = c2.c[c];
+        double *d = out.c[c];
+        for (i = 0; i < n; i++) {
+            d[i] = a[i] * b[i];
+        }
+    }
+}
+
+
+void qcolor_mod_n(
+    size_t n, struct qcolor_soa c1, struct qcolor_soa c2,
+    struct qcolor_soa out
+) {
+    size_t i;
+    // reads across channels, so each point is gathered before it is written
+    for (i = 0; i < n; i++) {
+        struct qcolor a = {c1.c[0][i], c1.c[1][i], c1.c[2][i]};
+        struct qcolor b = {c2.c[0][i], c2.c[1][i], c2.c[2][i]};
+        struct qcolor d;
+        qcolor_mod(a, b, &d);
+        out.c[0][i] = d.r;
+        out.c[1][i] = d.g;
+        out.c[2][i] = d.b;
+    }
+}
+
+
+void qcolor_sin_n(
+    size_t n, struct qcolor_soa c1, double phase, double freq,
+    struct qcolor_soa out
+) {
+    size_t c, i;
+    for (c = 0; c < 3; c++) {
+        const double *a = c1.c[c];
+        double *d = out.c[c];
+        for (i = 0; i < n; i++) {
+            d[i] = sin(phase + freq * a[i]);
+        }
+    }
+}
+
+
+void qcolor_level_n(
+    size_t n, double threshold, struct qcolor_soa c1,
+    struct qcolor_soa c2, struct qcolor_soa c3,
+    struct qcolor_soa out
+) {
+    size_t c, i;
+    for (c = 0; c < 3; c++) {
+        const double *l = c1.c[c], *a = c2.c[c], *b = c3.c[c];
+        double *d = out.c[c];
+        for (i = 0; i < n; i++) {
+            d[i] = l[i] < threshold ? a[i] : b[i];
+        }
+    }
+}
+
+
 struct qcolor ra_variable_x(struct transforminfo *info, double x, double y) {
     struct qcolor out;
     out.r = x;
@@ -410,4 +644,728 @@ void ra_mix_init(
     info->subslots[0] = w;
     info->subslots[1] = e1;
     info->subslots[2] = e2;
-}
\ No newline at end of file
+}
+
+
+// Renders the region [x0, x0 + width) x [y0, y0 + height) of a
+// size_x x size_y image into `out` as row-major RGB triples, as used by PIL.
+// Each axis spans [-1, 1] whatever the aspect ratio.
+void ra_render_rgb(
+    struct transforminfo *info, int size_x, int size_y,
+    int x0, int y0, int width, int height,
+    uint8_t *out
+) {
+    int x, y;
+    for (y = 0; y < height; y++) {
+        double v = pixel_coord(y0 + y, size_y);
+        uint8_t *row = out + (size_t) y * width * 3;
+        for (x = 0; x < width; x++) {
+            double u = pixel_coord(x0 + x, size_x);
+            struct qcolor c = ra_transforminfo_apply(info, u, v);
+            row[3 * x + 0] = quantize(c.r);
+            row[3 * x + 1] = quantize(c.g);
+            row[3 * x + 2] = quantize(c.b);
+        }
+    }
+}
+
+
+// Renders the same region into `out` as column-major packed 0xRRGGBB
+// values, matching the layout of MemorySlabArt.target.
+void ra_render_packed(
+    struct transforminfo *info, int size_x, int size_y,
+    int x0, int y0, int width, int height,
+    int32_t *out
+) {
+    int x, y;
+    for (x = 0; x < width; x++) {
+        double u = pixel_coord(x0 + x, size_x);
+        int32_t *column = out + (size_t) x * height;
+        for (y = 0; y < height; y++) {
+            double v = pixel_coord(y0 + y, size_y);
+            struct qcolor c = ra_transforminfo_apply(info, u, v);
+            column[y] = (quantize(c.r) << 16) | (quantize(c.g) << 8) | quantize(c.b);
+        }
+    }
+}
+
+
+// Shared subexpressions, see randomart/dag.py
+//
+// A shared node caches the last value of its subexpression, so that a DAG
+// evaluates it once per pixel however many parents it has. The cache is a
+// small thread-local table keyed by a per-node id that is never reused, so
+// threads rendering the same tree, and trees allocated at the address of a
+// freed one, never see each other's values.
+
+#define RA_SHARED_CACHE_SIZE 1024
+
+struct ra_shared_data {
+    uint64_t id;
+};
+
+
+struct ra_shared_entry {
+    uint64_t id;
+    double x;
+    double y;
+    struct qcolor value;
+};
+
+
+static __thread struct ra_shared_entry ra_shared_cache[RA_SHARED_CACHE_SIZE];
+static uint64_t ra_shared_next_id = 0;
+
+
+struct qcolor ra_shared(struct transforminfo *info, double x, double y) {
+    struct ra_shared_data *data = (struct ra_shared_data*) info->data;
+    struct ra_shared_entry *entry = &ra_shared_cache[data->id % RA_SHARED_CACHE_SIZE];
+
+    if (entry->id != data->id || entry->x != x || entry->y != y) {
+        struct qcolor value = ra_transforminfo_apply(info->subslots[0], x, y);
+        // evaluating the subexpression may have reused this entry
+        entry->id = data->id;
+        entry->x = x;
+        entry->y = y;
+        entry->value = value;
+    }
+    return entry->value;
+}
+
+
+int ra_shared_inspect(struct transforminfo *info, char *buf, size_t buflen) {
+    struct ra_shared_data *data = (struct ra_shared_data*) info->data;
+    return snprintf(buf, buflen, "ra_shared(id=%llu, ...)",
+        (unsigned long long) data->id);
+}
+
+
+void ra_shared_init(
+    struct transforminfo *info,
+    struct transforminfo *e1
+) {
+    struct ra_shared_data *data = (struct ra_shared_data*) info->data;
+
+    info->apply = &ra_shared;
+    info->inspect = &ra_shared_inspect;
+    info->subslots[0] = e1;
+    data->id = __sync_add_and_fetch(&ra_shared_next_id, 1);
+}
+
+
+// Lookup tables, see randomart/separable.py
+//
+// A subexpression that only depends on x (or y) is evaluated once per pixel
+// column (or row) into a table. Off the pixel grid of the table's size, the
+// subexpression is evaluated as usual.
+
+struct ra_lookup_data {
+    struct qcolor *table;
+    int32_t size;
+    int32_t axis;
+};
+
+
+struct qcolor ra_lookup(struct transforminfo *info, double x, double y) {
+    struct ra_lookup_data *data = (struct ra_lookup_data*) info->data;
+    int pos = pixel_index(data->axis == 0 ? x : y, data->size);
+
+    if (pos < 0) {
+        return ra_transforminfo_apply(info->subslots[0], x, y);
+    }
+    return data->table[pos];
+}
+
+
+int ra_lookup_inspect(struct transforminfo *info, char *buf, size_t buflen) {
+    struct ra_lookup_data *data = (struct ra_lookup_data*) info->data;
+    return snprintf(buf, buflen, "ra_lookup(axis=%c, size=%d, ...)",
+        data->axis == 0 ? 'x' : 'y', data->size);
+}
+
+
+void ra_lookup_init(
+    struct transforminfo *info,
+    int axis,
+    int size,
+    struct qcolor *table,
+    struct transforminfo *e1
+) {
+    struct ra_lookup_data *data = (struct ra_lookup_data*) info->data;
+
+    info->apply = &ra_lookup;
+    info->inspect = &ra_lookup_inspect;
+    info->subslots[0] = e1;
+    data->table = table;
+    data->size = size;
+    data->axis = axis;
+}
+
+
+// Flat postfix programs, see randomart/program.py
+//
+// Each instruction writes one register of the register file from up to
+// three source registers and a run of constants. The interpreter executes
+// every instruction over a block of pixels before moving to the next one,
+// so the dispatch cost is shared by the whole block.
+
+#define RA_VM_BLOCK 64
+
+enum ra_opcode {
+    RA_OP_VAR_X = 0,
+    RA_OP_VAR_Y = 1,
+    RA_OP_CONSTANT = 2,
+    RA_OP_SUM = 3,
+    RA_OP_PRODUCT = 4,
+    RA_OP_MOD = 5,
+    RA_OP_WELL = 6,
+    RA_OP_TENT = 7,
+    RA_OP_SIN = 8,
+    RA_OP_LEVEL = 9,
+    RA_OP_MIX = 10,
+    RA_OP_LOOKUP_GUARD = 11,
+    RA_OP_LOOKUP = 12,
+    RA_OP_COUNT
+};
+
+
+// per opcode, in pixels evaluated
+static struct ra_profile_counter ra_vm_profile[RA_OP_COUNT];
+
+
+// Copies the VM's counters into `out`, RA_OP_COUNT of them, and with
+// `reset` zeroes them. Returns RA_OP_COUNT.
+int ra_profile_vm(struct ra_profile_counter *out, int reset) {
+    int op;
+    for (op = 0; op < RA_OP_COUNT; op++) {
+        out[op].calls = __sync_fetch_and_and(
+            &ra_vm_profile[op].calls, reset ? 0 : ~(uint64_t) 0);
+        out[op].nanos = __sync_fetch_and_and(
+            &ra_vm_profile[op].nanos, reset ? 0 : ~(uint64_t) 0);
+    }
+    return RA_OP_COUNT;
+}
+
+
+struct ra_insn {
+    int32_t opcode;
+    int32_t dst;
+    int32_t src[3];
+    int32_t constant;
+};
+
+
+struct ra_program {
+    struct ra_insn *code;
+    int32_t length;
+    double *constants;
+    int32_t registers;
+};
+
+
+// register r, channel c of a block-sized register file
+#define RA_VM_REG(regs, r, c) ((regs) + ((r) * 3 + (c)) * RA_VM_BLOCK)
+
+
+static void ra_vm_run_block(
+    struct ra_program *prog, int n,
+    const double *xs, const double *ys,
+    double *regs
+) {
+    int pc, c, i;
+    int profiling = ra_profile_enabled;
+    uint64_t start = 0;
+    for (pc = 0; pc < prog->length; pc++) {
+        struct ra_insn *insn = &prog->code[pc];
+        const double *k = prog->constants + insn->constant;
+        if (profiling) {
+            start = ra_profile_clock();
+        }
+
+        switch (insn->opcode) {
+        case RA_OP_VAR_X:
+        case RA_OP_VAR_Y: {
+            const double *src = insn->opcode == RA_OP_VAR_X ? xs : ys;
+            for (c = 0; c < 3; c++) {
+                double *d = RA_VM_REG(regs, insn->dst, c);
+                for (i = 0; i < n; i++) {
+                    d[i] = src[i];
+                }
+            }
+            break;
+        }
+        case RA_OP_CONSTANT:
+            for (c = 0; c < 3; c++) {
+                double *d = RA_VM_REG(regs, insn->dst, c);
+                for (i = 0; i < n; i++) {
+                    d[i] = k[c];
+                }
+            }
+            break;
+        case RA_OP_SUM:
+        case RA_OP_PRODUCT:
+            for (c = 0; c < 3; c++) {
+                double *d = RA_VM_REG(regs, insn->dst, c);
+                const double *a = RA_VM_REG(regs, insn->src[0], c);
+                const double *b = RA_VM_REG(regs, insn->src[1], c);
+                if (insn->opcode == RA_OP_SUM) {
+                    for (i = 0; i < n; i++) {
+                        d[i] = 0.5 * a[i] + 0.5 * b[i];
+                    }
+                } else {
+                    for (i = 0; i < n; i++) {
+                        d[i] = a[i] * b[i];
+                    }
+                }
+            }
+            break;
+        case RA_OP_WELL:
+        case RA_OP_TENT:
+            for (c = 0; c < 3; c++) {
+                double *d = RA_VM_REG(regs, insn->dst, c);
+                const double *a = RA_VM_REG(regs, insn->src[0], c);
+                if (insn->opcode == RA_OP_WELL) {
+                    for (i = 0; i < n; i++) {
+                        d[i] = well(a[i]);
+                    }
+                } else {
+                    for (i = 0; i < n; i++) {
+                        d[i] = tent(a[i]);
+                    }
+                }
+            }
+            break;
+        case RA_OP_SIN:
+            for (c = 0; c < 3; c++) {
+                double *d = RA_VM_REG(regs, insn->dst, c);
+                const double *a = RA_VM_REG(regs, insn->src[0], c);
+                for (i = 0; i < n; i++) {
+                    d[i] = sin(k[0] + k[1] * a[i]);
+                }
+            }
+            break;
+        case RA_OP_LEVEL:
+            for (c = 0; c < 3; c++) {
+                double *d = RA_VM_REG(regs, insn->dst, c);
+                const double *l = RA_VM_REG(regs, insn->src[0], c);
+                const double *a = RA_VM_REG(regs, insn->src[1], c);
+                const double *b = RA_VM_REG(regs, insn->src[2], c);
+                for (i = 0; i < n; i++) {
+                    d[i] = l[i] < k[0] ? a[i] : b[i];
+                }
+            }
+            break;
+        case RA_OP_LOOKUP_GUARD:
+        case RA_OP_LOOKUP: {
+            // constants are axis, size, then the table of colors; the guard
+            // skips the fallback code when the whole block is in the table
+            const double *pos = k[0] == 0 ? xs : ys;
+            int size = (int) k[1];
+            if (insn->opcode == RA_OP_LOOKUP_GUARD) {
+                for (i = 0; i < n && pixel_index(pos[i], size) >= 0; i++) {
+                }
+                if (i == n) {
+                    pc += insn->src[0];
+                }
+                break;
+            }
+            for (i = 0; i < n; i++) {
+                int p = pixel_index(pos[i], size);
+                if (p >= 0) {
+                    for (c = 0; c < 3; c++) {
+                        RA_VM_REG(regs, insn->dst, c)[i] = k[2 + 3 * p + c];
+                    }
+                }
+            }
+            break;
+        }
+        case RA_OP_MOD:
+        case RA_OP_MIX:
+            // These read across channels, and dst may alias a source, so
+            // gather each pixel before writing it.
+            for (i = 0; i < n; i++) {
+                struct qcolor c1, c2, out;
+                int s = insn->opcode == RA_OP_MIX ? 1 : 0;
+                c1.r = RA_VM_REG(regs, insn->src[s], 0)[i];
+                c1.g = RA_VM_REG(regs, insn->src[s], 1)[i];
+                c1.b = RA_VM_REG(regs, insn->src[s], 2)[i];
+                c2.r = RA_VM_REG(regs, insn->src[s + 1], 0)[i];
+                c2.g = RA_VM_REG(regs, insn->src[s + 1], 1)[i];
+                c2.b = RA_VM_REG(regs, insn->src[s + 1], 2)[i];
+                if (insn->opcode == RA_OP_MIX) {
+                    double w = RA_VM_REG(regs, insn->src[0], 0)[i];
+                    qcolor_average(c1, c2, 0.5 * (w + 1.0), &out);
+                } else {
+                    qcolor_mod(c1, c2, &out);
+                }
+                RA_VM_REG(regs, insn->dst, 0)[i] = out.r;
+                RA_VM_REG(regs, insn->dst, 1)[i] = out.g;
+                RA_VM_REG(regs, insn->dst, 2)[i] = out.b;
+            }
+            break;
+        }
+        if (profiling) {
+            ra_profile_count(&ra_vm_profile[insn->opcode], n, start);
+        }
+    }
+}
+
+
+static double *ra_vm_alloc_registers(struct ra_program *prog) {
+    return malloc(sizeof(double) * 3 * RA_VM_BLOCK * (prog->registers + 1));
+}
+
+
+// Evaluates the program at n points, writing one qcolor per point.
+// Returns 0 on success and -1 if the register file can't be allocated.
+int ra_program_eval(
+    struct ra_program *prog, int n,
+    const double *xs, const double *ys,
+    struct qcolor *out
+) {
+    double *regs = ra_vm_alloc_registers(prog);
+    int start, i;
+    if (regs == NULL) {
+        return -1;
+    }
+    for (start = 0; start < n; start += RA_VM_BLOCK) {
+        int count = n - start < RA_VM_BLOCK ? n - start : RA_VM_BLOCK;
+        ra_vm_run_block(prog, count, xs + start, ys + start, regs);
+        for (i = 0; i < count; i++) {
+            out[start + i].r = RA_VM_REG(regs, 0, 0)[i];
+            out[start + i].g = RA_VM_REG(regs, 0, 1)[i];
+            out[start + i].b = RA_VM_REG(regs, 0, 2)[i];
+        }
+    }
+    free(regs);
+    return 0;
+}
+
+
+// Program counterpart of ra_render_rgb.
+int ra_program_render_rgb(
+    struct ra_program *prog, int size_x, int size_y,
+    int x0, int y0, int width, int height,
+    uint8_t *out
+) {
+    double xs[RA_VM_BLOCK], ys[RA_VM_BLOCK];
+    double *regs = ra_vm_alloc_registers(prog);
+    int x, y, i;
+    if (regs == NULL) {
+        return -1;
+    }
+    for (y = 0; y < height; y++) {
+        uint8_t *row = out + (size_t) y * width * 3;
+        for (i = 0; i < RA_VM_BLOCK; i++) {
+            ys[i] = pixel_coord(y0 + y, size_y);
+        }
+        for (x = 0; x < width; x += RA_VM_BLOCK) {
+            int count = width - x < RA_VM_BLOCK ? width - x : RA_VM_BLOCK;
+            for (i = 0; i < count; i++) {
+                xs[i] = pixel_coord(x0 + x + i, size_x);
+            }
+            ra_vm_run_block(prog, count, xs, ys, regs);
+            for (i = 0; i < count; i++) {
+                row[3 * (x + i) + 0] = quantize(RA_VM_REG(regs, 0, 0)[i]);
+                row[3 * (x + i) + 1] = quantize(RA_VM_REG(regs, 0, 1)[i]);
+                row[3 * (x + i) + 2] = quantize(RA_VM_REG(regs, 0, 2)[i]);
+            }
+        }
+    }
+    free(regs);
+    return 0;
+}
+
+
+// Program counterpart of ra_render_packed.
+int ra_program_render_packed(
+    struct ra_program *prog, int size_x, int size_y,
+    int x0, int y0, int width, int height,
+    int32_t *out
+) {
+    double xs[RA_VM_BLOCK], ys[RA_VM_BLOCK];
+    double *regs = ra_vm_alloc_registers(prog);
+    int x, y, i;
+    if (regs == NULL) {
+        return -1;
+    }
+    for (x = 0; x < width; x++) {
+        int32_t *column = out + (size_t) x * height;
+        for (i = 0; i < RA_VM_BLOCK; i++) {
+            xs[i] = pixel_coord(x0 + x, size_x);
+        }
+        for (y = 0; y < height; y += RA_VM_BLOCK) {
+            int count = height - y < RA_VM_BLOCK ? height - y : RA_VM_BLOCK;
+            for (i = 0; i < count; i++) {
+                ys[i] = pixel_coord(y0 + y + i, size_y);
+            }
+            ra_vm_run_block(prog, count, xs, ys, regs);
+            for (i = 0; i < count; i++) {
+                column[y + i] =
+                    (quantize(RA_VM_REG(regs, 0, 0)[i]) << 16) |
+                    (quantize(RA_VM_REG(regs, 0, 1)[i]) << 8) |
+                    quantize(RA_VM_REG(regs, 0, 2)[i]);
+            }
+        }
+    }
+    free(regs);
+    return 0;
+}
+
+
+// Arena-built trees, see formats.ra_arena
+//
+// ra_arena_build decodes the body of one record of the binary format of
+// randomart/serial.py and lays out all of its nodes in a single allocation,
+// each after its subexpressions, so in the order a render first reaches
+// them, followed by the tables of its lookup nodes. A first pass over the
+// record validates it and sizes the arena, a second fills it in. The whole
+// tree is released by one call to ra_arena_free.
+
+#define RA_TAG_CONSTANT 2
+#define RA_TAG_SIN 8
+#define RA_TAG_LEVEL 9
+#define RA_TAG_SHARED 11
+#define RA_TAG_LOOKUP 12
+#define RA_TAG_REF 255
+
+// the limits of randomart/serial.py, MAX_DEPTH and MAX_LOOKUP_SIZE, so both
+// decoders accept the same records
+#define RA_ARENA_MAX_DEPTH 400
+#define RA_ARENA_MAX_TABLE (1 << 24)
+
+#define RA_ARENA_MALFORMED (-1)
+#define RA_ARENA_NOMEM (-2)
+
+static const int ra_tag_arity[] = {0, 0, 0, 2, 2, 2, 1, 1, 1, 3, 3, 1, 1};
+
+
+struct ra_arena {
+    struct transforminfo *root;
+    size_t count;
+    struct transforminfo *nodes;
+    struct qcolor *tables;
+};
+
+
+struct ra_decoder {
+    const uint8_t *data;
+    size_t offset;
+    size_t length;
+    int depth;
+    // NULL during the first pass
+    struct ra_arena *arena;
+    size_t nodes;
+    size_t entries;
+    // shared nodes by number, NULL until decoded
+    struct transforminfo **shared;
+    size_t shared_count;
+    size_t shared_size;
+};
+
+
+// a stand-in for decoded nodes during the first pass
+static struct transforminfo ra_arena_placeholder;
+
+
+static int ra_read(struct ra_decoder *d, void *out, size_t size) {
+    if (d->length - d->offset < size) {
+        return RA_ARENA_MALFORMED;
+    }
+    memcpy(out, d->data + d->offset, size);
+    d->offset += size;
+    return 0;
+}
+
+
+static int ra_read_u32(struct ra_decoder *d, uint32_t *out) {
+    uint8_t b[4];
+    if (ra_read(d, b, 4)) {
+        return RA_ARENA_MALFORMED;
+    }
+    *out = b[0] | (b[1] << 8) | (b[2] << 16) | ((uint32_t) b[3] << 24);
+    return 0;
+}
+
+
+static int ra_read_double(struct ra_decoder *d, double *out) {
+    uint8_t b[8];
+    uint64_t bits = 0;
+    int i;
+    if (ra_read(d, b, 8)) {
+        return RA_ARENA_MALFORMED;
+    }
+    for (i = 7; i >= 0; i--) {
+        bits = (bits << 8) | b[i];
+    }
+    memcpy(out, &bits, 8);
+    return 0;
+}
+
+
+static int ra_decode_node(struct ra_decoder *d, struct transforminfo **out) {
+    struct transforminfo *sub[3];
+    struct transforminfo *info;
+    double k[3];
+    uint8_t tag, axis = 0;
+    uint32_t size = 0, index = 0;
+    int i, n = 0, status;
+
+    if (ra_read(d, &tag, 1)) {
+        return RA_ARENA_MALFORMED;
+    }
+    if (tag == RA_TAG_REF) {
+        if (ra_read_u32(d, &index) || index >= d->shared_count ||
+                d->shared[index] == NULL) {
+            return RA_ARENA_MALFORMED;
+        }
+        *out = d->shared[index];
+        return 0;
+    }
+    if (tag >= sizeof(ra_tag_arity) / sizeof(ra_tag_arity[0])) {
+        return RA_ARENA_MALFORMED;
+    }
+    if (tag == RA_TAG_CONSTANT) {
+        n = 3;
+    } else if (tag == RA_TAG_SIN) {
+        n = 2;
+    } else if (tag == RA_TAG_LEVEL) {
+        n = 1;
+    }
+    for (i = 0; i < n; i++) {
+        if (ra_read_double(d, &k[i])) {
+            return RA_ARENA_MALFORMED;
+        }
+    }
+    if (tag == RA_TAG_LOOKUP) {
+        if (ra_read(d, &axis, 1) || ra_read_u32(d, &size) || axis > 1 ||
+                size == 0 || size > RA_ARENA_MAX_TABLE) {
+            return RA_ARENA_MALFORMED;
+        }
+    }
+    if (tag == RA_TAG_SHARED) {
+        // numbered on first occurrence, before its subexpression
+        if (d->shared_count == d->shared_size) {
+            size_t grown = d->shared_size ? 2 * d->shared_size : 16;
+            struct transforminfo **shared = realloc(
+                d->shared, grown * sizeof(*shared));
+            if (shared == NULL) {
+                return RA_ARENA_NOMEM;
+            }
+            d->shared = shared;
+            d->shared_size = grown;
+        }
+        index = d->shared_count++;
+        d->shared[index] = NULL;
+    }
+    if (++d->depth > RA_ARENA_MAX_DEPTH) {
+        return RA_ARENA_MALFORMED;
+    }
+    for (i = 0; i < ra_tag_arity[tag]; i++) {
+        if ((status = ra_decode_node(d, &sub[i]))) {
+            return status;
+        }
+    }
+    d->depth--;
+
+    if (d->arena == NULL) {
+        info = &ra_arena_placeholder;
+        d->nodes++;
+        d->entries += size;
+    } else {
+        info = &d->arena->nodes[d->nodes++];
+        switch (tag) {
+        case 0: ra_variable_x_init(info); break;
+        case 1: ra_variable_y_init(info); break;
+        case 2: ra_constant_init(info, k[0], k[1], k[2]); break;
+        case 3: ra_sum_init(info, sub[0], sub[1]); break;
+        case 4: ra_product_init(info, sub[0], sub[1]); break;
+        case 5: ra_mod_init(info, sub[0], sub[1]); break;
+        case 6: ra_well_init(info, sub[0]); break;
+        case 7: ra_tent_init(info, sub[0]); break;
+        case 8: ra_sin_init(info, k[0], k[1], sub[0]); break;
+        case 9: ra_level_init(info, k[0], sub[0], sub[1], sub[2]); break;
+        case 10: ra_mix_init(info, sub[0], sub[1], sub[2]); break;
+        case 11: ra_shared_init(info, sub[0]); break;
+        case 12: {
+            // as Lookup.reify, with the entries at Lookup.coords
+            struct qcolor *table = d->arena->tables + d->entries;
+            uint32_t pos;
+            d->entries += size;
+            for (pos = 0; pos < size; pos++) {
+                double coord = pixel_coord(pos, size);
+                table[pos] = axis == 0
+                    ? ra_transforminfo_apply(sub[0], coord, 0.0)
+                    : ra_transforminfo_apply(sub[0], 0.0, coord);
+            }
+            ra_lookup_init(info, axis, size, table, sub[0]);
+            break;
+        }
+        }
+    }
+    if (tag == RA_TAG_SHARED) {
+        d->shared[index] = info;
+    }
+    *out = info;
+    return 0;
+}
+
+
+static int ra_decode(
+    struct ra_decoder *d, const uint8_t *data, size_t length,
+    struct ra_arena *arena, struct transforminfo **root
+) {
+    int status;
+    d->data = data;
+    d->offset = 0;
+    d->length = length;
+    d->depth = 0;
+    d->arena = arena;
+    d->nodes = 0;
+    d->entries = 0;
+    d->shared_count = 0;
+    status = ra_decode_node(d, root);
+    if (status == 0 && d->offset != length) {
+        status = RA_ARENA_MALFORMED;
+    }
+    return status;
+}
+
+
+// Builds the tree of a record body into a new arena stored in *out.
+// Returns 0 on success, RA_ARENA_MALFORMED if the record is invalid and
+// RA_ARENA_NOMEM if memory runs out.
+int ra_arena_build(const uint8_t *data, size_t length, struct ra_arena **out) {
+    struct ra_decoder d;
+    struct ra_arena *arena;
+    struct transforminfo *root;
+    int status;
+
+    d.shared = NULL;
+    d.shared_size = 0;
+    status = ra_decode(&d, data, length, NULL, &root);
+    if (status) {
+        free(d.shared);
+        return status;
+    }
+    // one block: the header, the nodes, then the tables
+    arena = calloc(1, sizeof(struct ra_arena) +
+        d.nodes * sizeof(struct transforminfo) +
+        d.entries * sizeof(struct qcolor));
+    if (arena == NULL) {
+        free(d.shared);
+        return RA_ARENA_NOMEM;
+    }
+    arena->count = d.nodes;
+    arena->nodes = (struct transforminfo *) (arena + 1);
+    arena->tables = (struct qcolor *) (arena->nodes + d.nodes);
+    ra_decode(&d, data, length, arena, &arena->root);
+    free(d.shared);
+    *out = arena;
+    return 0;
+}
+
+
+void ra_arena_free(struct ra_arena *arena) {
+    free(arena);
+}
@@ -1,36 +1,59 @@
 #!/usr/bin/python
-import sys
-from time import time
-from itertools import count
-import random
-
-from PIL import Image
-from randomart import _PILArt, generate
-
-
-initial_count = 0
-if sys.argv[1:]:
-    initial_count = int(sys.argv[1], 16)
-
-
-def create_image(art_def, use_native, side_len):
-    image = Image.new("RGB", (side_len, side_len))
-    art_impl = _PILArt(image)
-    art_impl.set_art(art_def)
-    if use_native:
-        art_impl.reify()
-    art_impl.redraw()
-    return image
-
-
-for i in count(initial_count):
-    art_definition = generate(random.randrange(20, 150))
-    # print("processing %r" % art_definition)
-    # create_image(art_definition, False, 256).save('out/out%08x_p.png' % i)
-    # print('   out/out%08x_p.png written' % i)
-
-    t_i = time()
-    img = create_image(art_definition, True, 512)
-    t_f = time()
-    img.save('out/out%08x_n.png' % i)
-    print('   out/out%08x_n.png written (rendered in %gs)' % (i, t_f - t_i))
+import argparse
+
+from randomart.pipeline import run_pipeline, DEFAULT_QUEUE_SIZE
+from randomart.probe import Thresholds
+
+
+parser = argparse.ArgumentParser(
+    description="Render random art to out/outXXXXXXXX_n.png.")
+parser.add_argument('start', nargs='?', default='0',
+                    help="hex number of the first image")
+parser.add_argument('--count', type=int, default=None,
+                    help="number of images, forever by default")
+parser.add_argument('--size', type=int, default=512)
+# reify by default: compile and compile_python follow Mod.eval, which
+# renders differently from the native ra_mod
+parser.add_argument(
+    '--backend', default='reify',
+    choices=('reify', 'auto', 'compile', 'compile_python', 'eval'))
+parser.add_argument('--seed', type=lambda v: int(v, 0), default=None,
+                    help="64-bit seed; image i is the art of seed + i")
+parser.add_argument('--max-cost', type=float, default=None,
+                    help="skip trees estimated to take longer (seconds)")
+parser.add_argument('--probe', action='store_true',
+                    help="regenerate trees a low-resolution probe finds flat")
+parser.add_argument('--skip-degenerate', action='store_true',
+                    help="with --probe, skip flat trees instead")
+parser.add_argument('--min-variance', type=float, default=None)
+parser.add_argument('--min-colors', type=int, default=None)
+parser.add_argument('--min-edge-energy', type=float, default=None)
+parser.add_argument('--generators', type=int, default=1)
+parser.add_argument('--renderers', type=int, default=None,
+                    help="one per CPU by default")
+parser.add_argument('--encoders', type=int, default=1)
+parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE)
+args = parser.parse_args()
+
+thresholds = None
+if args.probe:
+    thresholds = Thresholds()._replace(**dict(
+        (name, value) for (name, value) in (
+            ('min_variance', args.min_variance),
+            ('min_distinct_colors', args.min_colors),
+            ('min_edge_energy', args.min_edge_energy))
+        if value is not None))
+
+
+def written(index, path):
+    print('   %s written' % path)
+
+
+stats = run_pipeline(
+    int(args.start, 16), args.count, args.size,
+    generators=args.generators, renderers=args.renderers,
+    encoders=args.encoders, queue_size=args.queue_size,
+    backend=None if args.backend == 'eval' else args.backend,
+    seed=args.seed, max_cost=args.max_cost, thresholds=thresholds,
+    regenerate=not args.skip_degenerate, progress=written)
+print(stats.summary())
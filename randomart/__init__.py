@@ -82,12 +82,22 @@ import math
 import random
 import cPickle as pickle
 from .formats import qcolor
-from . import formats
+from . import formats, profiling
+from .program import (
+    compile_art,
+    OP_VAR_X, OP_VAR_Y, OP_CONSTANT,
+    OP_SUM, OP_PRODUCT, OP_MOD,
+    OP_WELL, OP_TENT, OP_SIN,
+    OP_LEVEL, OP_MIX)
 from .transforms import (
     average_impl, tent_impl,
     well_impl, prod_impl,
     mod_impl, sin_impl,
-    level_impl)
+    level_impl,
+    grid_constant_impl, grid_average_impl,
+    grid_tent_impl, grid_well_impl,
+    grid_prod_impl, grid_mod_impl,
+    grid_sin_impl, grid_level_impl)
 
 
 # We next define classes that represent expression trees.
@@ -96,10 +106,24 @@ from .transforms import (
 # computes the value of the expression at (x,y). The __init__ should
 # accept the objects representing its subexpressions. The class definition
 # should contain the arity attribute which tells how many subexpressions should
-# be passed to the __init__ constructor.
+# be passed to the __init__ constructor, the subexprs attribute naming the
+# attributes that hold them, and the params attribute naming the attributes
+# that hold any other values the expression depends on.
+#
+# Every class also provides eval_grid, which takes two equally shaped NumPy
+# arrays of x and y coordinates and returns an (r, g, b) tuple of arrays, so
+# that a whole image can be computed with a single walk of the tree. Likewise
+# emit appends the instructions computing the expression to a program.Program
+# and returns the register holding its result.
+#
+# pycode appends the Python statements computing the expression to a
+# codegen.FunctionBuilder and returns the names or literals holding its red,
+# green and blue channels.
 
 class VariableX(object):
     arity = 0
+    subexprs = ()
+    params = ()
 
     def __init__(self):
         pass
@@ -113,9 +137,20 @@ class VariableX(object):
     def eval(self, x, y):
         return formats.ra_variable_x()(x, y)
 
+    def eval_grid(self, x, y):
+        return (x, x, x)
+
+    def emit(self, prog):
+        return prog.emit(OP_VAR_X)
+
+    def pycode(self, gen):
+        return ('x', 'x', 'x')
+
 
 class VariableY(object):
     arity = 0
+    subexprs = ()
+    params = ()
 
     def __init__(self):
         pass
@@ -129,16 +164,27 @@ class VariableY(object):
     def eval(self, x, y):
         return qcolor(y, y, y)
 
+    def eval_grid(self, x, y):
+        return (y, y, y)
+
+    def emit(self, prog):
+        return prog.emit(OP_VAR_Y)
+
+    def pycode(self, gen):
+        return ('y', 'y', 'y')
+
 
 class Constant(object):
     arity = 0
+    subexprs = ()
+    params = ('c', )
 
-    def __init__(self, xargs=None):
+    def __init__(self, xargs=None, rng=random):
         if xargs is None:
             xargs = qcolor(
-                random.uniform(0, 1),
-                random.uniform(0, 1),
-                random.uniform(0, 1)
+                rng.uniform(0, 1),
+                rng.uniform(0, 1),
+                rng.uniform(0, 1)
             )
         self.c = xargs
 
@@ -152,9 +198,21 @@ class Constant(object):
     def eval(self, x, y):
         return self.c
 
+    def eval_grid(self, x, y):
+        return grid_constant_impl(self.c, x)
+
+    def emit(self, prog):
+        return prog.emit(
+            OP_CONSTANT, constants=(self.c.r, self.c.g, self.c.b))
+
+    def pycode(self, gen):
+        return tuple(repr(float(c)) for c in self.c.to_tuple())
+
 
 class Sum(object):
     arity = 2
+    subexprs = ('e1', 'e2')
+    params = ()
 
     def __init__(self, e1, e2):
         self.e1 = e1
@@ -174,9 +232,25 @@ class Sum(object):
             0.5, out)
         return out
 
+    def eval_grid(self, x, y):
+        return grid_average_impl(
+            self.e1.eval_grid(x, y),
+            self.e2.eval_grid(x, y),
+            0.5)
+
+    def emit(self, prog):
+        return prog.emit(OP_SUM, (self.e1.emit(prog), self.e2.emit(prog)))
+
+    def pycode(self, gen):
+        return gen.assign_color(
+            '0.5 * %s + 0.5 * %s' % pair
+            for pair in zip(self.e1.pycode(gen), self.e2.pycode(gen)))
+
 
 class Product(object):
     arity = 2
+    subexprs = ('e1', 'e2')
+    params = ()
 
     def __init__(self, e1, e2):
         self.e1 = e1
@@ -193,9 +267,24 @@ class Product(object):
         prod_impl(self.e1.eval(x, y), self.e2.eval(x, y), out)
         return out
 
+    def eval_grid(self, x, y):
+        return grid_prod_impl(
+            self.e1.eval_grid(x, y), self.e2.eval_grid(x, y))
+
+    def emit(self, prog):
+        return prog.emit(
+            OP_PRODUCT, (self.e1.emit(prog), self.e2.emit(prog)))
+
+    def pycode(self, gen):
+        return gen.assign_color(
+            '%s * %s' % pair
+            for pair in zip(self.e1.pycode(gen), self.e2.pycode(gen)))
+
 
 class Mod(object):
     arity = 2
+    subexprs = ('e1', 'e2')
+    params = ()
 
     def __init__(self, e1, e2):
         self.e1 = e1
@@ -214,9 +303,28 @@ class Mod(object):
             mod_impl(self.e1.eval(x, y), c2, out)
         return out
 
+    def eval_grid(self, x, y):
+        # mirrors eval, which takes both operands from e1
+        c2 = self.e1.eval_grid(x, y)
+        return grid_mod_impl(c2, c2)
+
+    def emit(self, prog):
+        # mirrors eval, which takes both operands from e1
+        c2 = self.e1.emit(prog)
+        return prog.emit(OP_MOD, (c2, c2), pop=1)
+
+    def pycode(self, gen):
+        # mirrors eval, which takes both operands from e1
+        c2 = self.e1.pycode(gen)
+        nonzero = gen.assign(' and '.join('%s != 0.0' % c for c in c2))
+        return gen.assign_color(
+            '%s %% %s if %s else 0.0' % (c, c, nonzero) for c in c2)
+
 
 class Well(object):
     arity = 1
+    subexprs = ('e', )
+    params = ()
 
     def __init__(self, e):
         self.e = e
@@ -232,9 +340,21 @@ class Well(object):
         well_impl(self.e.eval(x, y), out)
         return out
 
+    def eval_grid(self, x, y):
+        return grid_well_impl(self.e.eval_grid(x, y))
+
+    def emit(self, prog):
+        return prog.emit(OP_WELL, (self.e.emit(prog), ))
+
+    def pycode(self, gen):
+        return gen.assign_color(
+            '1 - 2 / (1 + %s * %s) ** 8' % (c, c) for c in self.e.pycode(gen))
+
 
 class Tent(object):
     arity = 1
+    subexprs = ('e', )
+    params = ()
 
     def __init__(self, e):
         self.e = e
@@ -250,14 +370,26 @@ class Tent(object):
         tent_impl(self.e.eval(x, y), out)
         return out
 
+    def eval_grid(self, x, y):
+        return grid_tent_impl(self.e.eval_grid(x, y))
+
+    def emit(self, prog):
+        return prog.emit(OP_TENT, (self.e.emit(prog), ))
+
+    def pycode(self, gen):
+        return gen.assign_color(
+            '1 - 2 * abs(%s)' % c for c in self.e.pycode(gen))
+
 
 class Sin(object):
     arity = 1
+    subexprs = ('e', )
+    params = ('phase', 'freq')
 
-    def __init__(self, e):
+    def __init__(self, e, rng=random):
         self.e = e
-        self.phase = random.uniform(0, math.pi)
-        self.freq = random.uniform(1.0, 6.0)
+        self.phase = rng.uniform(0, math.pi)
+        self.freq = rng.uniform(1.0, 6.0)
 
     def __repr__(self):
         return 'Sin(%g + %g * %s)' % (self.phase, self.freq, self.e)
@@ -270,12 +402,27 @@ class Sin(object):
         sin_impl(self.e.eval(x, y), self.phase, self.freq, out)
         return out
 
+    def eval_grid(self, x, y):
+        return grid_sin_impl(self.e.eval_grid(x, y), self.phase, self.freq)
+
+    def emit(self, prog):
+        return prog.emit(
+            OP_SIN, (self.e.emit(prog), ),
+            constants=(self.phase, self.freq))
+
+    def pycode(self, gen):
+        return gen.assign_color(
+            'math.sin(%r + %r * %s)' % (self.phase, self.freq, c)
+            for c in self.e.pycode(gen))
+
 
 class Level(object):
     arity = 3
+    subexprs = ('level', 'e1', 'e2')
+    params = ('treshold', )
 
-    def __init__(self, level, e1, e2):
-        self.treshold = random.uniform(-1.0, 1.0)
+    def __init__(self, level, e1, e2, rng=random):
+        self.treshold = rng.uniform(-1.0, 1.0)
         self.level = level
         self.e1 = e1
         self.e2 = e2
@@ -297,9 +444,31 @@ class Level(object):
             self.e1.eval(x, y), self.e2.eval(x, y), out)
         return out
 
+    def eval_grid(self, x, y):
+        return grid_level_impl(
+            self.treshold, self.level.eval_grid(x, y),
+            self.e1.eval_grid(x, y), self.e2.eval_grid(x, y))
+
+    def emit(self, prog):
+        return prog.emit(
+            OP_LEVEL, (
+                self.level.emit(prog),
+                self.e1.emit(prog),
+                self.e2.emit(prog)),
+            constants=(self.treshold, ))
+
+    def pycode(self, gen):
+        channels = zip(
+            self.level.pycode(gen), self.e1.pycode(gen), self.e2.pycode(gen))
+        return gen.assign_color(
+            '%s if %s < %r else %s' % (c1, level, self.treshold, c2)
+            for (level, c1, c2) in channels)
+
 
 class Mix(object):
     arity = 3
+    subexprs = ('w', 'e1', 'e2')
+    params = ()
 
     def __init__(self, w, e1, e2):
         self.w = w
@@ -324,6 +493,167 @@ class Mix(object):
             w, out)
         return out
 
+    def eval_grid(self, x, y):
+        w = 0.5 * (self.w.eval_grid(x, y)[0] + 1.0)
+        return grid_average_impl(
+            self.e1.eval_grid(x, y),
+            self.e2.eval_grid(x, y),
+            w)
+
+    def emit(self, prog):
+        return prog.emit(
+            OP_MIX, (
+                self.w.emit(prog),
+                self.e1.emit(prog),
+                self.e2.emit(prog)))
+
+    def pycode(self, gen):
+        w = gen.assign('0.5 * (%s + 1.0)' % self.w.pycode(gen)[0])
+        return gen.assign_color(
+            '%s * %s + (1 - %s) * %s' % (w, c1, w, c2)
+            for (c1, c2) in zip(self.e1.pycode(gen), self.e2.pycode(gen)))
+
+
+class Shared(object):
+    '''Wraps a subexpression that is referenced from several places in an
+    expression DAG, so that it is evaluated once per pixel. Not used by
+    generate; see randomart.dag.'''
+    arity = 1
+    subexprs = ('e', )
+    params = ()
+
+    def __init__(self, e):
+        self.e = e
+        self._clear()
+
+    def _clear(self):
+        self._last = None
+        self._last_grid = None
+        self._reified = None
+
+    def __getstate__(self):
+        return {'e': self.e}
+
+    def __setstate__(self, state):
+        self.e = state['e']
+        self._clear()
+
+    def __repr__(self):
+        return 'Shared(%s)' % self.e
+
+    def reify(self):
+        if self._reified is None:
+            self._reified = formats.ra_shared(self.e.reify())
+        return self._reified
+
+    def eval(self, x, y):
+        last = self._last
+        if last is not None and last[0] == x and last[1] == y:
+            return last[2]
+        out = self.e.eval(x, y)
+        self._last = (x, y, out)
+        return out
+
+    def eval_grid(self, x, y):
+        last = self._last_grid
+        if last is not None and last[0] is x and last[1] is y:
+            return last[2]
+        out = self.e.eval_grid(x, y)
+        self._last_grid = (x, y, out)
+        return out
+
+    def emit(self, prog):
+        return self.e.emit(prog)
+
+    def pycode(self, gen):
+        return gen.shared(self, lambda: self.e.pycode(gen))
+
+
+class Lookup(object):
+    '''Stands for a subexpression that depends on x only (axis 0) or on y
+    only (axis 1), which is evaluated once per pixel column or row of a size
+    x size image into a table. Elsewhere the subexpression is evaluated as
+    usual. Not used by generate; see randomart.separable.'''
+    arity = 1
+    subexprs = ('e', )
+    params = ('axis', 'size')
+
+    def __init__(self, axis, size, e):
+        self.axis = axis
+        self.size = size
+        self.e = e
+        self._clear()
+
+    def _clear(self):
+        self._table = None
+        self._grid_table = None
+
+    def __getstate__(self):
+        return {'axis': self.axis, 'size': self.size, 'e': self.e}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._clear()
+
+    def __repr__(self):
+        return 'Lookup(%s, %d, %s)' % ('xy'[self.axis], self.size, self.e)
+
+    def coords(self):
+        '''The coordinates of the table entries, as used by get_pixel.'''
+        return [2 * float(pos) / self.size - 1.0 for pos in xrange(self.size)]
+
+    def _point(self, coord):
+        if self.axis == 0:
+            return (coord, 0.0)
+        return (0.0, coord)
+
+    def reify(self):
+        e = self.e.reify()
+        table = [e.eval(*self._point(coord)) for coord in self.coords()]
+        return formats.ra_lookup(self.axis, table, e)
+
+    def eval(self, x, y):
+        if self._table is None:
+            self._table = dict(
+                (coord, self.e.eval(*self._point(coord)))
+                for coord in self.coords())
+        out = self._table.get(y if self.axis else x)
+        if out is None:
+            out = self.e.eval(x, y)
+        return out
+
+    def eval_grid(self, x, y):
+        import numpy
+        if self._grid_table is None:
+            coords = numpy.array(self.coords())
+            zeros = numpy.zeros_like(coords)
+            if self.axis == 0:
+                table = self.e.eval_grid(coords, zeros)
+            else:
+                table = self.e.eval_grid(zeros, coords)
+            self._grid_table = (coords, numpy.array(table))
+        (coords, table) = self._grid_table
+        pos = y if self.axis else x
+        index = numpy.floor((pos + 1.0) * self.size / 2.0 + 0.5).astype(int)
+        index = numpy.clip(index, 0, self.size - 1)
+        hit = coords[index] == pos
+        out = tuple(table[:, index])
+        if not hit.all():
+            fallback = self.e.eval_grid(x, y)
+            out = tuple(
+                numpy.where(hit, a, b) for (a, b) in zip(out, fallback))
+        return out
+
+    def emit(self, prog):
+        native = compile_art(self.e).native()
+        table = [native.eval(*self._point(coord)) for coord in self.coords()]
+        return prog.emit_lookup(self.axis, table, lambda: self.e.emit(prog))
+
+    def pycode(self, gen):
+        # eval already looks pixels up in a dict, so the function calls it
+        out = gen.assign('%s.eval(x, y)' % gen.bind(self))
+        return (out + '.r', out + '.g', out + '.b')
+
 
 # The following list of all classes that are used for generation of expressions
 # is used by the generate function below.
@@ -337,91 +667,323 @@ operators = (
 operators0 = [op for op in operators if op.arity == 0]
 operators1 = [op for op in operators if op.arity > 0]
 
+if profiling.ENABLED:
+    profiling.instrument(operators + (Shared, Lookup))
+
+
+def subexpressions(art):
+    '''Return the immediate subexpressions of an expression.'''
+    return [getattr(art, name) for name in art.subexprs]
 
-def generate(k=50):
-    '''Randonly generate an expession of a given size.'''
+
+def _clear_grid_caches(art):
+    # Shared nodes remember their last eval_grid result so that each is
+    # evaluated once per grid; drop those arrays once the grid is done.
+    seen = set()
+    stack = [art]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        if isinstance(node, Shared):
+            node._last_grid = None
+        stack.extend(subexpressions(node))
+
+
+def _construct(op, args, rng):
+    # The generated operators with params draw them from rng.
+    if op.params:
+        return op(*args, rng=rng)
+    return op(*args)
+
+
+def generate(k=50, rng=random, ops=operators1):
+    '''Randonly generate an expession of a given size, drawing every choice
+    from rng: by default the global random module, or a random.Random.
+    Inner nodes are drawn from ops, by default every operator of arity > 0.'''
     if k <= 0:
         # We used up available size, generate a leaf of the expression tree
-        op = random.choice(operators0)
-        return op()
+        op = rng.choice(operators0)
+        return _construct(op, (), rng)
     else:
         # randomly pick an operator whose arity > 0
-        op = random.choice(operators1)
+        op = rng.choice(ops)
         # generate subexpressions
         i = 0  # the amount of available size used up so far
         args = []  # the list of generated subexpression
-        for j in sorted([random.randrange(k) for l in range(op.arity - 1)]):
-            args.append(generate(j - i))
+        for j in sorted([rng.randrange(k) for l in range(op.arity - 1)]):
+            args.append(generate(j - i, rng, ops))
             i = j
-        args.append(generate(k - 1 - i))
-        return op(*args)
+        args.append(generate(k - 1 - i, rng, ops))
+        return _construct(op, args, rng)
+
+
+SEED_MASK = (1 << 64) - 1
+
+
+def generate_seeded(seed, min_size=20, max_size=150):
+    '''Generate the expression identified by a 64-bit seed, of a size drawn
+    from [min_size, max_size). The same seed and sizes give the same tree
+    in any process or host running the same Python version, without
+    touching the global random state.'''
+    rng = random.Random(seed & SEED_MASK)
+    return generate(rng.randrange(min_size, max_size), rng)
 
 
 class BaseArt(object):
     initial_square_size = 1
 
-    def __init__(self, size):
+    def __init__(self, size, height=None):
+        # size is the width, and the height too unless given; either way
+        # each axis spans [-1, 1]
         self.size = size
+        self.width = size
+        self.height = size if height is None else height
         self.d = self.initial_square_size  # current square size
         self.y = 0  # current row
 
-    def setup_art(self):
+    def setup_art(self, seed=None):
+        if seed is not None:
+            self.set_art(generate_seeded(seed))
+            return
         self.set_art(generate(random.randrange(20, 150)))
         # self.set_art(generate(random.randrange(5, 15)))
 
     def set_art(self, art):
         self.art = art
         self.art_reified = None
+        self.art_compiled = None
 
     def reify(self):
-        self.art_reified = self.art.reify()
+        '''Build the art natively, as a formats.ra_arena laid out in
+        evaluation order, for the native renderers.'''
+        from .serial import encode_tree
+        self.art_reified = formats.ra_arena(encode_tree(self.art)).root
+        if profiling.ENABLED:
+            formats.profile_tree(self.art_reified)
+
+    def compile(self):
+        '''Like reify, but evaluate through a flat program run by the
+        native interpreter.'''
+        self.art_reified = compile_art(self.art).native()
+
+    def compile_python(self):
+        '''Evaluate through a Python function generated for the art, for
+        when librandomart is not available; see randomart.codegen.'''
+        from .codegen import compile_python
+        self.art_compiled = compile_python(self.art)
+
+    def optimize(self):
+        '''Fold constants and simplify the art, which must be done before
+        reifying or compiling it. Returns the node counts before and
+        after.'''
+        from .optimize import optimize, count_nodes
+        before = count_nodes(self.art)
+        self.set_art(optimize(self.art))
+        return (before, count_nodes(self.art))
+
+    def share(self):
+        '''Merge structurally identical subexpressions of the art so they
+        are evaluated once per pixel. Returns the dag.SharingStats.'''
+        from .dag import share, sharing_stats
+        original = self.art
+        self.set_art(share(original))
+        return sharing_stats(original, self.art)
+
+    def separate(self):
+        '''Replace subexpressions of the art that depend on x only or on y
+        only by lookup tables filled once per column or row. Returns the
+        separable.SeparableStats.'''
+        from .separable import separate, separable_stats
+        if self.width != self.height:
+            raise ValueError("lookup tables need a square image")
+        original = self.art
+        self.set_art(separate(original, self.size))
+        return separable_stats(original, self.art)
 
     def redraw(self):
+        if self.art_reified is not None:
+            self._draw_native()
+        else:
+            for _ in self._do_draw_rounds():
+                pass
+
+    def _draw_native(self, threads=1, band_size=None):
+        # Subclasses render the whole reified tree natively, in bands of
+        # band_size rows or columns spread over `threads` threads.
         for _ in self._do_draw_rounds():
             pass
 
+    def redraw_threaded(self, threads=None, band_size=None):
+        '''Render the reified art on a thread pool, one thread per CPU by
+        default. The result is identical to redraw().'''
+        if self.art_reified is None:
+            raise ValueError("threaded rendering requires reified art")
+        self._draw_native(threads, band_size)
+
+    def redraw_tiled(self, tile_size=None, processes=None):
+        '''Render on a process pool, tile_size pixels square per job. The
+        result is identical to redraw().'''
+        from .tiled import render_tiled, DEFAULT_TILE_SIZE
+        if tile_size is None:
+            tile_size = DEFAULT_TILE_SIZE
+        render_tiled(self, tile_size, processes)
+
     def get_pixel(self, (x, y), d):
-        u = 2 * float(x + d / 2) / self.size - 1.0
-        v = 2 * float(y + d / 2) / self.size - 1.0
+        u = 2 * float(x + d / 2) / self.width - 1.0
+        v = 2 * float(y + d / 2) / self.height - 1.0
         if self.art_reified is not None:
             return self.art_reified.eval(u, v)
+        elif self.art_compiled is not None:
+            return self.art_compiled(u, v)
         else:
             return self.art.eval(u, v)
 
+    def get_grid(self, d=1):
+        '''Evaluate the art at every d-th pixel in one pass, returning an
+        (r, g, b) tuple of arrays indexed as [x, y].'''
+        import numpy
+        (us, vs) = [
+            2 * (numpy.arange(0, n, d) + d // 2).astype(float) / n - 1.0
+            for n in (self.width, self.height)]
+        u, v = numpy.meshgrid(us, vs, indexing='ij')
+        try:
+            return self.art.eval_grid(u, v)
+        finally:
+            _clear_grid_caches(self.art)
+
     def _do_draw_rounds(self, inv_resolution=1):
         # for x in range(0, self.size, inv_resolution):
         #     for y in range(0, self.size, inv_resolution):
         #         get_pixel(x, y)
         d = 1
-        for x in range(0, self.size):
-            for y in range(0, self.size):
+        for x in range(0, self.width):
+            for y in range(0, self.height):
                 px_color = self.get_pixel((x, y), d)
                 self._draw_rectangle(
                     ((x, y), (x + d, y + d)),
                     fill=px_color.to_color())
             yield
 
+    def redraw_progressive(self, square_size=64, factor=4):
+        '''Render in rounds of decreasing square size, starting from
+        square_size and dividing it by factor down to single pixels.
+        square_size must be a power of factor, so that the squares of each
+        round subdivide those of the round before. Each square is filled
+        with the color of its top left pixel, so every pixel computed in a
+        round is reused by the later ones and the final image is identical
+        to redraw(). Yields the square size after each round, when the
+        target holds a complete preview.'''
+        if factor < 2:
+            raise ValueError("factor must be at least 2")
+        power = 1
+        while power < square_size:
+            power *= factor
+        if power != square_size:
+            raise ValueError(
+                "square_size %d is not a power of %d" % (square_size, factor))
+        return self._progressive_rounds(square_size, factor)
+
+    def _progressive_rounds(self, square_size, factor):
+        previous = None
+        self.d = square_size
+        while True:
+            d = self.d
+            for x in range(0, self.width, d):
+                for y in range(0, self.height, d):
+                    if previous and x % previous == 0 and y % previous == 0:
+                        continue
+                    px_color = self.get_pixel((x, y), 1)
+                    x_f = min(x + d, self.width)
+                    y_f = min(y + d, self.height)
+                    self._draw_rectangle(
+                        ((x, y), (x_f, y_f)), fill=px_color.to_color())
+            yield d
+            if d == 1:
+                break
+            previous = d
+            self.d = d // factor
+
 
 class _PILArt(BaseArt):
+    """Renders into `pixels`, row-major RGB bytes, which image() hands to
+    PIL in one call. `target` is a PIL image of any size, kept up to date as
+    rendering proceeds, or the (width, height) of an image only wanted from
+    image()."""
+    tile_layout = 'rgb'
+
     def __init__(self, target):
-        from PIL import ImageDraw
-        (side_length_x, side_length_y) = target.size
-        if side_length_y != side_length_x:
-            raise TypeError("side lengths must be equal")
-        super(_PILArt, self).__init__(side_length_x)
-        self.target_drawable = ImageDraw.Draw(target)
+        if isinstance(target, tuple):
+            (width, height) = target
+            target = None
+        else:
+            (width, height) = target.size
+        super(_PILArt, self).__init__(width, height)
+        self.target = target
+        self.pixels = bytearray(width * height * 3)
+
+    def image(self):
+        '''A PIL image of the pixels rendered so far.'''
+        from PIL import Image
+        # PIL wants a read-only buffer, and unpacks it in C
+        return Image.frombuffer(
+            'RGB', (self.width, self.height), buffer(self.pixels),
+            'raw', 'RGB', 0, 1)
+
+    def _do_draw_rounds(self, inv_resolution=1):
+        # a row at a time straight into the buffer
+        from .tiled import render_tile
+        for y in xrange(self.height):
+            region = (0, y, self.width, 1)
+            self._draw_tile(region, render_tile(self, region, 'rgb'))
+            yield
+
+    def _draw_native(self, threads=1, band_size=None):
+        from .threaded import render_bands, DEFAULT_BAND_SIZE
+        render_bands(
+            self.art_reified, (self.width, self.height), self.pixels, 'rgb',
+            threads, band_size or DEFAULT_BAND_SIZE)
+        if self.target is not None:
+            self.target.frombytes(buffer(self.pixels))
+
+    def _draw_tile(self, region, data):
+        (x0, y0, width, height) = region
+        stride = self.width * 3
+        row = width * 3
+        for y in xrange(height):
+            start = (y0 + y) * stride + x0 * 3
+            self.pixels[start:start + row] = data[y * row:(y + 1) * row]
+        if self.target is not None:
+            from PIL import Image
+            tile = Image.frombytes('RGB', (width, height), data)
+            self.target.paste(tile, (x0, y0))
+
+    def _image_data(self):
+        return self.pixels
 
     def _draw_rectangle(self, location, fill):
-        self.target_drawable.rectangle(
-            location, fill=fill.to_tuple(), outline=None)
+        # location is half-open, like MemorySlabArt
+        ((x_i, y_i), (x_f, y_f)) = location
+        row = bytearray(fill.to_tuple()) * (x_f - x_i)
+        for y in xrange(y_i, y_f):
+            start = (y * self.width + x_i) * 3
+            self.pixels[start:start + len(row)] = row
+        if self.target is not None:
+            self.target.paste(fill.to_tuple(), (x_i, y_i, x_f, y_f))
 
 
-import struct
+import mmap
+import os
 from array import array
+from ctypes import c_int32, c_ubyte
+from . import slab
 from itertools import repeat
 
 
 class MemorySlabArt(BaseArt):
+    tile_layout = 'packed'
+
     def __init__(self, size):
         super(MemorySlabArt, self).__init__(size)
         self.target = array('i', repeat(0, size * size))
@@ -429,6 +991,21 @@ class MemorySlabArt(BaseArt):
     def set_pixel(self, (x, y), fill):
         self.target[x * self.size + y] = fill.pack_rgb()
 
+    def _draw_native(self, threads=1, band_size=None):
+        from .threaded import render_bands, DEFAULT_BAND_SIZE
+        render_bands(
+            self.art_reified, self.size, self.target, 'packed',
+            threads, band_size or DEFAULT_BAND_SIZE)
+
+    def _draw_tile(self, region, data):
+        (x0, y0, width, height) = region
+        for x in xrange(width):
+            start = (x0 + x) * self.size + y0
+            self.target[start:start + height] = data[x * height:(x + 1) * height]
+
+    def _image_data(self):
+        return self.target
+
     def _draw_rectangle(self, location, fill):
         ((x_i, y_i), (x_f, y_f)) = location
         for x in range(x_i, x_f):
@@ -436,34 +1013,193 @@ class MemorySlabArt(BaseArt):
                 self.set_pixel((x, y), fill)
 
     def save(self, outfh):
-        outfh.write(struct.pack('!I', self.size))
-        outfh.write(struct.pack('!I', self.size))
-        for i in xrange(self.size * self.size):
-            outfh.write(struct.pack('!I', self.target[i]))
+        from .slab import save
+        save(outfh, self.size, self.size, self.target)
+
+
+class MappedSlabArt(BaseArt):
+    """Renders into a slab file mapped into memory, shared by every process
+    that opens it, so worker processes write their tiles straight into the
+    final image. A path on a tmpfs such as /dev/shm gives a plain shared
+    memory segment. The slab's tile map records completed tiles, so an
+    interrupted render can be reopened and resumed."""
+    tile_layout = 'packed'
+
+    def __init__(self, path, size=None, tile_size=None):
+        from .tiled import iter_tiles, DEFAULT_TILE_SIZE
+        if not os.path.exists(path):
+            if size is None:
+                raise ValueError("size is required to create " + path)
+            self._create(path, size, tile_size or DEFAULT_TILE_SIZE)
+        with open(path, 'r+b') as fh:
+            self._map = mmap.mmap(fh.fileno(), 0)
+        (version, _, byteorder, width, height, offset) = \
+            slab.read_header(self._map)
+        if version != slab.VERSION or byteorder != slab.HOST_BYTEORDER:
+            self._map.close()
+            raise slab.SlabFormatError("slab can't be rendered in place")
+        if width != height or size not in (None, width):
+            self._map.close()
+            raise ValueError("slab is %dx%d" % (width, height))
+        super(MappedSlabArt, self).__init__(width)
+        self.path = path
+        tiles_offset = offset + slab.pixels_size(width, height)
+        (self.tile_size, count) = slab.read_tiles_header(
+            self._map, tiles_offset)
+        if tile_size not in (None, self.tile_size):
+            self._map.close()
+            raise ValueError("slab has tile size %d" % self.tile_size)
+        self.tiles = list(iter_tiles(width, self.tile_size))
+        self.target = (c_int32 * (width * height)).from_buffer(
+            self._map, offset)
+        self._done = (c_ubyte * count).from_buffer(
+            self._map, tiles_offset + slab.TILES_HEADER_SIZE)
+
+    @staticmethod
+    def _create(path, size, tile_size):
+        from .tiled import iter_tiles
+        count = len(list(iter_tiles(size, tile_size)))
+        tiles_offset = slab.HEADER_SIZE + slab.pixels_size(size, size)
+        with open(path, 'w+b') as fh:
+            slab.write_header(fh, size, size)
+            fh.truncate(tiles_offset + slab.TILES_HEADER_SIZE + count)
+            fh.flush()
+            data = mmap.mmap(fh.fileno(), 0)
+            slab.write_tiles_header(data, tiles_offset, tile_size, count)
+            data.close()
+
+    def set_pixel(self, (x, y), fill):
+        self.target[x * self.size + y] = fill.pack_rgb()
+
+    def _draw_rectangle(self, location, fill):
+        ((x_i, y_i), (x_f, y_f)) = location
+        for x in range(x_i, x_f):
+            for y in range(y_i, y_f):
+                self.set_pixel((x, y), fill)
+
+    def _draw_native(self, threads=1, band_size=None):
+        from .threaded import render_bands, DEFAULT_BAND_SIZE
+        render_bands(
+            self.art_reified, self.size, self.target, 'packed',
+            threads, band_size or DEFAULT_BAND_SIZE)
+        self._done[:] = [1] * len(self.tiles)
+
+    def draw_tile(self, index):
+        """Render tile number index directly into the slab and mark it
+        complete."""
+        (x0, y0, width, height) = self.tiles[index]
+        for x in xrange(x0, x0 + width):
+            if self.art_reified is not None:
+                formats.render_packed(
+                    self.art_reified, self.size, self.target,
+                    (x, y0, 1, height), 4 * (x * self.size + y0))
+            else:
+                for y in xrange(y0, y0 + height):
+                    px_color = self.get_pixel((x, y), 1)
+                    self.set_pixel((x, y), px_color.to_color())
+        self._done[index] = 1
+
+    def completed_tiles(self):
+        return [r for (r, done) in zip(self.tiles, self._done) if done]
+
+    def missing_tiles(self):
+        """Indexes of the tiles that are not complete yet."""
+        return [i for (i, done) in enumerate(self._done) if not done]
+
+    def is_complete(self):
+        return all(self._done)
+
+    def redraw(self):
+        for index in self.missing_tiles():
+            self.draw_tile(index)
+
+    def redraw_tiled(self, tile_size=None, processes=None):
+        """Render the missing tiles on a process pool. Tiles are fixed by
+        the slab, so tile_size must be None or match it."""
+        from .tiled import render_tiled_mapped
+        if tile_size not in (None, self.tile_size):
+            raise ValueError("slab has tile size %d" % self.tile_size)
+        render_tiled_mapped(self, processes)
+
+    def flush(self):
+        self._map.flush()
 
+    def close(self):
+        self.target = self._done = None
+        self._map.close()
 
-def pil_create_image(side_length, artfh=None):
-    from PIL import Image
-    image = Image.new("RGB", (side_length, side_length))
-    art_impl = _PILArt(image)
+    def save(self, outfh):
+        slab.save(outfh, self.size, self.size, self.target)
+
+
+def _redraw(art_impl, processes, tile_size):
+    if processes == 1:
+        art_impl.redraw()
+    else:
+        art_impl.redraw_tiled(tile_size, processes)
+
+
+def _load_art(artfh):
+    # Art files written by serial.dump, or pickled by older versions
+    from . import serial
+    data = artfh.read()
+    if data.startswith(serial.MAGIC):
+        return serial.loads(data)
+    return pickle.loads(data)
+
+
+def _cached_redraw(art_impl, processes, tile_size, cache):
+    # cache is a cache.RenderCache, or None
+    if cache is None:
+        _redraw(art_impl, processes, tile_size)
+    else:
+        cache.redraw(
+            art_impl, lambda: _redraw(art_impl, processes, tile_size))
+
+
+def pil_create_image(side_length, artfh=None, processes=1, tile_size=None,
+                     cache=None):
+    '''Render a PIL image of side_length, or of a (width, height) pair.'''
+    art_impl = _PILArt(formats.image_size(side_length))
     if artfh is not None:
-        art_impl.set_art(pickle.load(artfh))
+        art_impl.set_art(_load_art(artfh))
     else:
         art_impl.setup_art()
-    art_impl.redraw()
-    return image
+    _cached_redraw(art_impl, processes, tile_size, cache)
+    return art_impl.image()
 
 
-def memoryslab_create_image(side_length, artfh=None):
+def memoryslab_create_image(side_length, artfh=None,
+                            processes=1, tile_size=None, cache=None):
     art_impl = MemorySlabArt(side_length)
     if artfh is not None:
-        art_impl.set_art(pickle.load(artfh))
+        art_impl.set_art(_load_art(artfh))
     else:
         art_impl.setup_art()
-    art_impl.redraw()
+    _cached_redraw(art_impl, processes, tile_size, cache)
     return art_impl
 
 
+def stream_create_image(side_length, outfh, fmt='png', artfh=None,
+                        band_size=None, backend='auto'):
+    '''Render straight into outfh as a 'png' or 'slab' file, holding only
+    one band of the image in memory at a time. backend names the BaseArt
+    method preparing the art, as in tiled; None renders with eval, and
+    'auto' picks tiled.default_backend().'''
+    from .stream import writers, DEFAULT_BAND_SIZE
+    from .tiled import default_backend
+    if backend == 'auto':
+        backend = default_backend()
+    art_impl = BaseArt(side_length)
+    if artfh is not None:
+        art_impl.set_art(_load_art(artfh))
+    else:
+        art_impl.setup_art()
+    if backend is not None:
+        getattr(art_impl, backend)()
+    writers[fmt](art_impl, outfh, band_size or DEFAULT_BAND_SIZE)
+
+
 # class TkArt(BaseArt):
 #     """A simple graphical user interface for random art. It displays the
 #     image, and the 'Again!' button."""
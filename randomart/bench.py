@@ -0,0 +1,288 @@
+"""Benchmarks of the evaluation backends.
+
+run_benchmarks renders a fixed corpus of trees, generated from a seed in
+several sizes and operator mixes, with each backend at several resolutions
+and records the best of `repeat` times of each render, preparation of the
+art included. The backends are
+
+    eval            pure Python, the transforms run without librandomart
+    eval_native     Python tree walk calling the per-node ctypes natives
+    reify           the tree built into a formats.ra_arena, rendered natively
+    compile         the flat program run by the native interpreter
+    compile_python  the generated Python function of codegen
+    grid            NumPy whole-grid evaluation, BaseArt.get_grid
+
+Those whose environment differs from this process's, since transforms picks
+its implementations on import, run in a child process; those that cannot
+run here are skipped. Further engines are added to BACKENDS. Once a render
+takes longer than time_limit, larger resolutions of that tree are skipped.
+
+Results are JSON, and compare lists the renders that got slower than a
+baseline by more than a tolerance, or that no longer ran:
+
+    python -m randomart.bench -o baseline.json
+    python -m randomart.bench --baseline baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import OrderedDict, namedtuple
+
+from . import (
+    Sum, Product, Mod, Well, Tent, Sin, Level, Mix, generate, operators1)
+from .cost import measure
+
+
+RESULTS_VERSION = 1
+
+# name -> (BaseArt method preparing the art as in tiled, or None for eval,
+# or 'grid'; environment variables set for it)
+BACKENDS = OrderedDict([
+    ('eval', (None, {'RA_NONATIVE': '1'})),
+    ('eval_native', (None, {'RA_NONATIVE': '0'})),
+    ('reify', ('reify', {})),
+    ('compile', ('compile', {})),
+    ('compile_python', ('compile_python', {})),
+    ('grid', ('grid', {})),
+])
+
+MIXES = OrderedDict([
+    ('all', tuple(operators1)),
+    ('arithmetic', (Sum, Product, Mod, Mix)),
+    ('periodic', (Well, Tent, Sin)),
+    ('branching', (Level, Mix, Sum)),
+])
+
+DEFAULT_SEED = 0x5eed
+DEFAULT_TREE_SIZES = (10, 40, 120)
+DEFAULT_RESOLUTIONS = (32, 64, 128)
+DEFAULT_TOLERANCE = 0.25
+
+
+class Regression(namedtuple('Regression', [
+        'backend', 'tree', 'size', 'baseline', 'seconds'])):
+    '''A render of tree at size x size with backend that took `seconds`
+    against the baseline's `baseline`, or that is missing from the results
+    when seconds is None.'''
+
+    @property
+    def ratio(self):
+        if self.seconds is None:
+            return None
+        return self.seconds / self.baseline
+
+
+def corpus(seed=DEFAULT_SEED, tree_sizes=DEFAULT_TREE_SIZES, mixes=None):
+    '''An OrderedDict of trees named mix-size, the same for the same seed
+    on any host running the same Python version.'''
+    if mixes is None:
+        mixes = MIXES.keys()
+    trees = OrderedDict()
+    for mix in mixes:
+        for k in tree_sizes:
+            # integer seeds, as string seeds depend on hash()
+            rng = random.Random(
+                (seed << 24) + (MIXES.keys().index(mix) << 16) + k)
+            trees['%s-%d' % (mix, k)] = generate(k, rng, MIXES[mix])
+    return trees
+
+
+def _environ_matches(environ):
+    return all(os.environ.get(name, '0') == value
+               for (name, value) in environ.iteritems())
+
+
+def available(backend):
+    '''Whether backend can run in this process.'''
+    (method, _) = BACKENDS[backend]
+    if method == 'grid':
+        try:
+            import numpy
+        except ImportError:
+            return False
+        return True
+    if method in ('reify', 'compile') or backend == 'eval_native':
+        from .transforms import librandomart
+        return librandomart is not None
+    return True
+
+
+def _time(art, size, method):
+    if method != 'grid':
+        return measure(art, size, method)
+    from . import BaseArt
+    t_i = time.time()
+    art_impl = BaseArt(size)
+    art_impl.set_art(art)
+    art_impl.get_grid()
+    return time.time() - t_i
+
+
+def _run_local(backend, trees, resolutions, repeat, time_limit):
+    (method, _) = BACKENDS[backend]
+    results = []
+    if not available(backend):
+        return results
+    for (name, art) in trees.iteritems():
+        for size in sorted(resolutions):
+            seconds = min(_time(art, size, method) for _ in xrange(repeat))
+            results.append({
+                'backend': backend, 'tree': name, 'size': size,
+                'seconds': seconds})
+            if seconds > time_limit:
+                break
+    return results
+
+
+def _run_child(backend, config):
+    (_, environ) = BACKENDS[backend]
+    env = dict(os.environ)
+    env.update(environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [root, env.get('PYTHONPATH')]))
+    child = subprocess.Popen(
+        [sys.executable, '-m', 'randomart.bench', '--child', backend],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env)
+    (out, _) = child.communicate(json.dumps(config))
+    if child.returncode:
+        raise RuntimeError(
+            "benchmark of %s exited with %d" % (backend, child.returncode))
+    return json.loads(out)
+
+
+def run_benchmarks(backends=None, seed=DEFAULT_SEED,
+                   tree_sizes=DEFAULT_TREE_SIZES, mixes=None,
+                   resolutions=DEFAULT_RESOLUTIONS, repeat=3, time_limit=2.0):
+    '''Benchmark backends, by default all of BACKENDS, on the corpus of
+    seed, tree_sizes and mixes. Returns the results as a dict ready for
+    json.dump.'''
+    if backends is None:
+        backends = BACKENDS.keys()
+    if mixes is None:
+        mixes = MIXES.keys()
+    config = {
+        'seed': seed, 'tree_sizes': list(tree_sizes), 'mixes': list(mixes),
+        'resolutions': list(resolutions), 'repeat': repeat,
+        'time_limit': time_limit}
+    trees = corpus(seed, tree_sizes, mixes)
+    from .optimize import count_nodes
+    results = []
+    for backend in backends:
+        if _environ_matches(BACKENDS[backend][1]):
+            results.extend(_run_local(
+                backend, trees, resolutions, repeat, time_limit))
+        else:
+            results.extend(_run_child(backend, config))
+    return {
+        'version': RESULTS_VERSION,
+        'host': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'machine': platform.machine()},
+        'config': config,
+        'trees': OrderedDict(
+            (name, count_nodes(art)) for (name, art) in trees.iteritems()),
+        'backends': list(backends),
+        'results': results,
+    }
+
+
+def _child(backend):
+    config = json.load(sys.stdin)
+    trees = corpus(config['seed'], config['tree_sizes'], config['mixes'])
+    json.dump(_run_local(
+        backend, trees, config['resolutions'], config['repeat'],
+        config['time_limit']), sys.stdout)
+
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    '''The Regressions of current against baseline: renders present in both
+    that took more than (1 + tolerance) times as long, then the baseline's
+    renders with a backend current ran that are missing from current, as
+    skipped backends and time limits leave them.'''
+    def index(data):
+        return OrderedDict(
+            ((r['backend'], r['tree'], r['size']), r['seconds'])
+            for r in data['results'])
+    before = index(baseline)
+    after = index(current)
+    regressions = []
+    for (key, seconds) in after.iteritems():
+        if key in before and seconds > before[key] * (1 + tolerance):
+            regressions.append(Regression(*(key + (before[key], seconds))))
+    for (key, seconds) in before.iteritems():
+        if key[0] in current['backends'] and key not in after:
+            regressions.append(Regression(*(key + (seconds, None))))
+    return regressions
+
+
+def summary(data):
+    '''One line per backend: renders run and the pixels per second over
+    all of them.'''
+    lines = []
+    for backend in data['backends']:
+        runs = [r for r in data['results'] if r['backend'] == backend]
+        if not runs:
+            lines.append('%-15s skipped' % backend)
+            continue
+        pixels = sum(r['size'] ** 2 for r in runs)
+        seconds = sum(r['seconds'] for r in runs)
+        lines.append('%-15s %4d renders %12.0f pixels/s' % (
+            backend, len(runs), pixels / seconds))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('-o', '--output', help="write results to this file")
+    parser.add_argument('--baseline',
+                        help="compare against the results in this file")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--backend', action='append', dest='backends',
+                        choices=BACKENDS.keys())
+    parser.add_argument('--mix', action='append', dest='mixes',
+                        choices=MIXES.keys())
+    parser.add_argument('--seed', type=lambda v: int(v, 0),
+                        default=DEFAULT_SEED)
+    parser.add_argument('--tree-size', action='append', type=int,
+                        dest='tree_sizes')
+    parser.add_argument('--resolution', action='append', type=int,
+                        dest='resolutions')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--time-limit', type=float, default=2.0)
+    args = parser.parse_args(argv)
+    if args.child:
+        _child(args.child)
+        return 0
+    data = run_benchmarks(
+        args.backends, args.seed, args.tree_sizes or DEFAULT_TREE_SIZES,
+        args.mixes, args.resolutions or DEFAULT_RESOLUTIONS, args.repeat,
+        args.time_limit)
+    print(summary(data))
+    if args.output:
+        with open(args.output, 'w') as outfh:
+            json.dump(data, outfh, indent=1)
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(json.load(fh), data, args.tolerance)
+        for r in regressions:
+            if r.seconds is None:
+                print('MISSING %s %s at %d: %.4fs -> not run' % (
+                    r.backend, r.tree, r.size, r.baseline))
+                continue
+            print('REGRESSION %s %s at %d: %.4fs -> %.4fs (x%.2f)' % (
+                r.backend, r.tree, r.size, r.baseline, r.seconds, r.ratio))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
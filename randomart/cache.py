@@ -0,0 +1,248 @@
+"""Content-addressed cache of rendered pixels.
+
+Rendered data, a whole image or a tile in the layouts of
+tiled.render_tile, is stored under a key made of the art's
+serial.content_hash, the image size, the region, the layout and the
+evaluator that produced it (eval, the reified graph and the compiled
+program disagree on Mod, so their renderings are kept apart).
+
+There are two tiers. Recently used entries are held in memory, up to
+memory_size bytes, by each RenderCache. With a directory, every entry is
+also written there as one file, which other processes using the same
+directory will find. Files are written to a temporary name and renamed into
+place, so readers never see partial entries. Once the directory holds more
+than disk_size bytes, the least recently used files are deleted; the
+process doing so holds an flock on the directory's lock file, so only one
+process evicts at a time. Each RenderCache scans the directory once and then
+keeps a running total of the bytes it adds, scanning again only when that
+total exceeds disk_size. Writes by other processes are counted at the next
+scan, so a shared directory can briefly go over disk_size.
+"""
+import errno
+import fcntl
+import hashlib
+import os
+import tempfile
+import weakref
+from array import array
+from collections import namedtuple, OrderedDict
+
+from . import serial
+
+
+DEFAULT_MEMORY_SIZE = 64 << 20
+DEFAULT_DISK_SIZE = 1 << 30
+
+_SUFFIX = '.px'
+_LOCK_NAME = 'lock'
+
+
+class CacheStats(namedtuple('CacheStats', [
+        'memory_hits', 'disk_hits', 'misses', 'stores', 'evictions'])):
+    '''Counts of lookups and stores made through one RenderCache, and of
+    the files it evicted from the directory.'''
+
+    @property
+    def hits(self):
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups else 0.0
+
+
+# content hashes keyed by the root of their tree; a tree must not be
+# modified once it has been hashed
+_hashes = weakref.WeakKeyDictionary()
+
+
+def art_hash(art):
+    try:
+        return _hashes[art]
+    except KeyError:
+        pass
+    digest = _hashes[art] = serial.content_hash(art)
+    return digest
+
+
+def _evaluator(art_impl):
+    from .tiled import _native_backend
+    return _native_backend(art_impl) or 'eval'
+
+
+def _to_bytes(layout, data):
+    if layout == 'packed':
+        return data.tostring()
+    return bytes(data)
+
+
+def _from_bytes(layout, data):
+    if layout == 'packed':
+        out = array('i')
+        out.fromstring(data)
+        return out
+    return data
+
+
+class RenderCache(object):
+    def __init__(self, directory=None, memory_size=DEFAULT_MEMORY_SIZE,
+                 disk_size=DEFAULT_DISK_SIZE):
+        self.directory = directory
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        # bytes in the directory as of the last scan plus those stored
+        # since, or None before the first scan
+        self._disk_used = None
+        self._counts = dict.fromkeys(CacheStats._fields, 0)
+        if directory is not None and not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+
+    def key(self, art_impl, region=None, layout=None):
+        '''The key of art_impl's rendering of region, by default the whole
+        image, in layout, by default art_impl.tile_layout.'''
+        size = (art_impl.width, art_impl.height)
+        if region is None:
+            region = (0, 0) + size
+        if layout is None:
+            layout = art_impl.tile_layout
+        name = '%s:%dx%d:%d,%d,%d,%d:%s:%s' % (
+            (art_hash(art_impl.art), ) + size + tuple(region) +
+            (layout, _evaluator(art_impl)))
+        return hashlib.sha256(name).hexdigest()
+
+    def stats(self):
+        return CacheStats(**self._counts)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def _remember(self, key, data):
+        if key in self._memory:
+            self._memory_used -= len(self._memory.pop(key))
+        if len(data) > self.memory_size:
+            return
+        self._memory[key] = data
+        self._memory_used += len(data)
+        while self._memory_used > self.memory_size:
+            (_, old) = self._memory.popitem(last=False)
+            self._memory_used -= len(old)
+
+    def get(self, key):
+        '''Return the bytes stored under key, or None.'''
+        data = self._memory.pop(key, None)
+        if data is not None:
+            self._memory[key] = data
+            self._counts['memory_hits'] += 1
+            return data
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                with open(path, 'rb') as fh:
+                    data = fh.read()
+                # mark the file as recently used for eviction
+                os.utime(path, None)
+            except (IOError, OSError) as exc:
+                # evicted by another process, perhaps after we opened it
+                if exc.errno != errno.ENOENT:
+                    raise
+            if data is not None:
+                self._remember(key, data)
+                self._counts['disk_hits'] += 1
+                return data
+        self._counts['misses'] += 1
+        return None
+
+    def put(self, key, data):
+        self._remember(key, data)
+        self._counts['stores'] += 1
+        if self.directory is None:
+            return
+        (fd, tmp) = tempfile.mkstemp(
+            suffix='.tmp', prefix='.', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            os.rename(tmp, self._path(key))
+        except:
+            os.unlink(tmp)
+            raise
+        if self._disk_used is not None:
+            # overwritten entries are counted twice, which only makes the
+            # next scan come sooner
+            self._disk_used += len(data)
+        if self._disk_used is None or self._disk_used > self.disk_size:
+            self.evict()
+
+    def _disk_entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(_SUFFIX):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError as exc:
+                if exc.errno != errno.ENOENT:
+                    raise
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        return entries
+
+    def evict(self):
+        '''Delete the least recently used files until the directory holds
+        at most disk_size bytes. Does nothing if another process is already
+        evicting.'''
+        if self.directory is None:
+            return
+        with open(os.path.join(self.directory, _LOCK_NAME), 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError as exc:
+                if exc.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+                return
+            entries = self._disk_entries()
+            used = sum(size for (_, size, _) in entries)
+            entries.sort()
+            for (_, size, name) in entries:
+                if used <= self.disk_size:
+                    break
+                try:
+                    os.unlink(os.path.join(self.directory, name))
+                except OSError as exc:
+                    if exc.errno != errno.ENOENT:
+                        raise
+                used -= size
+                self._counts['evictions'] += 1
+            self._disk_used = used
+
+    def render_tile(self, art_impl, region, layout):
+        '''tiled.render_tile through the cache.'''
+        from .tiled import render_tile
+        key = self.key(art_impl, region, layout)
+        data = self.get(key)
+        if data is not None:
+            return _from_bytes(layout, data)
+        out = render_tile(art_impl, region, layout)
+        self.put(key, _to_bytes(layout, out))
+        return out
+
+    def redraw(self, art_impl, draw):
+        '''Fill art_impl with its cached image, or call draw() to render it
+        and store the result. Returns True on a cache hit.'''
+        layout = art_impl.tile_layout
+        key = self.key(art_impl)
+        data = self.get(key)
+        if data is not None:
+            region = (0, 0, art_impl.width, art_impl.height)
+            art_impl._draw_tile(region, _from_bytes(layout, data))
+            return True
+        draw()
+        self.put(key, _to_bytes(layout, art_impl._image_data()))
+        return False
@@ -0,0 +1,86 @@
+"""Generation of flat Python evaluators for art trees.
+
+compile_python turns an expression tree into the source of one Python
+function of (x, y) that computes the color with straight-line float
+arithmetic on local variables, three per node (one per channel), and
+compiles it with compile(). Evaluating a pixel then costs no method calls
+or qcolor objects for the interior of the tree, which makes it the fastest
+evaluator available without librandomart. The arithmetic mirrors the pure
+Python implementations in transforms, which eval uses under RA_NONATIVE.
+
+Each node class provides pycode, which appends the statements computing the
+expression to a FunctionBuilder and returns the three expressions holding
+its channels.
+"""
+import math
+import weakref
+
+from .formats import qcolor
+
+
+class FunctionBuilder(object):
+    def __init__(self):
+        self.lines = []
+        self.namespace = {'math': math, 'qcolor': qcolor}
+        self._locals = 0
+        self._bound = 0
+        self._shared = {}
+
+    def assign(self, expr):
+        '''Append a statement computing expr into a new local variable and
+        return its name.'''
+        name = 't%d' % self._locals
+        self._locals += 1
+        self.lines.append('%s = %s' % (name, expr))
+        return name
+
+    def assign_color(self, exprs):
+        '''Like assign, for the three channel expressions of a color.'''
+        return tuple(self.assign(expr) for expr in exprs)
+
+    def bind(self, value):
+        '''Make value available to the function as a global, returning the
+        name it is bound to.'''
+        name = '_g%d' % self._bound
+        self._bound += 1
+        self.namespace[name] = value
+        return name
+
+    def shared(self, node, generate):
+        '''Return the channels of node, calling generate to append its code
+        the first time the node is reached.'''
+        if id(node) not in self._shared:
+            self._shared[id(node)] = (node, generate())
+        return self._shared[id(node)][1]
+
+    def source(self, art, name='evaluate'):
+        channels = art.pycode(self)
+        body = self.lines + ['return qcolor(%s, %s, %s)' % channels]
+        return 'def %s(x, y):\n%s\n' % (
+            name, '\n'.join('    ' + line for line in body))
+
+    def build(self, art, name='evaluate'):
+        code = compile(self.source(art, name), '<randomart %s>' % name, 'exec')
+        exec code in self.namespace
+        return self.namespace[name]
+
+
+def python_source(art):
+    '''Return the source of the function compile_python builds for art.'''
+    return FunctionBuilder().source(art)
+
+
+# Compiled functions keyed by the root of their tree; a tree must not be
+# modified once it has been compiled.
+_cache = weakref.WeakKeyDictionary()
+
+
+def compile_python(art):
+    '''Return a function of (x, y) computing the same colors as art.eval.
+    The function is built once per tree and cached.'''
+    try:
+        return _cache[art]
+    except KeyError:
+        pass
+    func = _cache[art] = FunctionBuilder().build(art)
+    return func
@@ -0,0 +1,301 @@
+"""Render cost estimation and cost-aware scheduling.
+
+A CostModel predicts the time to render a tree at a given size with one
+backend (the BaseArt method preparing the art, as in tiled, or None for
+eval) as a linear function of
+
+    pixels     the number of pixels rendered
+    nodes      the number of distinct nodes, for preparing the art
+    <name>     for each class, named as in serial.names, the number of
+               times the backend evaluates a node of that class
+
+Evaluation counts follow the backends: Shared subexpressions count once per
+pixel, a Lookup's subexpression counts once per table entry, and Mod's
+operands count as eval, reify and the compiled forms actually use them.
+calibrate fits the coefficients by least squares to timed renders of a
+corpus; DEFAULT_MODELS were calibrated on a single-core x86-64 host and are
+a starting point only.
+
+schedule assigns jobs to workers longest-first, each to the least loaded
+worker so far, and can set aside jobs whose estimate exceeds a budget.
+"""
+import heapq
+import json
+import time
+from collections import namedtuple
+
+from . import (
+    Mod, Shared, Lookup, Sum, VariableX, generate_seeded, operators,
+    operators0, subexpressions)
+from .serial import names
+
+
+FEATURES = ('pixels', 'nodes') + tuple(sorted(names.values()))
+
+# Seconds, about a tenth of the cheapest node evaluation with each backend:
+# calibrate fits no feature below these, so that every class of node keeps
+# a cost even where timing noise hides it in the corpus
+MIN_COEFFICIENTS = {
+    'compile': 1e-10, 'reify': 1e-9, 'compile_python': 2e-8, None: 1e-7,
+}
+
+
+class CostModel(object):
+    def __init__(self, backend, coefficients):
+        self.backend = backend
+        self.coefficients = dict.fromkeys(FEATURES, 0.0)
+        self.coefficients.update(coefficients)
+
+    def __repr__(self):
+        return '<CostModel for %s>' % (self.backend or 'eval')
+
+    def features(self, art, size):
+        return features(art, size, self.backend)
+
+    def estimate(self, art, size):
+        '''Predicted seconds to render art at size x size.'''
+        return sum(
+            self.coefficients[name] * count
+            for (name, count) in self.features(art, size).iteritems())
+
+    def to_dict(self):
+        return {'backend': self.backend, 'coefficients': self.coefficients}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['backend'], data['coefficients'])
+
+    def save(self, outfh):
+        json.dump(self.to_dict(), outfh, indent=1, sort_keys=True)
+
+    @classmethod
+    def load(cls, fh):
+        return cls.from_dict(json.load(fh))
+
+
+def _operands(art, backend):
+    if isinstance(art, Mod):
+        if backend is None:
+            # eval evaluates e1 twice and ignores e2
+            return [art.e1, art.e1]
+        if backend != 'reify':
+            return [art.e1]
+    return subexpressions(art)
+
+
+def features(art, size, backend):
+    '''Feature counts of the CostModel for rendering art at size x size.'''
+    counts = dict.fromkeys(FEATURES, 0)
+    counts['pixels'] = size * size
+    seen = set()
+
+    def walk(node, times):
+        if isinstance(node, Shared):
+            if id(node) in seen:
+                return
+        if id(node) not in seen:
+            seen.add(id(node))
+            counts['nodes'] += 1
+        counts[names[type(node)]] += times
+        if isinstance(node, Lookup):
+            # the table is filled once; every pixel of the image is on it
+            times = node.size
+        for e in _operands(node, backend):
+            walk(e, times)
+    walk(art, size * size)
+    return counts
+
+
+def measure(art, size, backend):
+    '''Seconds taken to prepare and render art at size x size.'''
+    from . import BaseArt
+    from .tiled import render_tile
+    t_i = time.time()
+    art_impl = BaseArt(size)
+    art_impl.set_art(art)
+    if backend is not None:
+        getattr(art_impl, backend)()
+    render_tile(art_impl, (0, 0, size, size), 'rgb')
+    return time.time() - t_i
+
+
+def _chain(op, depth, leaf=VariableX):
+    # depth nodes of op, each with leaf leaves besides the chain
+    art = leaf()
+    for _ in xrange(depth):
+        args = [art] + [leaf() for _ in xrange(op.arity - 1)]
+        art = op(*args)
+    return art
+
+
+def calibration_corpus(seed=0, count=24):
+    '''Trees covering every generated operator in isolation and in the mix
+    generate produces, of a range of sizes. Leaves are set apart by chains
+    of Sum over each of them.'''
+    trees = [_chain(op, 16) for op in operators if op.arity]
+    trees.extend(_chain(Sum, 16, leaf) for leaf in operators0)
+    trees.append(VariableX())
+    trees.extend(
+        generate_seeded(seed + i, 5, 150) for i in xrange(count))
+    return trees
+
+
+def calibrate(backend, size=48, trees=None, repeat=2, floor=None):
+    '''Fit a CostModel for backend to the best of `repeat` timed renders of
+    each tree at size and at half that size, with no coefficient below
+    floor, by default MIN_COEFFICIENTS[backend].'''
+    import numpy
+    if floor is None:
+        floor = MIN_COEFFICIENTS[backend]
+    if trees is None:
+        trees = calibration_corpus()
+    rows = []
+    times = []
+    for art in trees:
+        for s in (size // 2, size):
+            counts = features(art, s, backend)
+            rows.append([counts[name] for name in FEATURES])
+            times.append(min(measure(art, s, backend) for _ in xrange(repeat)))
+    # scaled to fit relative rather than absolute errors, so that the
+    # largest renders do not dominate
+    times = numpy.array(times)
+    rows = numpy.array(rows, dtype=float) / times[:, None]
+    # Costs cannot fall below floor: pin the lowest coefficient to
+    # it and fit the rest again until none are below. Features the corpus
+    # never exercises stay at floor.
+    active = [i for i in xrange(len(FEATURES)) if rows[:, i].any()]
+    solution = []
+    while active:
+        pinned = [i for i in xrange(len(FEATURES)) if i not in active]
+        target = 1.0 - rows[:, pinned].sum(axis=1) * floor
+        (solution, _, _, _) = numpy.linalg.lstsq(
+            rows[:, active], target, rcond=None)
+        worst = solution.argmin()
+        if solution[worst] >= floor:
+            break
+        del active[worst]
+    coefficients = dict.fromkeys(FEATURES, floor)
+    for (i, k) in zip(active, solution):
+        coefficients[FEATURES[i]] = float(k)
+    return CostModel(backend, coefficients)
+
+
+# Seconds per feature, from calibrate(backend, size, repeat=3) with sizes of
+# 96 for the native backends, 40 for compile_python and 20 for eval; those
+# at MIN_COEFFICIENTS are below what the corpus could measure
+DEFAULT_MODELS = {
+    'compile': {
+        'pixels': 9.65e-09, 'nodes': 5.95e-06, 'x': 7.15e-09, 'y': 7.78e-09,
+        'constant': 8.34e-09, 'sum': 1.63e-09, 'product': 7.9e-10,
+        'mod': 1.66e-08, 'well': 9.09e-08, 'tent': 4.42e-09, 'sin': 5.15e-08,
+        'level': 1e-10, 'mix': 1.2e-08, 'shared': 1e-10, 'lookup': 1e-10,
+    },
+    'reify': {
+        'pixels': 1e-09, 'nodes': 6.28e-06, 'x': 1.45e-08, 'y': 1e-09,
+        'constant': 2.19e-09, 'sum': 2.64e-08, 'product': 1.56e-08,
+        'mod': 2.61e-08, 'well': 9.45e-08, 'tent': 2.86e-08, 'sin': 7.32e-08,
+        'level': 9.81e-09, 'mix': 7.62e-09, 'shared': 1e-09, 'lookup': 1e-09,
+    },
+    'compile_python': {
+        'pixels': 6.43e-06, 'nodes': 7.22e-06, 'x': 2e-08, 'y': 1.86e-07,
+        'constant': 1.53e-07, 'sum': 2.2e-07, 'product': 1.18e-07,
+        'mod': 4.27e-08, 'well': 5.55e-07, 'tent': 2.88e-07, 'sin': 3.03e-07,
+        'level': 2e-08, 'mix': 4.46e-07, 'shared': 2e-08, 'lookup': 2e-08,
+    },
+    None: {
+        'pixels': 1e-07, 'nodes': 1e-07, 'x': 1e-07, 'y': 1e-07,
+        'constant': 1e-07, 'sum': 2.66e-06, 'product': 3.6e-06, 'mod': 1e-07,
+        'well': 2.01e-06, 'tent': 1.6e-06, 'sin': 2.03e-06, 'level': 7.94e-06,
+        'mix': 6.94e-06, 'shared': 1e-07, 'lookup': 1e-07,
+    },
+}
+
+
+def default_model(backend):
+    '''The DEFAULT_MODELS entry for backend.'''
+    return CostModel(backend, DEFAULT_MODELS[backend])
+
+
+class Schedule(namedtuple('Schedule', ['assignments', 'loads', 'rejected'])):
+    '''assignments[i] lists the jobs given to worker i, whose estimated
+    total is loads[i]; rejected lists the jobs over budget.'''
+
+    @property
+    def makespan(self):
+        return max(self.loads) if self.loads else 0.0
+
+
+def schedule(jobs, workers, estimate, budget=None):
+    '''Spread jobs over `workers` workers so that their estimated totals
+    are balanced. estimate(job) gives a job's cost; jobs costing more than
+    budget are rejected.'''
+    costed = []
+    rejected = []
+    for (i, job) in enumerate(jobs):
+        cost = estimate(job)
+        if budget is not None and cost > budget:
+            rejected.append(job)
+        else:
+            costed.append((cost, i, job))
+    costed.sort(key=lambda item: (-item[0], item[1]))
+    assignments = [[] for _ in xrange(workers)]
+    loads = [(0.0, worker) for worker in xrange(workers)]
+    for (cost, _, job) in costed:
+        (load, worker) = heapq.heappop(loads)
+        assignments[worker].append(job)
+        heapq.heappush(loads, (load + cost, worker))
+    totals = [0.0] * workers
+    for (load, worker) in loads:
+        totals[worker] = load
+    return Schedule(assignments, totals, rejected)
+
+
+def _render_bin(args):
+    (jobs, size, backend) = args
+    from . import BaseArt
+    from .serial import loads
+    from .tiled import render_tile
+    out = []
+    for (index, data) in jobs:
+        art_impl = BaseArt(size)
+        art_impl.set_art(loads(data))
+        if backend is not None:
+            getattr(art_impl, backend)()
+        out.append((index, render_tile(art_impl, (0, 0, size, size), 'rgb')))
+    return out
+
+
+def render_batch(trees, size, processes=None, backend='auto', model=None,
+                 budget=None):
+    '''Render trees at size x size on a pool of `processes` workers (one per
+    CPU by default), handing each worker one batch of trees picked by
+    schedule using model, by default the default_model of backend. Returns
+    the Schedule of tree indexes and a dict mapping the index of each tree
+    rendered to its row-major RGB bytes.'''
+    from multiprocessing import Pool, cpu_count
+    from .serial import dumps
+    from .tiled import default_backend
+    if backend == 'auto':
+        backend = default_backend()
+    if model is None:
+        model = default_model(backend)
+    if processes is None:
+        processes = cpu_count()
+    plan = schedule(
+        range(len(trees)), processes,
+        lambda index: model.estimate(trees[index], size), budget)
+    work = [([(index, dumps(trees[index])) for index in indexes],
+             size, backend)
+            for indexes in plan.assignments if indexes]
+    pool = Pool(processes)
+    try:
+        images = {}
+        for results in pool.imap_unordered(_render_bin, work):
+            images.update(results)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return (plan, images)
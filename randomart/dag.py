@@ -0,0 +1,125 @@
+"""Common-subexpression elimination for art trees.
+
+share hash-conses an expression tree: structurally identical subtrees,
+including their Sin phase and frequency, Level threshold and Constant
+color, become one object. Subexpressions that end up with several parents
+are wrapped in Shared, which evaluates them once per pixel in eval,
+eval_grid and the reified native graph.
+"""
+import copy
+from collections import namedtuple
+
+from .formats import qcolor
+from . import Mod, Shared, subexpressions
+
+
+class SharingStats(namedtuple('SharingStats', [
+        'tree_nodes', 'dag_nodes', 'shared_nodes',
+        'tree_evaluations', 'dag_evaluations'])):
+    '''Node counts of an expression before and after sharing, and the number
+    of node evaluations each needs per pixel.'''
+
+    @property
+    def saved_evaluations(self):
+        return self.tree_evaluations - self.dag_evaluations
+
+
+def _param_key(value):
+    if isinstance(value, qcolor):
+        return value.to_tuple()
+    return value
+
+
+def _node_key(art, child_ids):
+    return (
+        type(art),
+        tuple(_param_key(getattr(art, name)) for name in art.params),
+        child_ids)
+
+
+def _references(art):
+    # Mod.eval evaluates e1 twice, so that counts as two references
+    subs = subexpressions(art)
+    if isinstance(art, Mod):
+        subs.append(art.e1)
+    return subs
+
+
+def share(art):
+    '''Return a DAG equivalent to the expression tree art.'''
+    ids = {}      # node key -> id
+    nodes = []    # id -> representative tree node
+    children = []  # id -> child ids
+
+    def intern(node):
+        if isinstance(node, Shared):
+            return intern(node.e)
+        child_ids = tuple(intern(e) for e in subexpressions(node))
+        key = _node_key(node, child_ids)
+        if key not in ids:
+            ids[key] = len(nodes)
+            nodes.append(node)
+            children.append(child_ids)
+        return ids[key]
+
+    root = intern(art)
+
+    parents = [0] * len(nodes)
+    for (i, node) in enumerate(nodes):
+        for e in _references(node):
+            parents[intern(e)] += 1
+
+    # Children are interned before their parents, so building in id order
+    # always finds the children already built.
+    built = []
+    for (i, node) in enumerate(nodes):
+        out = copy.copy(node)
+        for (name, child) in zip(node.subexprs, children[i]):
+            setattr(out, name, built[child])
+        if parents[i] > 1 and node.subexprs:
+            out = Shared(out)
+        built.append(out)
+    return built[root]
+
+
+def count_evaluations(art):
+    '''Number of node evaluations eval performs per pixel.'''
+    seen = set()
+
+    def count(node):
+        if isinstance(node, Shared):
+            if id(node) in seen:
+                return 0
+            seen.add(id(node))
+            return count(node.e)
+        return 1 + sum(count(e) for e in _references(node))
+    return count(art)
+
+
+def _unique_nodes(art):
+    seen = {}
+
+    def walk(node):
+        if id(node) not in seen:
+            seen[id(node)] = node
+            for e in subexpressions(node):
+                walk(e)
+    walk(art)
+    return seen.values()
+
+
+def sharing_stats(tree, dag):
+    '''Compare an expression tree with the DAG share built from it.'''
+    nodes = _unique_nodes(dag)
+    shared = sum(1 for node in nodes if isinstance(node, Shared))
+
+    def tree_nodes(node):
+        if isinstance(node, Shared):
+            return tree_nodes(node.e)
+        return 1 + sum(tree_nodes(e) for e in subexpressions(node))
+    return SharingStats(
+        tree_nodes=tree_nodes(tree),
+        dag_nodes=len(nodes) - shared,
+        shared_nodes=shared,
+        tree_evaluations=count_evaluations(tree),
+        dag_evaluations=count_evaluations(dag))
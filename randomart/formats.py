@@ -1,7 +1,7 @@
 from ctypes import (
     Structure, POINTER, CFUNCTYPE, CDLL, pointer,
     c_int, c_ubyte, c_double, c_size_t, c_char_p,
-    c_char
+    c_char, c_int32, c_uint64, c_void_p, byref
 )
 
 
@@ -84,11 +84,30 @@ class qcolor(Structure):
         return True
 
 
+class qcolor_soa(Structure):
+    """Colors of n points as the addresses of three channel buffers of n
+    doubles, for the batch kernels of transforms."""
+    _fields_ = [
+        ('c', c_void_p * 3),
+    ]
+
+
+class ra_profile_counter(Structure):
+    _fields_ = [
+        ('calls', c_uint64),
+        ('nanos', c_uint64),
+        ('apply', c_void_p),
+    ]
+
+
 class transforminfo(Structure):
 
     def __call__(self, x, y):
         return self.eval(x, y)
 
+    def eval(self, x, y):
+        return librandomart.ra_transforminfo_apply(pointer(self), x, y)
+
 
 transforminfo_apply = CFUNCTYPE(
     qcolor, POINTER(transforminfo), c_double, c_double)
@@ -100,7 +119,8 @@ transforminfo._fields_ = [
     ('apply', transforminfo_apply),
     ('inspect', transforminfo_inspect),
     ('subslots', POINTER(transforminfo) * 4),
-    ('data', c_char * 80)
+    ('data', c_char * 80),
+    ('profile', ra_profile_counter),
 ]
 
 
@@ -112,6 +132,9 @@ except OSError:
 
 _transformer_func = [POINTER(transforminfo), c_double, c_double]
 
+librandomart.ra_transforminfo_apply.restype = qcolor
+librandomart.ra_transforminfo_apply.argtypes = _transformer_func
+
 
 librandomart.ra_variable_x_init.restype = None
 librandomart.ra_variable_x_init.argtypes = [POINTER(transforminfo)]
@@ -332,3 +355,253 @@ class ra_mix(transforminfo):
     def eval(self, x, y):
         return librandomart.ra_mix(pointer(self), x, y)
 
+
+librandomart.ra_shared_init.restype = None
+librandomart.ra_shared_init.argtypes = [
+    POINTER(transforminfo),
+    POINTER(transforminfo)
+]
+librandomart.ra_shared.restype = qcolor
+librandomart.ra_shared.argtypes = _transformer_func
+
+
+class ra_shared(transforminfo):
+    def __init__(self, e1):
+        assert isinstance(e1, transforminfo)
+        self._pins = (e1, )  # pin to avoid garbage collection
+        librandomart.ra_shared_init(
+            pointer(self), pointer(e1))
+
+    def eval(self, x, y):
+        return librandomart.ra_shared(pointer(self), x, y)
+
+
+librandomart.ra_lookup_init.restype = None
+librandomart.ra_lookup_init.argtypes = [
+    POINTER(transforminfo),
+    c_int, c_int,
+    POINTER(qcolor),
+    POINTER(transforminfo)
+]
+librandomart.ra_lookup.restype = qcolor
+librandomart.ra_lookup.argtypes = _transformer_func
+
+
+class ra_lookup(transforminfo):
+    def __init__(self, axis, table, e1):
+        assert isinstance(e1, transforminfo)
+        table = (qcolor * len(table))(*table)
+        self._pins = (table, e1)  # pin to avoid garbage collection
+        librandomart.ra_lookup_init(
+            pointer(self), axis, len(table), table, pointer(e1))
+
+    def eval(self, x, y):
+        return librandomart.ra_lookup(pointer(self), x, y)
+
+
+class _arena(Structure):
+    _fields_ = [
+        ('root', POINTER(transforminfo)),
+        ('count', c_size_t),
+        ('nodes', POINTER(transforminfo)),
+        ('tables', POINTER(qcolor)),
+    ]
+
+
+librandomart.ra_arena_build.restype = c_int
+librandomart.ra_arena_build.argtypes = [
+    c_char_p, c_size_t, POINTER(POINTER(_arena))]
+librandomart.ra_arena_free.restype = None
+librandomart.ra_arena_free.argtypes = [POINTER(_arena)]
+
+
+class ra_arena(object):
+    """A whole tree built natively from one record body of randomart.serial
+    into a single block, the nodes laid out in evaluation order, with no
+    Python object per node. `root` renders through render_rgb/render_packed
+    like any reified transforminfo and keeps the arena alive."""
+
+    # held here, as module globals may be gone when __del__ runs at exit
+    _free = librandomart.ra_arena_free
+
+    def __init__(self, record):
+        self._handle = POINTER(_arena)()
+        status = librandomart.ra_arena_build(
+            record, len(record), byref(self._handle))
+        if status == -1:
+            raise ValueError("malformed art record")
+        _check_alloc(status)
+        self.count = self._handle.contents.count
+
+    @property
+    def root(self):
+        if not self._handle:
+            raise ValueError("arena already freed")
+        root = self._handle.contents.root.contents
+        root._arena = self
+        return root
+
+    def free(self):
+        """Release the arena now; its nodes must no longer be used."""
+        if self._handle:
+            self._free(self._handle)
+            self._handle = type(self._handle)()
+
+    def __del__(self):
+        self.free()
+
+
+_render_func = [
+    POINTER(transforminfo), c_int, c_int,
+    c_int, c_int, c_int, c_int,
+]
+
+librandomart.ra_render_rgb.restype = None
+librandomart.ra_render_rgb.argtypes = _render_func + [POINTER(c_ubyte)]
+librandomart.ra_render_packed.restype = None
+librandomart.ra_render_packed.argtypes = _render_func + [POINTER(c_int32)]
+
+
+class ra_insn(Structure):
+    _fields_ = [
+        ('opcode', c_int32),
+        ('dst', c_int32),
+        ('src', c_int32 * 3),
+        ('constant', c_int32),
+    ]
+
+
+class ra_program(Structure):
+    """A flat postfix program, as built by randomart.program, loaded for the
+    native interpreter. Renders through render_rgb/render_packed like a
+    reified transforminfo tree."""
+    _fields_ = [
+        ('code', POINTER(ra_insn)),
+        ('length', c_int32),
+        ('constants', POINTER(c_double)),
+        ('registers', c_int32),
+    ]
+
+    def __init__(self, code, constants, registers):
+        code_buf = (ra_insn * len(code))()
+        for (insn, (opcode, dst, src, constant)) in zip(code_buf, code):
+            insn.opcode = opcode
+            insn.dst = dst
+            insn.src[:] = src
+            insn.constant = constant
+        const_buf = (c_double * max(1, len(constants)))(*constants)
+        Structure.__init__(self, code_buf, len(code), const_buf, registers)
+        self._pins = (code_buf, const_buf)  # pin to avoid garbage collection
+
+    def __call__(self, x, y):
+        return self.eval(x, y)
+
+    def eval(self, x, y):
+        out = qcolor()
+        _check_alloc(librandomart.ra_program_eval(
+            pointer(self), 1, byref(c_double(x)), byref(c_double(y)),
+            pointer(out)))
+        return out
+
+
+def _check_alloc(status):
+    if status != 0:
+        raise MemoryError("librandomart could not allocate memory")
+
+
+librandomart.ra_program_eval.restype = c_int
+librandomart.ra_program_eval.argtypes = [
+    POINTER(ra_program), c_int,
+    POINTER(c_double), POINTER(c_double),
+    POINTER(qcolor)
+]
+
+_program_render_func = [POINTER(ra_program)] + _render_func[1:]
+
+librandomart.ra_program_render_rgb.restype = c_int
+librandomart.ra_program_render_rgb.argtypes = \
+    _program_render_func + [POINTER(c_ubyte)]
+librandomart.ra_program_render_packed.restype = c_int
+librandomart.ra_program_render_packed.argtypes = \
+    _program_render_func + [POINTER(c_int32)]
+
+
+def image_size(size):
+    """(width, height) of an image size given as a side length or as a
+    (width, height) pair."""
+    if isinstance(size, tuple):
+        return size
+    return (size, size)
+
+
+def _render_region(size, region):
+    (size_x, size_y) = image_size(size)
+    if region is None:
+        region = (0, 0, size_x, size_y)
+    (x0, y0, width, height) = region
+    if x0 < 0 or y0 < 0 or width < 0 or height < 0:
+        raise ValueError("invalid region {!r}".format(region))
+    if x0 + width > size_x or y0 + height > size_y:
+        raise ValueError("region {!r} exceeds size {}".format(region, size))
+    return (size_x, size_y) + tuple(region)
+
+
+def render_rgb(info, size, out, region=None, offset=0):
+    """Render a region of an image of `info` into the writable buffer `out`
+    as row-major RGB bytes. `info` is a reified transforminfo or an
+    ra_program. `size` is the side length of a square image or its
+    (width, height); each axis spans [-1, 1] whatever the aspect ratio.
+    `region` is (x0, y0, width, height) and defaults to the whole image;
+    `offset` is the byte offset into `out` at which the region starts."""
+    (size_x, size_y, x0, y0, width, height) = _render_region(size, region)
+    buf = (c_ubyte * (width * height * 3)).from_buffer(out, offset)
+    if isinstance(info, ra_program):
+        _check_alloc(librandomart.ra_program_render_rgb(
+            pointer(info), size_x, size_y, x0, y0, width, height, buf))
+    else:
+        librandomart.ra_render_rgb(
+            pointer(info), size_x, size_y, x0, y0, width, height, buf)
+
+
+def render_packed(info, size, out, region=None, offset=0):
+    """Like render_rgb, but writes column-major packed RGB integers into an
+    array('i') as laid out by MemorySlabArt.target."""
+    (size_x, size_y, x0, y0, width, height) = _render_region(size, region)
+    buf = (c_int32 * (width * height)).from_buffer(out, offset)
+    if isinstance(info, ra_program):
+        _check_alloc(librandomart.ra_program_render_packed(
+            pointer(info), size_x, size_y, x0, y0, width, height, buf))
+    else:
+        librandomart.ra_render_packed(
+            pointer(info), size_x, size_y, x0, y0, width, height, buf)
+
+
+librandomart.ra_profile_set.restype = None
+librandomart.ra_profile_set.argtypes = [c_int]
+librandomart.ra_profile_tree.restype = None
+librandomart.ra_profile_tree.argtypes = [POINTER(transforminfo), c_int]
+librandomart.ra_profile_vm.restype = c_int
+librandomart.ra_profile_vm.argtypes = [POINTER(ra_profile_counter), c_int]
+
+# the number of opcodes, see randomart.program
+RA_OP_COUNT = 13
+
+
+def profile_set(enabled):
+    """Turn counting and timing of the native interpreter's instructions on
+    or off, see randomart.profiling."""
+    librandomart.ra_profile_set(1 if enabled else 0)
+
+
+def profile_tree(info, enabled=True):
+    """Make the nodes of the reified tree `info` count and time their
+    evaluations in info.profile, or stop."""
+    librandomart.ra_profile_tree(pointer(info), 1 if enabled else 0)
+
+
+def profile_vm(reset=False):
+    """The ra_profile_counter of each opcode of the native interpreter,
+    optionally zeroing them."""
+    counters = (ra_profile_counter * RA_OP_COUNT)()
+    librandomart.ra_profile_vm(counters, 1 if reset else 0)
+    return counters
@@ -0,0 +1,61 @@
+"""Simplification of art trees before rendering.
+
+optimize rewrites a tree bottom-up, replacing pixel-independent subtrees by
+the Constant they evaluate to and dropping operators whose result is fixed
+to one of their operands. The input tree is left untouched.
+"""
+import copy
+
+from .formats import qcolor
+from . import (
+    Constant, Product, Mod, Level, Mix, Shared,
+    subexpressions)
+
+
+def count_nodes(art):
+    return 1 + sum(count_nodes(e) for e in subexpressions(art))
+
+
+def _is_constant(art, value=None):
+    if not isinstance(art, Constant):
+        return False
+    return value is None or art.c.to_tuple() == (value, value, value)
+
+
+def _simplify(art):
+    if isinstance(art, Shared) and not art.e.subexprs:
+        return art.e
+    if isinstance(art, Level) and _is_constant(art.level):
+        below = [c < art.treshold for c in art.level.c.to_tuple()]
+        if all(below):
+            return art.e1
+        if not any(below):
+            return art.e2
+    if isinstance(art, Mix) and _is_constant(art.w):
+        if art.w.c.r == 1.0:
+            return art.e1
+        if art.w.c.r == -1.0:
+            return art.e2
+    if isinstance(art, Product):
+        for (e1, e2) in ((art.e1, art.e2), (art.e2, art.e1)):
+            if _is_constant(e1, 1.0):
+                return e2
+            if _is_constant(e1, 0.0):
+                return e1
+    # Mod is left alone: eval and the native ra_mod disagree on its
+    # divisor, so folding it would change one of the two renderings.
+    if isinstance(art, Mod):
+        return art
+    subs = subexpressions(art)
+    if subs and all(_is_constant(e) for e in subs):
+        c = art.eval(0.0, 0.0)
+        return Constant(qcolor(c.r, c.g, c.b))
+    return art
+
+
+def optimize(art):
+    '''Return a simplified copy of the expression tree art.'''
+    out = copy.copy(art)
+    for name in art.subexprs:
+        setattr(out, name, optimize(getattr(art, name)))
+    return _simplify(out)
@@ -0,0 +1,243 @@
+"""Pipelined batch rendering.
+
+run_pipeline generates random art, renders it and writes PNGs in three
+stages, each running on its own set of worker processes:
+
+    generate   draw a tree and encode it with serial.dumps
+    render     render it to RGB bytes with the chosen backend
+    encode     compress the pixels to a PNG and write it out
+
+Stages are connected by multiprocessing queues holding at most queue_size
+items, so a stage that runs ahead blocks once the next one falls behind
+and memory use stays bounded by the queue sizes. Images are numbered from
+start, and each is written to pattern % index via a temporary file, so an
+interrupted run leaves no partial images and can be resumed from
+PipelineStats.resume_index.
+
+The generate stage can also filter trees. With max_cost it skips those that
+cost.default_model predicts would take longer than that to render, and
+with probe.Thresholds it probes each tree and regenerates (or skips, with
+regenerate=False) those found degenerate.
+"""
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import Process, Queue, cpu_count
+
+from . import serial
+
+
+DEFAULT_PATTERN = 'out/out%08x_n.png'
+DEFAULT_QUEUE_SIZE = 4
+
+# marks the end of a queue's items, once per consumer
+_DONE = None
+
+
+class PipelineStats(namedtuple('PipelineStats', [
+        'images', 'elapsed', 'generate_time', 'render_time', 'encode_time',
+        'resume_index', 'rejected', 'degenerate', 'probes'])):
+    '''The number of images written, the wall clock time taken, the time
+    spent by all workers of each stage, the first index neither written nor
+    skipped, the number of indexes skipped as too costly or degenerate and
+    the probe.ProbeReport of all probes.'''
+
+    @property
+    def images_per_second(self):
+        return self.images / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        lines = ['%d images in %.2fs (%.2f images/s)' % (
+            self.images, self.elapsed, self.images_per_second)]
+        for stage in ('generate', 'render', 'encode'):
+            busy = getattr(self, stage + '_time')
+            lines.append('  %-8s %8.2fs busy, %.2fs per image' % (
+                stage, busy, busy / self.images if self.images else 0.0))
+        if self.rejected:
+            lines.append('%d trees over the cost budget' % self.rejected)
+        if self.degenerate:
+            lines.append('%d degenerate trees skipped' % self.degenerate)
+        if self.probes.probed:
+            lines.append(self.probes.summary())
+        lines.append('resume from %x' % self.resume_index)
+        return '\n'.join(lines)
+
+
+# Seeded regeneration of degenerate art tries seed + index + n * _ATTEMPT
+_ATTEMPT = 1 << 40
+_MAX_ATTEMPTS = 10
+
+
+def _generate_worker(inq, outq, results, options):
+    from . import generate, generate_seeded, SEED_MASK
+    from .cost import default_model
+    from .probe import probe
+    seed = options['seed']
+    (min_size, max_size) = options['tree_sizes']
+    (size, backend) = (options['size'], options['backend'])
+    (max_cost, thresholds) = (options['max_cost'], options['thresholds'])
+    attempts = _MAX_ATTEMPTS if options['regenerate'] else 1
+    model = default_model(backend)
+    # seeded from os.urandom, as forked workers would otherwise all share
+    # the parent's random state
+    rng = random.Random()
+    for index in iter(inq.get, _DONE):
+        t_i = time.time()
+        for attempt in xrange(attempts):
+            if seed is None:
+                art = generate(rng.randrange(min_size, max_size), rng)
+            else:
+                art = generate_seeded(
+                    (seed + index + attempt * _ATTEMPT) & SEED_MASK,
+                    min_size, max_size)
+            if thresholds is None:
+                accepted = True
+                break
+            stats = probe(art, backend)
+            accepted = thresholds.accepts(stats)
+            estimate = 0.0 if accepted else model.estimate(art, size)
+            results.put(('probe', stats, accepted, estimate))
+            if accepted:
+                break
+        if not accepted:
+            results.put(('skipped', index, 'degenerate'))
+        elif max_cost is not None and model.estimate(art, size) > max_cost:
+            results.put(('skipped', index, 'cost'))
+        else:
+            outq.put((index, serial.dumps(art), time.time() - t_i))
+
+
+def _render_worker(inq, outq, size, backend):
+    from . import BaseArt
+    from .tiled import render_tile
+    for (index, art, t_gen) in iter(inq.get, _DONE):
+        t_i = time.time()
+        art_impl = BaseArt(size)
+        art_impl.set_art(serial.loads(art))
+        if backend is not None:
+            getattr(art_impl, backend)()
+        pixels = render_tile(art_impl, (0, 0, size, size), 'rgb')
+        outq.put((index, pixels, t_gen, time.time() - t_i))
+
+
+def _encode_worker(inq, outq, size, pattern):
+    from .stream import write_png_bands
+    for (index, pixels, t_gen, t_render) in iter(inq.get, _DONE):
+        t_i = time.time()
+        path = pattern % index
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as outfh:
+            write_png_bands(outfh, size, size, [pixels])
+        os.rename(tmp, path)
+        outq.put(('written', index, t_gen, t_render, time.time() - t_i))
+    outq.put(_DONE)
+
+
+def _start(target, count, args):
+    workers = [Process(target=target, args=args) for _ in xrange(count)]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    return workers
+
+
+def run_pipeline(start=0, count=None, size=512, pattern=DEFAULT_PATTERN,
+                 generators=1, renderers=None, encoders=1,
+                 queue_size=DEFAULT_QUEUE_SIZE, backend='auto',
+                 tree_sizes=(20, 150), seed=None, max_cost=None,
+                 thresholds=None, regenerate=True, progress=None):
+    '''Write count images (forever if None) numbered from start, rendering
+    on `renderers` processes (one per CPU by default) and using the given
+    number of processes for the other stages. backend is as for
+    service.RenderService. With a seed, image i is the art of
+    generate_seeded(seed + i), so runs can be reproduced and resumed
+    exactly. Trees estimated to take more than max_cost seconds to render
+    are skipped, and with probe.Thresholds degenerate trees are drawn again
+    (up to 10 times) or, if regenerate is false, skipped. progress(index,
+    path) is called as each image is written.
+    Returns PipelineStats; on KeyboardInterrupt the workers are stopped
+    and the stats so far are returned.'''
+    from .probe import ProbeReport
+    from .tiled import default_backend
+    if backend == 'auto':
+        backend = default_backend()
+    options = {
+        'seed': seed, 'tree_sizes': tree_sizes, 'size': size,
+        'backend': backend, 'max_cost': max_cost, 'thresholds': thresholds,
+        'regenerate': regenerate}
+    if renderers is None:
+        renderers = cpu_count()
+    indexes = Queue(queue_size)
+    trees = Queue(queue_size)
+    images = Queue(queue_size)
+    results = Queue()
+    stages = [
+        _start(_generate_worker, generators,
+               (indexes, trees, results, options)),
+        _start(_render_worker, renderers, (trees, images, size, backend)),
+        _start(_encode_worker, encoders, (images, results, size, pattern)),
+    ]
+    stop = threading.Event()
+
+    def feed():
+        # hand out indexes, then shut the stages down in order as each one
+        # finishes its input
+        index = start
+        while not stop.is_set() and (count is None or index < start + count):
+            indexes.put(index)
+            index += 1
+        for _ in stages[0]:
+            indexes.put(_DONE)
+        for (queue, producers, consumers) in (
+                (trees, stages[0], stages[1]),
+                (images, stages[1], stages[2])):
+            for worker in producers:
+                worker.join()
+            for _ in consumers:
+                queue.put(_DONE)
+
+    feeder = threading.Thread(target=feed)
+    feeder.daemon = True
+    t_i = time.time()
+    feeder.start()
+    written = set()
+    skipped = {'cost': set(), 'degenerate': set()}
+    probes = ProbeReport()
+    totals = [0.0, 0.0, 0.0]
+    finished = 0
+    try:
+        while finished < encoders:
+            result = results.get()
+            if result is _DONE:
+                finished += 1
+                continue
+            if result[0] == 'skipped':
+                skipped[result[2]].add(result[1])
+                continue
+            if result[0] == 'probe':
+                probes.add(*result[1:])
+                continue
+            (_, index, t_gen, t_render, t_encode) = result
+            written.add(index)
+            for (i, t) in enumerate((t_gen, t_render, t_encode)):
+                totals[i] += t
+            if progress is not None:
+                progress(index, pattern % index)
+        feeder.join()
+    except KeyboardInterrupt:
+        stop.set()
+        for workers in stages:
+            for worker in workers:
+                worker.terminate()
+    for workers in stages:
+        for worker in workers:
+            worker.join()
+    resume = start
+    done = written.union(*skipped.values())
+    while resume in done:
+        resume += 1
+    return PipelineStats(
+        len(written), time.time() - t_i, totals[0], totals[1], totals[2],
+        resume, len(skipped['cost']), len(skipped['degenerate']), probes)
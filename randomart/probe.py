@@ -0,0 +1,145 @@
+"""Cheap detection of degenerate art.
+
+A large share of generated trees render to a flat or nearly flat image.
+probe renders a tree on a small grid, by default 32 x 32, which samples
+the same [-1, 1] square as the full image, and measures
+
+    variance         of the 0-255 channel values, averaged over channels
+    distinct_colors  number of different RGB colors
+    edge_energy      mean absolute difference of a channel between
+                     horizontally or vertically adjacent samples
+
+Art is acceptable when every statistic reaches its Thresholds minimum.
+generate_acceptable draws trees until one is, and run_pipeline uses probes
+to skip or regenerate degenerate trees; ProbeReport totals the render time
+this saves, as estimated by cost.default_model, against the time spent
+probing.
+"""
+import random
+import time
+from collections import namedtuple
+
+
+DEFAULT_PROBE_SIZE = 32
+
+
+class ProbeStats(namedtuple('ProbeStats', [
+        'variance', 'distinct_colors', 'edge_energy', 'time'])):
+    '''Statistics of a probe render and the seconds it took.'''
+
+
+class Thresholds(namedtuple('Thresholds', [
+        'min_variance', 'min_distinct_colors', 'min_edge_energy'])):
+    '''Minimum ProbeStats of acceptable art. The defaults reject the flat
+    images, a third of what generate() produces, and the few with only a
+    handful of colors or no visible structure.'''
+
+    def __new__(cls, min_variance=16.0, min_distinct_colors=8,
+                min_edge_energy=0.05):
+        return super(Thresholds, cls).__new__(
+            cls, min_variance, min_distinct_colors, min_edge_energy)
+
+    def accepts(self, stats):
+        return (stats.variance >= self.min_variance and
+                stats.distinct_colors >= self.min_distinct_colors and
+                stats.edge_energy >= self.min_edge_energy)
+
+
+class ProbeReport(object):
+    '''Running totals of probes: how many trees were rejected, the time
+    spent probing and the estimated time their full renders would have
+    taken.'''
+
+    def __init__(self):
+        self.probed = 0
+        self.rejected = 0
+        self.probe_time = 0.0
+        self.render_time_avoided = 0.0
+
+    def add(self, stats, accepted, render_estimate):
+        self.probed += 1
+        self.probe_time += stats.time
+        if not accepted:
+            self.rejected += 1
+            self.render_time_avoided += render_estimate
+
+    @property
+    def time_saved(self):
+        return self.render_time_avoided - self.probe_time
+
+    def summary(self):
+        return ('%d of %d trees degenerate; %.2fs probing saved an estimated '
+                '%.2fs of rendering' % (
+                    self.rejected, self.probed, self.probe_time,
+                    self.render_time_avoided))
+
+
+def pixel_stats(pixels, width, height):
+    '''variance, distinct_colors and edge_energy of row-major RGB bytes.'''
+    values = bytearray(pixels)
+    count = width * height
+    variance = 0.0
+    for channel in xrange(3):
+        samples = values[channel::3]
+        mean = sum(samples) / float(count)
+        variance += sum((v - mean) ** 2 for v in samples) / count
+    colors = set(
+        bytes(values[i:i + 3]) for i in xrange(0, len(values), 3))
+    edges = 0
+    pairs = 0
+    stride = width * 3
+    for y in xrange(height):
+        row = y * stride
+        for i in xrange(row, row + stride - 3):
+            edges += abs(values[i] - values[i + 3])
+        pairs += (width - 1) * 3
+        if y + 1 < height:
+            for i in xrange(row, row + stride):
+                edges += abs(values[i] - values[i + stride])
+            pairs += stride
+    return (variance / 3, len(colors), float(edges) / pairs if pairs else 0.0)
+
+
+def probe(art, backend='auto', size=DEFAULT_PROBE_SIZE):
+    '''Render art at size x size with backend, as for tiled._init_worker,
+    and return its ProbeStats.'''
+    from . import BaseArt
+    from .tiled import default_backend, render_tile
+    if backend == 'auto':
+        backend = default_backend()
+    t_i = time.time()
+    art_impl = BaseArt(size)
+    art_impl.set_art(art)
+    if backend is not None:
+        getattr(art_impl, backend)()
+    pixels = render_tile(art_impl, (0, 0, size, size), 'rgb')
+    stats = pixel_stats(pixels, size, size)
+    return ProbeStats(*(stats + (time.time() - t_i, )))
+
+
+def generate_acceptable(thresholds=None, rng=random, tree_sizes=(20, 150),
+                        attempts=100, backend='auto', size=512,
+                        report=None):
+    '''Generate trees from rng until one passes the thresholds, or
+    `attempts` have failed, in which case the last is returned. With a
+    ProbeReport, each probe is recorded against the cost of rendering at
+    size.'''
+    from . import generate
+    from .cost import default_model
+    from .tiled import default_backend
+    if thresholds is None:
+        thresholds = Thresholds()
+    if backend == 'auto':
+        backend = default_backend()
+    for _ in xrange(attempts):
+        art = generate(rng.randrange(*tree_sizes), rng)
+        stats = probe(art, backend)
+        accepted = thresholds.accepts(stats)
+        if report is not None:
+            estimate = 0.0
+            if not accepted:
+                estimate = default_model(backend).estimate(art, size)
+            report.add(stats, accepted, estimate)
+        if accepted:
+            break
+    return art
@@ -0,0 +1,260 @@
+"""Opt-in profiling of evaluation.
+
+With RA_PROFILE=1 in the environment, read on import like RA_NONATIVE and
+RA_COMPARE,
+
+  * the eval method of each art class counts and times the calls of each
+    node, subexpressions included;
+  * each per-node implementation in transforms, native or not, counts and
+    times its calls under its symbol or function name, so the cost of going
+    through ctypes shows next to that of the Python versions;
+  * librandomart counts and times the evaluations of each node of trees
+    reified by BaseArt.reify and the pixels each VM opcode runs over.
+
+Otherwise nothing is wrapped and the VM only tests a flag per instruction
+and block of pixels. report(art_impl) breaks the cost of the last render of
+art_impl down by node type and by subtree; self time is a node's time less
+that of its subexpressions, approximate where those are shared. Try
+
+    RA_PROFILE=1 python -m randomart.profiling --backend reify --size 128
+"""
+import argparse
+import os
+import time
+from collections import namedtuple
+from ctypes import addressof, create_string_buffer, pointer
+
+
+ENABLED = bool(int(os.environ.get('RA_PROFILE', '0')))
+
+# id(node) -> [node, calls, seconds] for eval of the art classes
+_nodes = {}
+# name -> [calls, seconds] for the transforms implementations
+_components = {}
+
+
+class ProfileEntry(namedtuple('ProfileEntry', [
+        'name', 'nodes', 'calls', 'self_time', 'total_time'])):
+    '''Cost of the nodes called name, or of one subtree: their number,
+    their evaluations, and the seconds spent in them without and with
+    their subexpressions.'''
+
+
+def _timed_eval(evaluate):
+    def eval(self, x, y):
+        t_i = time.time()
+        out = evaluate(self, x, y)
+        elapsed = time.time() - t_i
+        record = _nodes.get(id(self))
+        if record is None:
+            record = _nodes[id(self)] = [self, 0, 0.0]
+        record[1] += 1
+        record[2] += elapsed
+        return out
+    eval.__doc__ = evaluate.__doc__
+    return eval
+
+
+def instrument(classes):
+    '''Profile the eval methods of classes and turn on native profiling.'''
+    from . import formats
+    for cls in classes:
+        cls.eval = _timed_eval(cls.__dict__['eval'])
+    formats.profile_set(True)
+
+
+def timed_component(name, impl):
+    '''Wrap a transforms implementation to count and time its calls.'''
+    record = _components.setdefault(name, [0, 0.0])
+
+    def timed(*args):
+        t_i = time.time()
+        impl(*args)
+        record[0] += 1
+        record[1] += time.time() - t_i
+    return timed
+
+
+def _reified_children(info):
+    return [slot.contents for slot in info.subslots if slot]
+
+
+def _reified_name(info):
+    # arena nodes are all plain transforminfo, so ask the node itself
+    buf = create_string_buffer(64)
+    info.inspect(pointer(info), buf, len(buf))
+    return buf.value.split('(')[0]
+
+
+def reset(art_impl=None):
+    '''Zero all counters, and those of the reified tree of art_impl.'''
+    from . import formats
+    _nodes.clear()
+    for record in _components.itervalues():
+        record[:] = [0, 0.0]
+    if ENABLED:
+        formats.profile_vm(reset=True)
+    reified = getattr(art_impl, 'art_reified', None)
+    if isinstance(reified, formats.transforminfo):
+        stack = [reified]
+        while stack:
+            info = stack.pop()
+            info.profile.calls = info.profile.nanos = 0
+            stack.extend(_reified_children(info))
+
+
+def _tree_entries(root, children, counts, name, key=id):
+    # One ProfileEntry per distinct node, in prefix order, with its depth;
+    # nodes are the same when their keys are
+    entries = []
+    seen = set()
+
+    def walk(node, depth):
+        if key(node) in seen:
+            return
+        seen.add(key(node))
+        (calls, total) = counts(node)
+        subtrees = children(node)
+        inner = sum(counts(e)[1] for e in dict(
+            (key(e), e) for e in subtrees).itervalues())
+        entries.append((depth, node, ProfileEntry(
+            name(node), 1, calls, max(0.0, total - inner), total)))
+        for e in subtrees:
+            walk(e, depth + 1)
+    walk(root, 0)
+    return entries
+
+
+def _python_counts(node):
+    record = _nodes.get(id(node))
+    return (record[1], record[2]) if record else (0, 0.0)
+
+
+def _native_counts(info):
+    return (info.profile.calls, info.profile.nanos * 1e-9)
+
+
+def _reified_repr(info, depth=3):
+    name = _reified_name(info)
+    children = _reified_children(info)
+    if not children:
+        return name
+    if depth == 0:
+        return name + '(...)'
+    return '%s(%s)' % (
+        name, ', '.join(_reified_repr(e, depth - 1) for e in children))
+
+
+def node_entries(art_impl):
+    '''(depth, node, ProfileEntry) of every node of the art of art_impl as
+    last rendered with eval or a reified tree, in prefix order.'''
+    from . import subexpressions
+    reified = art_impl.art_reified
+    if reified is None:
+        return _tree_entries(
+            art_impl.art, subexpressions, _python_counts,
+            lambda node: type(node).__name__)
+    return _tree_entries(
+        reified, _reified_children, _native_counts, _reified_name,
+        addressof)
+
+
+def describe(node):
+    '''Short text of a node of node_entries.'''
+    from .formats import transforminfo
+    if isinstance(node, transforminfo):
+        return _reified_repr(node)
+    return repr(node)
+
+
+def by_type(entries):
+    '''Sum entries by name, costliest first.'''
+    totals = {}
+    for entry in entries:
+        previous = totals.get(entry.name)
+        if previous is not None:
+            entry = ProfileEntry(*[entry[0]] + [
+                a + b for (a, b) in zip(previous[1:], entry[1:])])
+        totals[entry.name] = entry
+    return sorted(totals.itervalues(), key=lambda e: -e.self_time)
+
+
+def opcode_entries():
+    '''A ProfileEntry per opcode the native interpreter ran, counting the
+    pixels it was run over as calls.'''
+    from .formats import profile_vm
+    from .program import opcodes
+    return [ProfileEntry(opcodes[op][0], 0, counter.calls,
+                         counter.nanos * 1e-9, counter.nanos * 1e-9)
+            for (op, counter) in enumerate(profile_vm()) if counter.calls]
+
+
+def component_entries():
+    '''A ProfileEntry per transforms implementation that was called.'''
+    return sorted(
+        (ProfileEntry(name, 0, calls, seconds, seconds)
+         for (name, (calls, seconds)) in _components.iteritems() if calls),
+        key=lambda e: -e.self_time)
+
+
+def _table(title, entries):
+    lines = [title, '  %-20s %6s %10s %10s %10s' % (
+        'name', 'nodes', 'calls', 'self ms', 'total ms')]
+    for e in entries:
+        lines.append('  %-20s %6s %10d %10.2f %10.2f' % (
+            e.name[:20], e.nodes or '', e.calls, e.self_time * 1e3,
+            e.total_time * 1e3))
+    return lines
+
+
+def report(art_impl, limit=10):
+    '''Text report of the profile of the last render of art_impl: by node
+    type, by subtree (the `limit` costliest), and by transforms
+    implementation, or by opcode for compiled art.'''
+    from .formats import ra_program
+    lines = []
+    if isinstance(art_impl.art_reified, ra_program):
+        lines.extend(_table('by opcode', sorted(
+            opcode_entries(), key=lambda e: -e.self_time)))
+    elif art_impl.art_compiled is None:
+        entries = node_entries(art_impl)
+        lines.extend(_table('by node type', by_type(
+            e for (_, _, e) in entries)))
+        lines.append('by subtree')
+        costliest = sorted(entries, key=lambda item: -item[2].total_time)
+        for (depth, node, e) in costliest[:limit]:
+            lines.append('  %10.2f ms %10d calls  depth %-3d %.50s' % (
+                e.total_time * 1e3, e.calls, depth, describe(node)))
+    components = component_entries()
+    if components:
+        lines.extend(_table('by transforms implementation', components))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seed', type=lambda v: int(v, 0), default=0x5eed)
+    parser.add_argument('--size', type=int, default=64)
+    parser.add_argument('--backend', default='eval',
+                        choices=('eval', 'reify', 'compile'))
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args(argv)
+    if not ENABLED:
+        parser.error("set RA_PROFILE=1 in the environment")
+    from . import BaseArt, generate_seeded
+    from .tiled import render_tile
+    # run as a script, this is not the module the art classes record into
+    from .profiling import reset, report
+    art_impl = BaseArt(args.size)
+    art_impl.set_art(generate_seeded(args.seed))
+    if args.backend != 'eval':
+        getattr(art_impl, args.backend)()
+    reset(art_impl)
+    t_i = time.time()
+    render_tile(art_impl, (0, 0, args.size, args.size), 'rgb')
+    print('rendered in %.2fs' % (time.time() - t_i))
+    print(report(art_impl, args.limit))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Compilation of art trees to flat postfix programs.
+
+A program is a list of instructions (opcode, dst, src, constant) over a
+register file, where dst and the three src slots are register numbers and
+constant indexes the first of the instruction's constants. Registers are
+allocated as a stack: operands of an instruction sit on top of the stack
+and its result replaces them, so register 0 holds the final color.
+
+Programs are executed by the interpreter in librandomart, which runs each
+instruction over a block of pixels at a time; see formats.ra_program.
+"""
+from . import formats
+
+
+OP_VAR_X = 0
+OP_VAR_Y = 1
+OP_CONSTANT = 2
+OP_SUM = 3
+OP_PRODUCT = 4
+OP_MOD = 5
+OP_WELL = 6
+OP_TENT = 7
+OP_SIN = 8
+OP_LEVEL = 9
+OP_MIX = 10
+OP_LOOKUP_GUARD = 11
+OP_LOOKUP = 12
+
+# name, number of source registers, number of constants (None if variable)
+opcodes = {
+    OP_VAR_X: ('var_x', 0, 0),
+    OP_VAR_Y: ('var_y', 0, 0),
+    OP_CONSTANT: ('constant', 0, 3),
+    OP_SUM: ('sum', 2, 0),
+    OP_PRODUCT: ('product', 2, 0),
+    OP_MOD: ('mod', 2, 0),
+    OP_WELL: ('well', 1, 0),
+    OP_TENT: ('tent', 1, 0),
+    OP_SIN: ('sin', 1, 2),
+    OP_LEVEL: ('level', 3, 1),
+    OP_MIX: ('mix', 3, 0),
+    OP_LOOKUP_GUARD: ('guard', 0, None),
+    OP_LOOKUP: ('lookup', 1, None),
+}
+
+
+class Program(object):
+    def __init__(self):
+        self.code = []
+        self.constants = []
+        self.registers = 0
+        self._depth = 0
+
+    def emit(self, opcode, src=(), constants=(), pop=None):
+        '''Append an instruction reading the registers in src and return
+        the register holding its result. The top `pop` registers of the
+        stack (by default one per source) are released first.'''
+        (_, nsrc, nconst) = opcodes[opcode]
+        assert len(src) == nsrc
+        assert len(constants) == nconst
+        if pop is None:
+            pop = len(src)
+        self._depth -= pop
+        dst = self._depth
+        self._depth += 1
+        self.registers = max(self.registers, self._depth)
+        self.code.append((
+            opcode, dst,
+            tuple(src) + (0, ) * (3 - len(src)),
+            len(self.constants)))
+        self.constants.extend(constants)
+        return dst
+
+    def emit_lookup(self, axis, table, fallback):
+        '''Emit a table lookup on axis 0 (x) or 1 (y), as described by
+        Lookup. fallback() emits the subexpression the table was
+        computed from, which is skipped for blocks of pixels that all fall
+        on the table's grid.'''
+        constant = len(self.constants)
+        self.constants.extend((axis, len(table)))
+        for c in table:
+            self.constants.extend((c.r, c.g, c.b))
+        guard = len(self.code)
+        self.code.append(None)
+        dst = fallback()
+        self.code[guard] = (
+            OP_LOOKUP_GUARD, 0, (len(self.code) - guard - 1, 0, 0), constant)
+        self.code.append((OP_LOOKUP, dst, (dst, 0, 0), constant))
+        return dst
+
+    def native(self):
+        '''Load the program for the native interpreter.'''
+        return formats.ra_program(self.code, self.constants, self.registers)
+
+    def disassemble(self):
+        lines = []
+        for (pc, (opcode, dst, src, constant)) in enumerate(self.code):
+            (name, nsrc, nconst) = opcodes[opcode]
+            args = ['r%d' % dst] + ['r%d' % r for r in src[:nsrc]]
+            if opcode == OP_LOOKUP_GUARD:
+                args = ['skip %d' % src[0]]
+            if nconst is None:
+                (axis, size) = self.constants[constant:constant + 2]
+                args.append('%s[%d]' % ('xy'[int(axis)], size))
+            else:
+                args.extend(
+                    '%g' % k
+                    for k in self.constants[constant:constant + nconst])
+            lines.append('%04d  %-8s %s' % (pc, name, ', '.join(args)))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return '<Program: %d instructions, %d registers>' % (
+            len(self.code), self.registers)
+
+
+def compile_art(art):
+    '''Compile an expression tree, as built by generate(), to a Program.'''
+    prog = Program()
+    art.emit(prog)
+    return prog
@@ -0,0 +1,96 @@
+"""Dependency analysis of art trees.
+
+Every expression depends on x, on y, on both or on neither. separate
+replaces each largest subexpression that does not depend on both by a
+Lookup, which evaluates it once per pixel column or row instead of once per
+pixel, for every evaluation backend.
+"""
+import copy
+from collections import namedtuple
+
+from . import VariableX, VariableY, Lookup, subexpressions
+from .dag import count_evaluations
+
+
+CONSTANT = 0
+X_ONLY = 1
+Y_ONLY = 2
+XY = X_ONLY | Y_ONLY
+
+
+class SeparableStats(namedtuple('SeparableStats', [
+        'constant_nodes', 'x_nodes', 'y_nodes', 'xy_nodes',
+        'lookups', 'evaluations_avoided'])):
+    '''Node counts by dependency, the number of lookup tables introduced and
+    the node evaluations they save over a whole image.'''
+
+
+def dependency(art, memo=None):
+    '''Return CONSTANT, X_ONLY, Y_ONLY or XY.'''
+    if memo is None:
+        memo = {}
+    if id(art) not in memo:
+        if isinstance(art, VariableX):
+            dep = X_ONLY
+        elif isinstance(art, VariableY):
+            dep = Y_ONLY
+        elif isinstance(art, Lookup):
+            dep = X_ONLY if art.axis == 0 else Y_ONLY
+        else:
+            dep = CONSTANT
+            for e in subexpressions(art):
+                dep |= dependency(e, memo)
+        memo[id(art)] = dep
+    return memo[id(art)]
+
+
+def separate(art, size):
+    '''Return a copy of art for rendering at size x size pixels, with
+    separable subexpressions replaced by lookup tables.'''
+    deps = {}
+    rewritten = {}
+
+    def rewrite(node):
+        if id(node) in rewritten:
+            return rewritten[id(node)]
+        dep = dependency(node, deps)
+        if dep != XY and node.subexprs and not isinstance(node, Lookup):
+            # constant subexpressions are tabulated along x
+            out = Lookup(1 if dep == Y_ONLY else 0, size, node)
+        else:
+            out = copy.copy(node)
+            for name in node.subexprs:
+                setattr(out, name, rewrite(getattr(node, name)))
+        rewritten[id(node)] = out
+        return out
+    return rewrite(art)
+
+
+def _walk(art, seen):
+    if id(art) not in seen:
+        seen.add(id(art))
+        yield art
+        for e in subexpressions(art):
+            for node in _walk(e, seen):
+                yield node
+
+
+def separable_stats(tree, separated):
+    '''Compare an expression with the result of separate on it.'''
+    deps = {}
+    counts = [0] * 4
+    for node in _walk(tree, set()):
+        counts[dependency(node, deps)] += 1
+    lookups = [
+        node for node in _walk(separated, set())
+        if isinstance(node, Lookup)]
+    avoided = sum(
+        count_evaluations(node.e) * (node.size - 1) * node.size
+        for node in lookups)
+    return SeparableStats(
+        constant_nodes=counts[CONSTANT],
+        x_nodes=counts[X_ONLY],
+        y_nodes=counts[Y_ONLY],
+        xy_nodes=counts[XY],
+        lookups=len(lookups),
+        evaluations_avoided=avoided)
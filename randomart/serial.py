@@ -0,0 +1,434 @@
+"""Compact serialization of art trees.
+
+A binary art file is a 16-byte header followed by one record per tree:
+
+    magic      8 bytes  'RAART' padded with NULs
+    version    uint16   currently 1
+    reserved   uint16   zero
+    count      uint32   number of records
+
+and each record is a uint32 byte length followed by the nodes of the tree in
+prefix order. A node is a one-byte tag from `tags`, the node's parameters
+(see `_param_formats`) and then its subexpressions. The first occurrence of
+a Shared node is written in full and numbered in order of appearance; later
+occurrences are written as TAG_REF and a uint32 number, so DAGs built by
+randomart.dag stay the size of the DAG. All fields are little-endian.
+
+Decoders reject trees nested deeper than MAX_DEPTH nodes, which Python
+could not evaluate anyway, and Lookup nodes with an axis other than 0 (x)
+or 1 (y) or a table size outside 1 to MAX_LOOKUP_SIZE, the limits of
+librandomart's ra_arena_build.
+
+The text encoding writes the same prefix order as space-separated tokens
+after a 'ra1' version token, with floats written exactly by repr, for
+example 'ra1 sin 1.5 2.0 sum x constant 0.25 0.5 0.75'.
+
+Decoding never runs constructors, so it does not draw from `random`, and
+reify_bytes has librandomart build the native tree straight from the
+encoding, in one block and without the Python tree in between.
+"""
+import hashlib
+import struct
+
+from . import formats
+from .formats import qcolor
+from . import (
+    VariableX, VariableY, Constant, Sum, Product, Mod, Well, Tent, Sin,
+    Level, Mix, Shared, Lookup, subexpressions)
+
+
+MAGIC = b'RAART\x00\x00\x00'
+VERSION = 1
+TEXT_VERSION = 'ra1'
+
+_header = struct.Struct('<8sHHI')
+HEADER_SIZE = _header.size
+_length = struct.Struct('<I')
+
+TAG_REF = 255
+
+MAX_DEPTH = 400
+MAX_LOOKUP_SIZE = 1 << 24
+
+# tag -> class; tags are part of the format and must never be reused
+tags = {
+    0: VariableX,
+    1: VariableY,
+    2: Constant,
+    3: Sum,
+    4: Product,
+    5: Mod,
+    6: Well,
+    7: Tent,
+    8: Sin,
+    9: Level,
+    10: Mix,
+    11: Shared,
+    12: Lookup,
+}
+_class_tags = dict((cls, tag) for (tag, cls) in tags.items())
+
+# text names of the classes, and 'ref' for TAG_REF
+names = {
+    VariableX: 'x',
+    VariableY: 'y',
+    Constant: 'constant',
+    Sum: 'sum',
+    Product: 'product',
+    Mod: 'mod',
+    Well: 'well',
+    Tent: 'tent',
+    Sin: 'sin',
+    Level: 'level',
+    Mix: 'mix',
+    Shared: 'shared',
+    Lookup: 'lookup',
+}
+_name_classes = dict((name, cls) for (cls, name) in names.items())
+
+# struct codes of the values of each class's params, in order; a Constant's
+# color is written as its three channels.
+_param_kinds = {
+    Constant: 'ddd',
+    Sin: 'dd',
+    Level: 'd',
+    Lookup: 'BI',
+}
+_param_formats = dict(
+    (cls, struct.Struct('<' + kinds)) for (cls, kinds) in _param_kinds.items())
+_no_params = struct.Struct('')
+
+
+class SerialFormatError(ValueError):
+    pass
+
+
+def _param_values(art):
+    if isinstance(art, Constant):
+        return art.c.to_tuple()
+    return tuple(getattr(art, name) for name in art.params)
+
+
+def _param_state(cls, values):
+    if cls is Constant:
+        return {'c': qcolor(*values)}
+    return dict(zip(cls.params, values))
+
+
+def _check_params(cls, values):
+    if cls is Lookup:
+        (axis, size) = values
+        if axis not in (0, 1):
+            raise SerialFormatError("invalid lookup axis %d" % axis)
+        if not 0 < size <= MAX_LOOKUP_SIZE:
+            raise SerialFormatError("invalid lookup size %d" % size)
+
+
+def _build_art(cls, values, children):
+    # Like unpickling, so that Sin and Level keep the decoded parameters
+    # instead of drawing new ones.
+    art = cls.__new__(cls)
+    state = _param_state(cls, values)
+    state.update(zip(cls.subexprs, children))
+    if cls in _stateful:
+        art.__setstate__(state)
+    else:
+        art.__dict__ = state
+    return art
+
+
+_stateful = frozenset(cls for cls in tags.values()
+                      if hasattr(cls, '__setstate__'))
+
+
+# Binary encoding
+
+def _encode_tree(art, chunks, shared):
+    if isinstance(art, Shared):
+        if id(art) in shared:
+            chunks.append(struct.pack('<BI', TAG_REF, shared[id(art)]))
+            return
+        shared[id(art)] = len(shared)
+    cls = type(art)
+    chunks.append(chr(_class_tags[cls]))
+    chunks.append(
+        _param_formats.get(cls, _no_params).pack(*_param_values(art)))
+    for e in subexpressions(art):
+        _encode_tree(e, chunks, shared)
+
+
+def encode_tree(art):
+    '''Return the nodes of art, the body of one record.'''
+    chunks = []
+    _encode_tree(art, chunks, {})
+    return b''.join(chunks)
+
+
+# tag -> (class, params format, number of subexpressions), for decoding
+_tag_table = [None] * 256
+for (_tag, _cls) in tags.items():
+    _tag_table[_tag] = (
+        _cls, _param_formats.get(_cls, _no_params), len(_cls.subexprs))
+del _tag, _cls
+
+
+class _Decoder(object):
+    def __init__(self, data, offset, end, build):
+        self.data = data
+        self.offset = offset
+        self.end = end
+        self.build = build
+        self.shared = []
+        self.depth = 0
+
+    def node(self):
+        offset = self.offset
+        if offset >= self.end:
+            raise SerialFormatError("truncated art record")
+        tag = ord(self.data[offset])
+        if tag == TAG_REF:
+            if offset + 1 + _length.size > self.end:
+                raise SerialFormatError("truncated art record")
+            (index, ) = _length.unpack_from(self.data, offset + 1)
+            self.offset = offset + 1 + _length.size
+            if index >= len(self.shared) or self.shared[index] is None:
+                raise SerialFormatError("invalid shared reference %d" % index)
+            return self.shared[index]
+        entry = _tag_table[tag]
+        if entry is None:
+            raise SerialFormatError("unknown node tag %d" % tag)
+        (cls, fmt, arity) = entry
+        offset += 1
+        if offset + fmt.size > self.end:
+            raise SerialFormatError("truncated art record")
+        values = fmt.unpack_from(self.data, offset)
+        _check_params(cls, values)
+        self.offset = offset + fmt.size
+        if cls is Shared:
+            index = len(self.shared)
+            self.shared.append(None)
+        if arity == 0:
+            return self.build(cls, values, ())
+        self.depth += 1
+        if self.depth >= MAX_DEPTH:
+            raise SerialFormatError(
+                "art nested deeper than %d nodes" % MAX_DEPTH)
+        out = self.build(cls, values, [self.node() for _ in xrange(arity)])
+        self.depth -= 1
+        if cls is Shared:
+            self.shared[index] = out
+        return out
+
+
+def decode_tree(data, build=_build_art):
+    '''Decode one record body, as returned by encode_tree.'''
+    decoder = _Decoder(data, 0, len(data), build)
+    out = decoder.node()
+    if decoder.offset != len(data):
+        raise SerialFormatError("trailing data after art record")
+    return out
+
+
+def dumps_many(trees):
+    '''Encode a sequence of trees as a binary art file.'''
+    records = [encode_tree(art) for art in trees]
+    chunks = [_header.pack(MAGIC, VERSION, 0, len(records))]
+    for record in records:
+        chunks.append(_length.pack(len(record)))
+        chunks.append(record)
+    return b''.join(chunks)
+
+
+def dumps(art):
+    return dumps_many([art])
+
+
+def read_header(data):
+    '''Parse the header of a binary art file, returning the record count.'''
+    if len(data) < HEADER_SIZE or data[:len(MAGIC)] != MAGIC:
+        raise SerialFormatError("not a randomart file")
+    (_, version, _, count) = _header.unpack_from(data)
+    if version != VERSION:
+        raise SerialFormatError("unsupported art version %d" % version)
+    return count
+
+
+def iter_records(data):
+    '''Yield (offset, end) of the body of each record of a binary art
+    file.'''
+    count = read_header(data)
+    offset = HEADER_SIZE
+    for _ in xrange(count):
+        if offset + _length.size > len(data):
+            raise SerialFormatError("truncated art file")
+        (length, ) = _length.unpack_from(data, offset)
+        offset += _length.size
+        if offset + length > len(data):
+            raise SerialFormatError("truncated art file")
+        yield (offset, offset + length)
+        offset += length
+    if offset != len(data):
+        raise SerialFormatError("trailing data after art file")
+
+
+def _iter_loads(data, build):
+    for (offset, end) in iter_records(data):
+        decoder = _Decoder(data, offset, end, build)
+        out = decoder.node()
+        if decoder.offset != end:
+            raise SerialFormatError("trailing data after art record")
+        yield out
+
+
+def iter_loads(data):
+    '''Yield the trees of a binary art file one at a time.'''
+    return _iter_loads(data, _build_art)
+
+
+def loads_many(data):
+    return list(iter_loads(data))
+
+
+def loads(data):
+    '''Decode a binary art file holding exactly one tree.'''
+    trees = loads_many(data)
+    if len(trees) != 1:
+        raise SerialFormatError("expected 1 tree, found %d" % len(trees))
+    return trees[0]
+
+
+def reify_bytes(data):
+    '''Like loads(data).reify(), without building the Python tree: the
+    record is built natively into a formats.ra_arena, whose root is
+    returned.'''
+    records = list(iter_records(data))
+    if len(records) != 1:
+        raise SerialFormatError("expected 1 tree, found %d" % len(records))
+    ((offset, end), ) = records
+    try:
+        return formats.ra_arena(data[offset:end]).root
+    except ValueError as exc:
+        raise SerialFormatError(str(exc))
+
+
+def dump(art, outfh):
+    outfh.write(dumps(art))
+
+
+def load(fh):
+    return loads(fh.read())
+
+
+# Text encoding
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _encode_text(art, tokens, shared):
+    if isinstance(art, Shared):
+        if id(art) in shared:
+            tokens.extend(('ref', str(shared[id(art)])))
+            return
+        shared[id(art)] = len(shared)
+    tokens.append(names[type(art)])
+    tokens.extend(_format_value(value) for value in _param_values(art))
+    for e in subexpressions(art):
+        _encode_text(e, tokens, shared)
+
+
+def dumps_text(art):
+    tokens = [TEXT_VERSION]
+    _encode_text(art, tokens, {})
+    return ' '.join(tokens)
+
+
+def loads_text(text):
+    '''Decode a tree written by dumps_text.'''
+    tokens = text.split()
+    if not tokens or tokens[0] != TEXT_VERSION:
+        raise SerialFormatError("not a randomart text encoding")
+    tokens.reverse()
+    tokens.pop()
+    shared = []
+
+    def take():
+        if not tokens:
+            raise SerialFormatError("truncated art text")
+        return tokens.pop()
+
+    def node(depth):
+        name = take()
+        if name == 'ref':
+            index = int(take())
+            if index >= len(shared) or shared[index] is None:
+                raise SerialFormatError("invalid shared reference %d" % index)
+            return shared[index]
+        try:
+            cls = _name_classes[name]
+        except KeyError:
+            raise SerialFormatError("unknown node %r" % name)
+        values = []
+        for kind in _param_kinds.get(cls, ''):
+            values.append((float if kind == 'd' else int)(take()))
+        _check_params(cls, values)
+        if cls.subexprs and depth + 1 >= MAX_DEPTH:
+            raise SerialFormatError(
+                "art nested deeper than %d nodes" % MAX_DEPTH)
+        if cls is Shared:
+            index = len(shared)
+            shared.append(None)
+        out = _build_art(
+            cls, values, [node(depth + 1) for _ in cls.subexprs])
+        if cls is Shared:
+            shared[index] = out
+        return out
+
+    try:
+        out = node(0)
+    except ValueError as exc:
+        if isinstance(exc, SerialFormatError):
+            raise
+        raise SerialFormatError(str(exc))
+    if tokens:
+        raise SerialFormatError("trailing tokens after art text")
+    return out
+
+
+# Hashing
+
+def content_hash(art):
+    '''A hex digest identifying what art computes, stable across processes,
+    hosts and versions of this module. Shared and Lookup only change how an
+    expression is evaluated, so they are looked through.'''
+    def target(node):
+        while isinstance(node, (Shared, Lookup)):
+            node = node.e
+        return node
+
+    # digests by id of node, in postorder with an explicit stack, so that
+    # trees of any depth hash
+    memo = {}
+    root = target(art)
+    stack = [root]
+    while stack:
+        node = stack[-1]
+        if id(node) in memo:
+            stack.pop()
+            continue
+        children = [target(e) for e in subexpressions(node)]
+        pending = [e for e in children if id(e) not in memo]
+        if pending:
+            stack.extend(pending)
+            continue
+        stack.pop()
+        cls = type(node)
+        h = hashlib.sha256(chr(_class_tags[cls]))
+        h.update(_param_formats.get(cls, _no_params).pack(
+            *_param_values(node)))
+        for e in children:
+            h.update(memo[id(e)][1])
+        memo[id(node)] = (node, h.digest())
+    return memo[id(root)][1].encode('hex')
@@ -0,0 +1,372 @@
+"""HTTP render service.
+
+Serves PNG renderings of art trees in the formats of randomart.serial:
+
+    POST /art                       store the tree in the body and reply with
+                                    its content hash, to be used below
+    GET  /art/<hash>.png?size=N     render a stored tree
+    GET  /seed/<seed>.png?size=N    render the tree of generate_seeded(seed)
+    POST /render.png?size=N         render the tree in the body
+
+Any render request may add tile=x0,y0,width,height to get only that region
+of the size x size image. Requests are handled on threads, and rendering
+runs on a pool of worker processes, each of which receives the encoded tree
+with its job. Requests for the same tree, size and tile that arrive while
+an identical render is pending wait for that render rather than starting
+another. At most max_pending distinct renders are queued or running at a
+time; beyond that requests are refused with 503 and a Retry-After header.
+Request bodies are limited to max_body bytes, and trees that do not decode
+or hold a Lookup table larger than max_size are refused with 400.
+
+Run it with
+
+    python -m randomart.service --port 8000
+
+and only expose it on localhost: it trusts its clients with the pool.
+"""
+import argparse
+import threading
+import urlparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from collections import OrderedDict, namedtuple
+from cStringIO import StringIO
+from multiprocessing import Pool
+
+from . import serial
+from .tiled import default_backend
+
+
+DEFAULT_MAX_PENDING = 64
+DEFAULT_MAX_SIZE = 4096
+DEFAULT_MAX_BODY = 1 << 20
+DEFAULT_MAX_TREES = 1024
+DEFAULT_TIMEOUT = 300
+
+# Per-process state, set up by _init_worker
+_worker_backend = None
+
+
+class ServiceStats(namedtuple('ServiceStats', [
+        'requests', 'renders', 'coalesced', 'rejected', 'failed'])):
+    '''Counts of render requests, of the renders they started, of those
+    that joined a pending render instead, of those refused by admission
+    control and of renders that raised.'''
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super(RequestError, self).__init__(message)
+        self.status = status
+
+
+def _init_worker(backend):
+    global _worker_backend
+    _worker_backend = backend
+
+
+def _render_png(data, size, region):
+    # Runs in a worker; Python 2's Pool has no error callback, so failures
+    # come back as (False, message).
+    from . import BaseArt
+    from .stream import write_png_bands
+    from .tiled import render_tile
+    try:
+        art_impl = BaseArt(size)
+        art_impl.set_art(serial.loads(data))
+        if _worker_backend is not None:
+            getattr(art_impl, _worker_backend)()
+        (_, _, width, height) = region
+        out = StringIO()
+        write_png_bands(
+            out, width, height, [render_tile(art_impl, region, 'rgb')])
+        return (True, out.getvalue())
+    except Exception as exc:
+        return (False, '%s: %s' % (type(exc).__name__, exc))
+
+
+class _Job(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.ok = None
+        self.result = None
+
+    def finish(self, (ok, result)):
+        self.ok = ok
+        self.result = result
+        self.done.set()
+
+
+class RenderService(object):
+    '''The state behind the HTTP handlers: stored trees, the worker pool and
+    the pending renders. backend names the BaseArt method preparing the
+    art in the workers, as in tiled; None renders with eval, and 'auto'
+    picks tiled.default_backend().'''
+
+    def __init__(self, processes=None, backend='auto',
+                 max_pending=DEFAULT_MAX_PENDING, max_size=DEFAULT_MAX_SIZE,
+                 max_trees=DEFAULT_MAX_TREES, timeout=DEFAULT_TIMEOUT,
+                 max_body=DEFAULT_MAX_BODY):
+        if backend == 'auto':
+            backend = default_backend()
+        self.backend = backend
+        self.max_pending = max_pending
+        self.max_size = max_size
+        self.max_trees = max_trees
+        self.timeout = timeout
+        self.max_body = max_body
+        self.pool = Pool(processes, _init_worker, (backend, ))
+        self._lock = threading.Lock()
+        self._trees = OrderedDict()
+        self._pending = {}
+        self._counts = dict.fromkeys(ServiceStats._fields, 0)
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def stats(self):
+        with self._lock:
+            return ServiceStats(**self._counts)
+
+    def _decode(self, data):
+        try:
+            if data.startswith(serial.TEXT_VERSION):
+                art = serial.loads_text(data)
+                data = serial.dumps(art)
+            else:
+                art = serial.loads(data)
+            digest = serial.content_hash(art)
+        except Exception as exc:
+            # whatever the body holds, it is the client's error
+            raise RequestError(400, "invalid art: %s" % exc)
+        self._check_lookups(art)
+        return (digest, data)
+
+    def _check_lookups(self, art):
+        # Lookup tables are filled whole, so a large one would hold a
+        # worker long after any image size the service renders
+        from . import Lookup, subexpressions
+        stack = [art]
+        seen = set()
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            if isinstance(node, Lookup) and node.size > self.max_size:
+                raise RequestError(
+                    400, "lookup size must be at most %d" % self.max_size)
+            stack.extend(subexpressions(node))
+
+    def store(self, data):
+        '''Keep the tree encoded in data, returning its content hash. The
+        least recently used trees are dropped beyond max_trees.'''
+        (digest, data) = self._decode(data)
+        with self._lock:
+            self._trees.pop(digest, None)
+            self._trees[digest] = data
+            while len(self._trees) > self.max_trees:
+                self._trees.popitem(last=False)
+        return digest
+
+    def store_seed(self, seed):
+        '''Like store, for the tree generated from seed, a decimal or
+        0x-prefixed hexadecimal integer.'''
+        from . import generate_seeded
+        try:
+            seed = int(seed, 0)
+        except ValueError:
+            raise RequestError(400, "invalid seed %r" % seed)
+        return self.store(serial.dumps(generate_seeded(seed)))
+
+    def lookup(self, digest):
+        with self._lock:
+            data = self._trees.pop(digest, None)
+            if data is None:
+                raise RequestError(404, "unknown art %s" % digest)
+            self._trees[digest] = data
+            return data
+
+    def _region(self, size, tile):
+        if not 0 < size <= self.max_size:
+            raise RequestError(
+                400, "size must be between 1 and %d" % self.max_size)
+        if tile is None:
+            return (0, 0, size, size)
+        (x0, y0, width, height) = tile
+        if (x0 < 0 or y0 < 0 or width <= 0 or height <= 0 or
+                x0 + width > size or y0 + height > size):
+            raise RequestError(400, "tile outside the image")
+        return tile
+
+    def render(self, digest, size, tile=None):
+        '''Return the PNG of the stored tree digest at size, or of a tile of
+        it, joining an identical pending render if there is one.'''
+        region = self._region(size, tile)
+        data = self.lookup(digest)
+        key = (digest, size, region)
+        with self._lock:
+            self._counts['requests'] += 1
+            job = self._pending.get(key)
+            if job is not None:
+                self._counts['coalesced'] += 1
+            elif len(self._pending) >= self.max_pending:
+                self._counts['rejected'] += 1
+                raise RequestError(503, "render queue is full")
+            else:
+                job = self._pending[key] = _Job()
+                self._counts['renders'] += 1
+                self.pool.apply_async(
+                    _render_png, (data, size, region),
+                    callback=lambda result: self._finish(key, job, result))
+        if not job.done.wait(self.timeout):
+            # A worker that dies drops its task without calling back, so
+            # free the slot rather than leave later requests waiting on it
+            with self._lock:
+                if self._pending.get(key) is job:
+                    del self._pending[key]
+            raise RequestError(504, "render timed out")
+        if not job.ok:
+            raise RequestError(500, job.result)
+        return job.result
+
+    def _finish(self, key, job, result):
+        with self._lock:
+            # unless a timed out request already dropped it
+            if self._pending.get(key) is job:
+                del self._pending[key]
+            if not result[0]:
+                self._counts['failed'] += 1
+        job.finish(result)
+
+
+def _int_param(query, name, default=None):
+    values = query.get(name)
+    if not values:
+        if default is None:
+            raise RequestError(400, "missing parameter %s" % name)
+        return default
+    try:
+        return int(values[-1])
+    except ValueError:
+        raise RequestError(400, "invalid parameter %s" % name)
+
+
+def _tile_param(query):
+    values = query.get('tile')
+    if not values:
+        return None
+    try:
+        tile = tuple(int(v) for v in values[-1].split(','))
+    except ValueError:
+        tile = ()
+    if len(tile) != 4:
+        raise RequestError(400, "tile must be x0,y0,width,height")
+    return tile
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'randomart/1'
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def _reply(self, status, body, content_type='text/plain', headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for (name, value) in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            raise RequestError(400, "invalid Content-Length")
+        if not 0 <= length <= self.server.service.max_body:
+            raise RequestError(413, "body must be at most %d bytes" % (
+                self.server.service.max_body))
+        return self.rfile.read(length)
+
+    def _handle(self, method):
+        service = self.server.service
+        (_, _, path, query, _) = urlparse.urlsplit(self.path)
+        query = urlparse.parse_qs(query)
+        try:
+            if method == 'POST' and path == '/art':
+                self._reply(201, service.store(self._body()) + '\n')
+                return
+            if method == 'POST' and path == '/render.png':
+                digest = service.store(self._body())
+            elif (method == 'GET' and path.startswith('/art/') and
+                    path.endswith('.png')):
+                digest = path[len('/art/'):-len('.png')]
+            elif (method == 'GET' and path.startswith('/seed/') and
+                    path.endswith('.png')):
+                digest = service.store_seed(path[len('/seed/'):-len('.png')])
+            else:
+                raise RequestError(404, "no such resource")
+            png = service.render(
+                digest, _int_param(query, 'size'), _tile_param(query))
+            self._reply(200, png, 'image/png')
+        except RequestError as exc:
+            headers = [('Retry-After', '1')] if exc.status == 503 else []
+            self._reply(exc.status, str(exc) + '\n', headers=headers)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+class RenderServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service, quiet=False):
+        HTTPServer.__init__(self, address, RenderRequestHandler)
+        self.service = service
+        self.quiet = quiet
+
+
+def make_server(host='127.0.0.1', port=8000, quiet=False, **kwargs):
+    '''Start a RenderService, passing it kwargs, and bind a server to it.
+    Port 0 picks a free port, see server.server_address.'''
+    service = RenderService(**kwargs)
+    try:
+        return RenderServer((host, port), service, quiet)
+    except:
+        service.close()
+        raise
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING)
+    parser.add_argument('--max-body', type=int, default=DEFAULT_MAX_BODY)
+    parser.add_argument(
+        '--backend', default='auto',
+        choices=('auto', 'compile', 'reify', 'compile_python', 'eval'))
+    args = parser.parse_args(argv)
+    server = make_server(
+        args.host, args.port, processes=args.processes,
+        max_pending=args.max_pending, max_body=args.max_body,
+        backend=None if args.backend == 'eval' else args.backend)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.close()
+
+
+if __name__ == '__main__':
+    main()
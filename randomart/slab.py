@@ -0,0 +1,144 @@
+"""Slab image files.
+
+A slab is a fixed 32-byte header followed by the pixels as one contiguous
+block, so it can be written straight from MemorySlabArt.target and mapped
+back into memory without parsing. The header holds:
+
+    magic      8 bytes  'RASLAB' padded with NULs
+    version    uint16   currently 1
+    layout     uint16   LAYOUT_PACKED_COLUMNS
+    byteorder  1 byte   '<' or '>', the byte order of the pixels
+    width      uint32
+    height     uint32
+
+with the integer fields little-endian. Slabs from before the header was
+introduced (two big-endian sizes, then big-endian pixels) can still be
+opened.
+
+Slabs that are rendered in place, see MappedSlabArt, are followed by a tile
+map recording which tiles of the image have been written:
+
+    magic      8 bytes  'RATILES' padded with NULs
+    tile_size  uint32
+    count      uint32   number of tiles, in the order of tiled.iter_tiles
+    flags      count bytes, nonzero once the tile is complete
+"""
+import mmap
+import struct
+import sys
+from ctypes import c_int32
+
+MAGIC = b'RASLAB\x00\x00'
+VERSION = 1
+
+# 32-bit 0x00RRGGBB values, column-major: pixel (x, y) at x * height + y
+LAYOUT_PACKED_COLUMNS = 1
+
+_header = struct.Struct('<8sHHc3xII8x')
+HEADER_SIZE = _header.size
+
+_legacy_header = struct.Struct('!II')
+HOST_BYTEORDER = '<' if sys.byteorder == 'little' else '>'
+
+TILES_MAGIC = b'RATILES\x00'
+_tiles_header = struct.Struct('<8sII')
+TILES_HEADER_SIZE = _tiles_header.size
+
+
+class SlabFormatError(ValueError):
+    pass
+
+
+def write_header(outfh, width, height, layout=LAYOUT_PACKED_COLUMNS):
+    '''Write a header for pixels in the byte order of this host.'''
+    outfh.write(_header.pack(
+        MAGIC, VERSION, layout, HOST_BYTEORDER, width, height))
+
+
+def save(outfh, width, height, pixels):
+    '''Write a slab from an array('i') of column-major packed pixels.'''
+    if len(pixels) != width * height:
+        raise ValueError("expected %d pixels, got %d" % (
+            width * height, len(pixels)))
+    write_header(outfh, width, height)
+    outfh.write(buffer(pixels))
+
+
+def pixels_size(width, height):
+    return 4 * width * height
+
+
+def write_tiles_header(data, offset, tile_size, count):
+    _tiles_header.pack_into(data, offset, TILES_MAGIC, tile_size, count)
+
+
+def read_tiles_header(data, offset):
+    '''Parse the tile map header at offset, returning (tile_size, count).'''
+    if len(data) < offset + TILES_HEADER_SIZE:
+        raise SlabFormatError("slab has no tile map")
+    (magic, tile_size, count) = _tiles_header.unpack_from(data, offset)
+    if magic != TILES_MAGIC:
+        raise SlabFormatError("slab has no tile map")
+    if len(data) < offset + TILES_HEADER_SIZE + count:
+        raise SlabFormatError("truncated tile map")
+    return (tile_size, count)
+
+
+def read_header(data):
+    '''Parse the header at the start of data, returning (version, layout,
+    byteorder, width, height, offset) where offset is that of the pixels.
+    Legacy slabs are reported as version 0.'''
+    if data[:len(MAGIC)] == MAGIC:
+        if len(data) < HEADER_SIZE:
+            raise SlabFormatError("truncated slab header")
+        (_, version, layout, byteorder, width, height) = \
+            _header.unpack_from(data)
+        if version != VERSION:
+            raise SlabFormatError("unsupported slab version %d" % version)
+        if layout != LAYOUT_PACKED_COLUMNS:
+            raise SlabFormatError("unsupported slab layout %d" % layout)
+        if byteorder not in '<>':
+            raise SlabFormatError("invalid byte order %r" % byteorder)
+        return (version, layout, byteorder, width, height, HEADER_SIZE)
+    if len(data) < _legacy_header.size:
+        raise SlabFormatError("truncated slab header")
+    (width, height) = _legacy_header.unpack_from(data)
+    return (0, LAYOUT_PACKED_COLUMNS, '>', width, height, _legacy_header.size)
+
+
+class Slab(object):
+    '''A slab file mapped into memory. pixels indexes the mapped pixel block
+    directly, in the file's byte order, without copying it; writes to it
+    are private to this mapping.'''
+
+    def __init__(self, fh):
+        self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_COPY)
+        (self.version, self.layout, byteorder,
+         self.width, self.height, offset) = read_header(self._map)
+        count = self.width * self.height
+        if len(self._map) < offset + pixels_size(self.width, self.height):
+            self._map.close()
+            raise SlabFormatError("truncated slab pixels")
+        ctype = c_int32
+        if byteorder != HOST_BYTEORDER:
+            ctype = c_int32.__ctype_be__ if byteorder == '>' \
+                else c_int32.__ctype_le__
+        self.pixels = (ctype * count).from_buffer(self._map, offset)
+
+    def pixel(self, x, y):
+        return self.pixels[x * self.height + y]
+
+    def close(self):
+        self.pixels = None
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_slab(path):
+    with open(path, 'rb') as fh:
+        return Slab(fh)
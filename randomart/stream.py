@@ -0,0 +1,79 @@
+"""Streaming output of images too large to hold in memory.
+
+The image is rendered one band at a time and each band is handed to an
+encoder before the next one is rendered, so memory use depends on the band
+size and not on the image size. The art object only needs the BaseArt
+interface; it does not need a target.
+"""
+import struct
+import zlib
+
+from . import slab
+from .threaded import iter_bands
+from .tiled import render_tile
+
+
+DEFAULT_BAND_SIZE = 64
+
+
+def iter_image_bands(art_impl, layout, band_size=DEFAULT_BAND_SIZE):
+    '''Yield the image in bands laid out as for tiled.render_tile: rows of
+    row-major RGB bytes for 'rgb', columns of packed integers for
+    'packed'.'''
+    size = art_impl.size
+    for (start, length) in iter_bands(size, band_size):
+        if layout == 'rgb':
+            region = (0, start, size, length)
+        else:
+            region = (start, 0, length, size)
+        yield render_tile(art_impl, region, layout)
+
+
+def write_slab(art_impl, outfh, band_size=DEFAULT_BAND_SIZE):
+    '''Write the image in the format of MemorySlabArt.save.'''
+    slab.write_header(outfh, art_impl.size, art_impl.size)
+    for band in iter_image_bands(art_impl, 'packed', band_size):
+        outfh.write(buffer(band))
+
+
+def _png_chunk(outfh, kind, data):
+    outfh.write(struct.pack('!I', len(data)))
+    outfh.write(kind)
+    outfh.write(data)
+    outfh.write(struct.pack('!I', zlib.crc32(kind + data) & 0xffffffff))
+
+
+def write_png_bands(outfh, width, height, bands, level=6):
+    '''Write a width x height 8-bit RGB PNG from bands of rows of row-major
+    RGB bytes, compressing each band into IDAT chunks as it arrives.'''
+    stride = width * 3
+    outfh.write(b'\x89PNG\r\n\x1a\n')
+    # 8 bits per channel, truecolor, no interlacing
+    header = struct.pack('!IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    _png_chunk(outfh, b'IHDR', header)
+    compressor = zlib.compressobj(level)
+    for band in bands:
+        # every row starts with filter type 0 (none)
+        rows = b''.join(
+            b'\x00' + band[offset:offset + stride]
+            for offset in xrange(0, len(band), stride))
+        data = compressor.compress(rows)
+        if data:
+            _png_chunk(outfh, b'IDAT', data)
+    _png_chunk(outfh, b'IDAT', compressor.flush())
+    _png_chunk(outfh, b'IEND', b'')
+
+
+def write_png(art_impl, outfh, band_size=DEFAULT_BAND_SIZE, level=6):
+    '''Write the image as an 8-bit RGB PNG, compressing each band of rows
+    as soon as it is rendered.'''
+    size = art_impl.size
+    write_png_bands(
+        outfh, size, size,
+        iter_image_bands(art_impl, 'rgb', band_size), level)
+
+
+writers = {
+    'png': write_png,
+    'slab': write_slab,
+}
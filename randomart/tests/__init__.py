@@ -0,0 +1,10 @@
+import random
+
+from randomart import generate
+
+
+def seeded_trees(seed, count, sizes):
+    '''count trees generated from random.Random(seed), of sizes drawn from
+    range(*sizes), leaving the global random state alone.'''
+    rng = random.Random(seed)
+    return [generate(rng.randrange(*sizes), rng) for _ in range(count)]
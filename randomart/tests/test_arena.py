@@ -0,0 +1,93 @@
+import unittest
+from randomart import BaseArt
+from randomart import formats, serial
+from randomart.dag import share
+from randomart.separable import separate
+from randomart.tiled import render_tile
+from randomart.tests import seeded_trees
+
+
+class ArenaTestCase(unittest.TestCase):
+    locations = [
+        (0.646202, -0.289811),
+        (-0.104839, -0.52361),
+        (0.925392, -0.30059),
+        (-0.455872, 0.545205),
+        (0.58055, 0.34685),
+        (-0.37949, -0.45593),
+        (0.448511, 0.58542),
+        (0.769115, -0.121607),
+        (0.379993, 0.511257),
+        (-0.756162, -0.12058)
+    ]
+    size = 16
+
+    def setUp(self):
+        self.trees = seeded_trees(0x5eed, 10, (20, 80))
+
+    def assertSameEval(self, art):
+        arena = formats.ra_arena(serial.encode_tree(art))
+        root = arena.root
+        expected = art.reify()
+        for x, y in self.locations:
+            self.assertEqual(
+                root.eval(x, y).to_tuple(), expected.eval(x, y).to_tuple())
+        return arena
+
+    def test_eval(self):
+        for tree in self.trees:
+            self.assertSameEval(tree)
+            self.assertSameEval(share(tree))
+            self.assertSameEval(separate(tree, self.size))
+
+    def test_count(self):
+        from randomart.optimize import count_nodes
+        for tree in self.trees:
+            arena = self.assertSameEval(tree)
+            self.assertEqual(arena.count, count_nodes(tree))
+        # each shared node is laid out once
+        dag = share(self.trees[0])
+        self.assertLess(formats.ra_arena(serial.encode_tree(dag)).count,
+                        count_nodes(dag))
+
+    def test_render(self):
+        for tree in self.trees:
+            art_impl = BaseArt(self.size)
+            art_impl.set_art(tree)
+            # as rendered from a tree of per-node formats.ra_* objects
+            art_impl.art_reified = tree.reify()
+            expected = render_tile(
+                art_impl, (0, 0, self.size, self.size), 'rgb')
+            art_impl.reify()
+            self.assertEqual(render_tile(
+                art_impl, (0, 0, self.size, self.size), 'rgb'), expected)
+
+    def test_root_keeps_arena(self):
+        root = formats.ra_arena(serial.encode_tree(self.trees[0])).root
+        expected = self.trees[0].reify()
+        for x, y in self.locations:
+            self.assertEqual(
+                root.eval(x, y).to_tuple(), expected.eval(x, y).to_tuple())
+
+    def test_free(self):
+        arena = formats.ra_arena(serial.encode_tree(self.trees[0]))
+        arena.free()
+        arena.free()
+        self.assertRaises(ValueError, lambda: arena.root)
+
+    def test_errors(self):
+        record = serial.encode_tree(share(self.trees[1]))
+        for bad in (b'', record[:-1], record + b'\x00', b'\xfe',
+                    b'\xff\x00\x00\x00\x00', b'\x0b\xff\x00\x00\x00\x00',
+                    b'\x03\x00' * 20000, b'\x07' * 400 + b'\x00',
+                    b'\x0c\x02\x10\x00\x00\x00\x00',
+                    b'\x0c\x00\x00\x00\x00\x00\x00'):
+            self.assertRaises(ValueError, formats.ra_arena, bad)
+        formats.ra_arena(b'\x07' * 399 + b'\x00')
+        formats.ra_arena(b'\x0c\x01\x10\x00\x00\x00\x00')
+        self.assertRaises(serial.SerialFormatError, serial.reify_bytes,
+                          serial.dumps_many(self.trees[:2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
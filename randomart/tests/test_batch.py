@@ -0,0 +1,152 @@
+import math
+import random
+import unittest
+from array import array
+from randomart import BaseArt, generate_seeded, transforms
+from randomart.formats import qcolor
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _colors(rng, n, low=-1.0):
+    return tuple(array('d', [rng.uniform(low, 1.0) for _ in range(n)])
+                 for _ in range(3))
+
+
+def _point(color, i):
+    return qcolor(*[channel[i] for channel in color])
+
+
+class BatchTestCase(unittest.TestCase):
+    n = 37
+
+    def setUp(self):
+        rng = random.Random(0x5eed)
+        self.c1 = _colors(rng, self.n)
+        self.c2 = _colors(rng, self.n)
+        self.c3 = _colors(rng, self.n)
+        # positive divisors, and some points with a channel near zero
+        self.divisors = _colors(rng, self.n, 0.0)
+        for i in range(0, self.n, 5):
+            self.divisors[i % 3][i] = 0.00001
+
+    def out(self):
+        return tuple(array('d', [0.0]) * self.n for _ in range(3))
+
+    def check(self, batch, scalar, *args):
+        # batch over the colors among args against scalar at each point
+        out = self.out()
+        batch(*(args + (out, )))
+        for i in range(self.n):
+            point_args = [_point(a, i) if isinstance(a, tuple) else a
+                          for a in args]
+            expected = qcolor()
+            scalar(*(point_args + [expected]))
+            self.assertEqual(_point(out, i), expected)
+
+    def batches(self):
+        # the loaded batch implementations and the Python ones
+        for name in ('average', 'average_weights', 'tent', 'well', 'prod',
+                     'mod', 'sin', 'level'):
+            yield (name, getattr(transforms, name + '_batch'),
+                   getattr(transforms, '_py_%s_batch' % name))
+
+    def test_matches_scalar(self):
+        py = transforms
+        for (name, native, python) in self.batches():
+            for batch in (native, python):
+                if name == 'average':
+                    self.check(batch, py._py_average_impl,
+                               self.c1, self.c2, 0.3)
+                elif name == 'average_weights':
+                    weights = self.c3[0]
+                    out = self.out()
+                    batch(self.c1, self.c2, weights, out)
+                    for i in range(self.n):
+                        expected = qcolor()
+                        py._py_average_impl(
+                            _point(self.c1, i), _point(self.c2, i),
+                            weights[i], expected)
+                        self.assertEqual(_point(out, i), expected)
+                elif name == 'tent':
+                    self.check(batch, py._py_tent_impl, self.c1)
+                elif name == 'well':
+                    self.check(batch, py._py_well_impl, self.c1)
+                elif name == 'prod':
+                    self.check(batch, py._py_prod_impl, self.c1, self.c2)
+                elif name == 'mod':
+                    # like qcolor_mod, which the scalar mod_impl is when
+                    # librandomart is loaded
+                    out = self.out()
+                    batch(self.c1, self.divisors, out)
+                    for i in range(self.n):
+                        divisors = _point(self.divisors, i)
+                        if min(divisors.to_tuple()) < 0.0001:
+                            expected = qcolor()
+                        else:
+                            expected = qcolor(*[
+                                math.fmod(a, b) for (a, b) in
+                                zip(_point(self.c1, i).to_tuple(),
+                                    divisors.to_tuple())])
+                        self.assertEqual(_point(out, i), expected)
+                elif name == 'sin':
+                    self.check(batch, py._py_sin_impl, self.c1, 0.7, 3.1)
+                elif name == 'level':
+                    self.check(batch, py._py_level_impl,
+                               0.2, self.c1, self.c2, self.c3)
+
+    def test_in_place(self):
+        expected = self.out()
+        transforms._py_well_batch(self.c1, expected)
+        transforms.well_batch(self.c1, self.c1)
+        self.assertEqual(self.c1, expected)
+
+    def test_sizes(self):
+        short = tuple(array('d', [0.0]) * (self.n - 1) for _ in range(3))
+        if transforms.tent_batch is not transforms._py_tent_batch:
+            with self.assertRaises(ValueError):
+                transforms.tent_batch(self.c1, short)
+            with self.assertRaises(ValueError):
+                transforms.tent_batch(self.c1, (array('f'), ) * 3)
+
+    @unittest.skipIf(numpy is None, "numpy is not available")
+    def test_numpy(self):
+        c1 = tuple(numpy.array(channel) for channel in self.c1)
+        c2 = tuple(numpy.array(channel).reshape(1, self.n)
+                   for channel in self.c2)
+        out = tuple(numpy.empty(self.n) for _ in range(3))
+        transforms.sin_batch(c1, 0.7, 3.1, out)
+        for (a, d) in zip(c1, out):
+            self.assertTrue(numpy.allclose(numpy.sin(0.7 + 3.1 * a), d))
+        # read-only inputs are not copied either
+        for a in c1:
+            a.flags.writeable = False
+        transforms.prod_batch(c1, (out[0], ) * 3, out)
+        if transforms.prod_batch is not transforms._py_prod_batch:
+            # any shape, as long as it is contiguous
+            out2 = tuple(numpy.empty((1, self.n)) for _ in range(3))
+            transforms.tent_batch(c2, out2)
+            self.assertTrue(numpy.allclose(
+                out2[0], 1 - 2 * numpy.abs(c2[0])))
+            with self.assertRaises(ValueError):
+                transforms.tent_batch(
+                    tuple(numpy.empty((self.n, 2))[:, 0] for _ in range(3)),
+                    out)
+
+    @unittest.skipIf(numpy is None, "numpy is not available")
+    def test_grid(self):
+        art_impl = BaseArt(72)
+        native = transforms._native_grid
+        try:
+            for seed in range(5):
+                art_impl.set_art(generate_seeded(seed))
+                grids = []
+                for transforms._native_grid in (False, native):
+                    grids.append(art_impl.get_grid())
+                for (a, b) in zip(*grids):
+                    self.assertTrue(numpy.allclose(a, b))
+        finally:
+            transforms._native_grid = native
@@ -0,0 +1,96 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from cStringIO import StringIO
+from randomart import Sum, Product, Mod, Mix, subexpressions
+from randomart.bench import (
+    compare, corpus, main, run_benchmarks, summary)
+from randomart.serial import dumps
+
+
+class BenchTestCase(unittest.TestCase):
+    def test_corpus(self):
+        trees = corpus(tree_sizes=(5, 30))
+        self.assertEqual(trees.keys()[:2], ['all-5', 'all-30'])
+        self.assertEqual(len(trees), 8)
+        again = corpus(tree_sizes=(5, 30))
+        self.assertEqual(
+            [dumps(art) for art in trees.values()],
+            [dumps(art) for art in again.values()])
+
+        def inner(art):
+            if art.arity:
+                yield type(art)
+            for e in subexpressions(art):
+                for op in inner(e):
+                    yield op
+        self.assertLessEqual(
+            set(inner(trees['arithmetic-30'])),
+            set([Sum, Product, Mod, Mix]))
+
+    def test_run(self):
+        # eval runs in a child process, under RA_NONATIVE=1
+        data = run_benchmarks(
+            ['eval', 'compile_python'], tree_sizes=(5, ), mixes=['all'],
+            resolutions=(4, 8), repeat=1)
+        data = json.loads(json.dumps(data))
+        self.assertEqual(
+            sorted((r['backend'], r['tree'], r['size'])
+                   for r in data['results']),
+            [('compile_python', 'all-5', 4), ('compile_python', 'all-5', 8),
+             ('eval', 'all-5', 4), ('eval', 'all-5', 8)])
+        self.assertIn('compile_python', summary(data))
+        self.assertEqual(compare(data, data), [])
+
+    def test_compare(self):
+        def results(*times, **kwargs):
+            return {
+                'backends': kwargs.get('backends', ['compile']),
+                'results': [
+                    {'backend': 'compile', 'tree': 'all-%d' % i, 'size': 64,
+                     'seconds': t} for (i, t) in enumerate(times)]}
+        regressions = compare(
+            results(1.0, 1.0, 1.0), results(1.2, 2.0, 0.5), 0.25)
+        self.assertEqual(len(regressions), 1)
+        self.assertEqual(regressions[0].tree, 'all-1')
+        self.assertAlmostEqual(regressions[0].ratio, 2.0)
+        # renders missing from the baseline are not compared
+        self.assertEqual(compare(results(), results(5.0)), [])
+        # renders missing from current are, unless their backend was not run
+        regressions = compare(results(1.0, 1.0, 1.0), results(1.0))
+        self.assertEqual([(r.tree, r.baseline, r.seconds, r.ratio)
+                          for r in regressions],
+                         [('all-1', 1.0, None, None),
+                          ('all-2', 1.0, None, None)])
+        self.assertEqual(
+            compare(results(1.0, 1.0), results(backends=['reify'])), [])
+
+    def test_main_missing(self):
+        baseline = run_benchmarks(
+            ['compile_python'], tree_sizes=(5, ), mixes=['all'],
+            resolutions=(4, 8), repeat=1)
+        baseline['results'].append(dict(
+            baseline['results'][0], tree='all-999'))
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'baseline.json')
+            with open(path, 'w') as outfh:
+                json.dump(baseline, outfh)
+            argv = ['--backend', 'compile_python', '--tree-size', '5',
+                    '--mix', 'all', '--resolution', '4', '--resolution', '8',
+                    '--repeat', '1', '--tolerance', '1e9',
+                    '--baseline', path]
+            stdout = sys.stdout
+            sys.stdout = StringIO()
+            try:
+                status = main(argv)
+                output = sys.stdout.getvalue()
+            finally:
+                sys.stdout = stdout
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual(status, 1)
+        self.assertIn('MISSING compile_python all-999 at 4', output)
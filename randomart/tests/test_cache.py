@@ -0,0 +1,141 @@
+import os
+import shutil
+import tempfile
+import unittest
+from cStringIO import StringIO
+from multiprocessing import Pool
+from randomart import memoryslab_create_image, pil_create_image, MemorySlabArt
+from randomart import serial
+from randomart.cache import RenderCache
+from randomart.tests import seeded_trees
+
+
+def _render_in_worker(args):
+    (directory, data, region) = args
+    art = MemorySlabArt(24)
+    art.set_art(serial.loads(data))
+    cache = RenderCache(directory, disk_size=1 << 20)
+    return (cache.render_tile(art, region, 'packed').tolist(),
+            cache.stats().disk_hits)
+
+
+class RenderCacheTestCase(unittest.TestCase):
+    size = 24
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.trees = seeded_trees(0x5eed, 3, (5, 40))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _art(self, tree, native=False):
+        art = MemorySlabArt(self.size)
+        art.set_art(tree)
+        if native:
+            art.reify()
+        return art
+
+    def test_memory(self):
+        cache = RenderCache()
+        data = serial.dumps(self.trees[0])
+        first = memoryslab_create_image(
+            self.size, StringIO(data), cache=cache)
+        second = memoryslab_create_image(
+            self.size, StringIO(data), cache=cache)
+        self.assertEqual(first.target, second.target)
+        stats = cache.stats()
+        self.assertEqual((stats.memory_hits, stats.misses), (1, 1))
+        self.assertEqual(stats.hit_rate, 0.5)
+
+    def test_pil(self):
+        cache = RenderCache(self.tmpdir)
+        data = serial.dumps(self.trees[0])
+        first = pil_create_image(self.size, StringIO(data), cache=cache)
+        second = pil_create_image(
+            self.size, StringIO(data), cache=RenderCache(self.tmpdir))
+        self.assertEqual(first.tobytes(), second.tobytes())
+
+    def test_disk_shared(self):
+        art = self._art(self.trees[0])
+        RenderCache(self.tmpdir).redraw(art, art.redraw)
+        other = self._art(self.trees[0])
+        cache = RenderCache(self.tmpdir)
+        self.assertTrue(cache.redraw(other, self.fail))
+        self.assertEqual(other.target, art.target)
+        self.assertEqual(cache.stats().disk_hits, 1)
+
+    def test_keys(self):
+        cache = RenderCache()
+        keys = set()
+        for tree in self.trees:
+            keys.add(cache.key(self._art(tree)))
+            keys.add(cache.key(self._art(tree, native=True)))
+            keys.add(cache.key(self._art(tree), (0, 0, 8, 8)))
+        self.assertEqual(len(keys), 3 * len(self.trees))
+        copy = serial.loads(serial.dumps(self.trees[0]))
+        self.assertEqual(
+            cache.key(self._art(copy)), cache.key(self._art(self.trees[0])))
+
+    def test_memory_lru(self):
+        cache = RenderCache(memory_size=10)
+        cache.put('a', b'12345')
+        cache.put('b', b'12345')
+        self.assertEqual(cache.get('a'), b'12345')
+        cache.put('c', b'12345')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'12345')
+        cache.put('d', b'x' * 11)
+        self.assertIsNone(cache.get('d'))
+
+    def test_disk_eviction(self):
+        cache = RenderCache(self.tmpdir, memory_size=0, disk_size=35)
+        for (i, key) in enumerate('abc'):
+            cache.put(key, b'0123456789')
+            os.utime(cache._path(key), (i, i))
+        self.assertEqual(cache.get('a'), b'0123456789')
+        cache.put('d', b'0123456789')
+        self.assertEqual(cache.stats().evictions, 1)
+        present = [key for key in 'abcd'
+                   if os.path.exists(cache._path(key))]
+        self.assertEqual(present, ['a', 'c', 'd'])
+        self.assertIsNone(cache.get('b'))
+
+    def test_disk_scans(self):
+        cache = RenderCache(self.tmpdir, memory_size=0, disk_size=35)
+        scans = []
+        entries = cache._disk_entries
+
+        def counted():
+            scans.append(1)
+            return entries()
+        cache._disk_entries = counted
+        for key in 'abc':
+            cache.put(key, b'0123456789')
+        # only the first store scans until the total goes over disk_size
+        self.assertEqual(len(scans), 1)
+        cache.put('d', b'0123456789')
+        self.assertEqual(len(scans), 2)
+        self.assertEqual(cache.stats().evictions, 1)
+
+    def test_processes(self):
+        tree = self.trees[1]
+        reference = self._art(tree)
+        reference.redraw()
+        data = serial.dumps(tree)
+        regions = [(0, 0, 12, 24), (12, 0, 12, 24)] * 4
+        pool = Pool(4)
+        try:
+            results = pool.map(
+                _render_in_worker,
+                [(self.tmpdir, data, region) for region in regions])
+        finally:
+            pool.close()
+            pool.join()
+        for (region, (pixels, _)) in zip(regions, results):
+            start = region[0] * self.size
+            self.assertEqual(
+                pixels, reference.target[start:start + 12 * 24].tolist())
+        names = [name for name in os.listdir(self.tmpdir)
+                 if name.endswith('.px')]
+        self.assertEqual(len(names), 2)
@@ -0,0 +1,81 @@
+import unittest
+from randomart import (
+    MemorySlabArt, Mod, Sum, Sin, VariableX, VariableY, Constant)
+from randomart.codegen import compile_python, python_source
+from randomart.formats import qcolor
+from randomart.tests import seeded_trees
+
+
+class CodegenTestCase(unittest.TestCase):
+    locations = [
+        (0.646202, -0.289811),
+        (-0.104839, -0.52361),
+        (0.925392, -0.30059),
+        (-0.455872, 0.545205),
+        (0.58055, 0.34685),
+        (-0.37949, -0.45593),
+        (0.448511, 0.58542),
+        (0.769115, -0.121607),
+        (0.379993, 0.511257),
+        (-0.756162, -0.12058)
+    ]
+
+    def setUp(self):
+        self.trees = seeded_trees(0x5eed, 20, (5, 80))
+
+    def test_matches_eval(self):
+        for tree in self.trees:
+            func = compile_python(tree)
+            for x, y in self.locations:
+                self.assertEqual(func(x, y), tree.eval(x, y))
+
+    def test_cached(self):
+        tree = self.trees[0]
+        self.assertIs(compile_python(tree), compile_python(tree))
+
+    def test_source(self):
+        tree = Sin(Sum(VariableX(), Constant(qcolor(0.25, 0.5, 0.75))))
+        tree.phase = 1.5
+        tree.freq = 2.0
+        self.assertEqual(python_source(tree), '\n'.join([
+            'def evaluate(x, y):',
+            '    t0 = 0.5 * x + 0.5 * 0.25',
+            '    t1 = 0.5 * x + 0.5 * 0.5',
+            '    t2 = 0.5 * x + 0.5 * 0.75',
+            '    t3 = math.sin(1.5 + 2.0 * t0)',
+            '    t4 = math.sin(1.5 + 2.0 * t1)',
+            '    t5 = math.sin(1.5 + 2.0 * t2)',
+            '    return qcolor(t3, t4, t5)',
+            '']))
+
+    def test_mod_of_zero(self):
+        tree = Mod(Sum(VariableX(), VariableY()), VariableX())
+        func = compile_python(tree)
+        self.assertEqual(func(0.5, -0.5), qcolor(0.0, 0.0, 0.0))
+        self.assertEqual(func(0.5, 0.25), tree.eval(0.5, 0.25))
+
+    def test_dag_and_lookups(self):
+        size = 32
+        for tree in self.trees[:5]:
+            art = MemorySlabArt(size)
+            art.set_art(tree)
+            art.share()
+            art.separate()
+            func = compile_python(art.art)
+            for x in range(0, size, 5):
+                for y in range(0, size, 7):
+                    u = 2 * float(x) / size - 1.0
+                    v = 2 * float(y) / size - 1.0
+                    self.assertEqual(func(u, v), tree.eval(u, v))
+
+    def test_render(self):
+        size = 40
+        for tree in self.trees[:5]:
+            compiled = MemorySlabArt(size)
+            compiled.set_art(tree)
+            compiled.compile_python()
+            compiled.redraw()
+            reference = MemorySlabArt(size)
+            reference.set_art(tree)
+            reference.redraw()
+            self.assertEqual(compiled.target, reference.target)
@@ -0,0 +1,93 @@
+import unittest
+from cStringIO import StringIO
+from randomart import (
+    generate_seeded, operators, BaseArt, Mod, Shared, Sin, Sum, Well,
+    VariableX, VariableY)
+from randomart import cost, serial
+from randomart.tiled import render_tile
+from randomart.tests import seeded_trees
+
+
+class CostTestCase(unittest.TestCase):
+    def setUp(self):
+        self.trees = seeded_trees(0x5eed, 8, (5, 80))
+
+    def test_features(self):
+        e = Shared(Sin(VariableX()))
+        tree = Mod(Sum(e, e), Well(VariableY()))
+        counts = cost.features(tree, 4, 'reify')
+        self.assertEqual(counts['pixels'], 16)
+        self.assertEqual(counts['sin'], 16)
+        self.assertEqual(counts['shared'], 16)
+        self.assertEqual(counts['well'], 16)
+        self.assertEqual(counts['nodes'], 7)
+        eval_counts = cost.features(tree, 4, None)
+        self.assertEqual(eval_counts['sum'], 32)
+        self.assertEqual(eval_counts['well'], 0)
+        self.assertEqual(cost.features(tree, 4, 'compile')['sum'], 16)
+
+    def test_lookup_features(self):
+        art = BaseArt(16)
+        art.set_art(Sum(Sin(VariableX()), VariableY()))
+        art.separate()
+        counts = cost.features(art.art, 16, 'reify')
+        self.assertEqual(counts['lookup'], 256)
+        self.assertEqual(counts['sin'], 16)
+
+    def test_estimate(self):
+        for backend in cost.DEFAULT_MODELS:
+            model = cost.default_model(backend)
+            for tree in self.trees:
+                small = model.estimate(tree, 16)
+                self.assertGreater(small, 0)
+                self.assertGreater(model.estimate(tree, 64), small)
+
+    def test_save(self):
+        model = cost.default_model('compile')
+        out = StringIO()
+        model.save(out)
+        loaded = cost.CostModel.load(StringIO(out.getvalue()))
+        self.assertEqual(loaded.backend, 'compile')
+        self.assertEqual(
+            loaded.estimate(self.trees[0], 32),
+            model.estimate(self.trees[0], 32))
+
+    def test_calibrate(self):
+        trees = cost.calibration_corpus(count=4)
+        model = cost.calibrate('compile', 8, trees, repeat=1)
+        floor = cost.MIN_COEFFICIENTS['compile']
+        self.assertTrue(
+            all(k >= floor for k in model.coefficients.values()))
+        self.assertGreater(model.estimate(self.trees[0], 8), 0)
+
+    def test_every_operator_costs(self):
+        for backend in cost.DEFAULT_MODELS:
+            model = cost.default_model(backend)
+            for op in operators:
+                self.assertGreater(
+                    model.coefficients[serial.names[op]], 0, (backend, op))
+
+    def test_schedule(self):
+        costs = [5, 4, 3, 3, 2, 2, 1]
+        plan = cost.schedule(costs, 3, lambda c: c)
+        self.assertEqual(sorted(sum(a) for a in plan.assignments), [6, 7, 7])
+        self.assertEqual(plan.loads, [sum(a) for a in plan.assignments])
+        self.assertEqual(plan.makespan, 7)
+        plan = cost.schedule(costs, 2, lambda c: c, budget=3)
+        self.assertEqual(plan.rejected, [5, 4])
+        self.assertEqual(sorted(sum(plan.assignments, [])), [1, 2, 2, 3, 3])
+
+    def test_render_batch(self):
+        trees = [generate_seeded(i, 5, 40) for i in range(5)]
+        model = cost.default_model('compile')
+        budget = sorted(model.estimate(tree, 16) for tree in trees)[-2]
+        (plan, images) = cost.render_batch(
+            trees, 16, processes=2, backend='compile', budget=budget)
+        self.assertEqual(len(plan.rejected), 1)
+        self.assertEqual(len(images), 4)
+        for (index, pixels) in images.items():
+            art = BaseArt(16)
+            art.set_art(trees[index])
+            art.compile()
+            self.assertEqual(
+                pixels, render_tile(art, (0, 0, 16, 16), 'rgb'))
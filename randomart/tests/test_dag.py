@@ -0,0 +1,74 @@
+import pickle
+import unittest
+from randomart import (
+    MemorySlabArt, Shared, Sum, Sin, Tent, VariableX, VariableY)
+from randomart.dag import share, sharing_stats
+from randomart.tests import seeded_trees
+
+
+class ShareTestCase(unittest.TestCase):
+    locations = [
+        (0.646202, -0.289811),
+        (-0.104839, -0.52361),
+        (0.925392, -0.30059),
+        (-0.455872, 0.545205),
+        (0.58055, 0.34685),
+        (-0.37949, -0.45593),
+        (0.448511, 0.58542),
+        (0.769115, -0.121607),
+        (0.379993, 0.511257),
+        (-0.756162, -0.12058)
+    ]
+
+    def setUp(self):
+        self.trees = seeded_trees(0x5eed, 20, (20, 120))
+
+    def test_shares_identical_subtrees(self):
+        tree = Sum(Tent(VariableX()), Tent(VariableX()))
+        dag = share(tree)
+        self.assertIsInstance(dag.e1, Shared)
+        self.assertIs(dag.e1, dag.e2)
+        stats = sharing_stats(tree, dag)
+        self.assertEqual(stats.tree_nodes, 5)
+        self.assertEqual(stats.dag_nodes, 3)
+        self.assertEqual(stats.shared_nodes, 1)
+        self.assertEqual(stats.saved_evaluations, 2)
+
+    def test_respects_params(self):
+        (s1, s2) = (Sin(VariableY()), Sin(VariableY()))
+        s2.phase = s1.phase
+        s2.freq = s1.freq + 1.0
+        dag = share(Sum(s1, s2))
+        self.assertIsNot(dag.e1, dag.e2)
+        s2.freq = s1.freq
+        dag = share(Sum(s1, s2))
+        self.assertIs(dag.e1, dag.e2)
+
+    def test_matches_eval(self):
+        for tree in self.trees:
+            dag = share(tree)
+            (reified, dag_reified) = (tree.reify(), dag.reify())
+            for x, y in self.locations:
+                self.assertEqual(dag.eval(x, y), tree.eval(x, y))
+                self.assertEqual(dag_reified.eval(x, y), reified.eval(x, y))
+
+    def test_threaded_render(self):
+        size = 24
+        for tree in self.trees[:5]:
+            reference = MemorySlabArt(size)
+            reference.set_art(tree)
+            reference.reify()
+            reference.redraw()
+            art = MemorySlabArt(size)
+            art.set_art(tree)
+            art.share()
+            art.reify()
+            art.redraw_threaded(threads=3, band_size=2)
+            self.assertEqual(art.target, reference.target)
+
+    def test_pickle(self):
+        dag = share(self.trees[0])
+        dag.reify()
+        dag.eval(0.5, 0.5)
+        loaded = pickle.loads(pickle.dumps(dag))
+        self.assertEqual(loaded.eval(0.5, 0.5), dag.eval(0.5, 0.5))
@@ -0,0 +1,59 @@
+import random
+import unittest
+from randomart import generate, MemorySlabArt, Shared
+from randomart.dag import share
+from randomart.formats import qcolor
+from randomart.tests import seeded_trees
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, "numpy is not available")
+class EvalGridTestCase(unittest.TestCase):
+    locations = [
+        (0.646202, -0.289811),
+        (-0.104839, -0.52361),
+        (0.925392, -0.30059),
+        (-0.455872, 0.545205),
+        (0.58055, 0.34685),
+        (-0.37949, -0.45593),
+        (0.448511, 0.58542),
+        (0.769115, -0.121607),
+        (0.379993, 0.511257),
+        (-0.756162, -0.12058)
+    ]
+
+    def test_matches_eval(self):
+        trees = seeded_trees(0x5eed, 20, (5, 60))
+        x = numpy.array([loc[0] for loc in self.locations])
+        y = numpy.array([loc[1] for loc in self.locations])
+        for tree in trees:
+            (r, g, b) = tree.eval_grid(x, y)
+            for i, (u, v) in enumerate(self.locations):
+                self.assertEqual(tree.eval(u, v), qcolor(r[i], g[i], b[i]))
+
+    def test_get_grid(self):
+        art = MemorySlabArt(8)
+        art.set_art(generate(30, random.Random(0x5eed)))
+        (r, g, b) = art.get_grid()
+        self.assertEqual(r.shape, (8, 8))
+        for x in range(8):
+            for y in range(8):
+                self.assertEqual(
+                    art.get_pixel((x, y), 1),
+                    qcolor(r[x, y], g[x, y], b[x, y]))
+
+    def test_get_grid_releases_shared(self):
+        for tree in seeded_trees(0x5eed, 10, (20, 80)):
+            art = MemorySlabArt(8)
+            art.set_art(share(tree))
+            art.get_grid()
+            stack = [art.art]
+            while stack:
+                node = stack.pop()
+                if isinstance(node, Shared):
+                    self.assertIsNone(node._last_grid)
+                stack.extend(getattr(node, name) for name in node.subexprs)
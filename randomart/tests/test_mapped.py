@@ -0,0 +1,78 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from randomart import generate, MemorySlabArt, MappedSlabArt
+from randomart.slab import open_slab
+
+
+class MappedSlabArtTestCase(unittest.TestCase):
+    size = 21
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'image.slab')
+        self.art = generate(30, random.Random(0x5eed))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _reference(self, native):
+        reference = MemorySlabArt(self.size)
+        reference.set_art(self.art)
+        if native:
+            reference.reify()
+        reference.redraw()
+        return list(reference.target)
+
+    def _open(self, native, **kwargs):
+        art = MappedSlabArt(self.path, **kwargs)
+        art.set_art(self.art)
+        if native:
+            art.reify()
+        return art
+
+    def test_resume(self):
+        for native in (False, True):
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            art = self._open(native, size=self.size, tile_size=8)
+            self.assertEqual(len(art.tiles), 9)
+            for index in (0, 4, 8):
+                art.draw_tile(index)
+            art.close()
+
+            art = self._open(native)
+            self.assertEqual(art.tile_size, 8)
+            self.assertEqual(art.missing_tiles(), [1, 2, 3, 5, 6, 7])
+            self.assertEqual(len(art.completed_tiles()), 3)
+            art.redraw_tiled(processes=2)
+            self.assertTrue(art.is_complete())
+            self.assertEqual(list(art.target), self._reference(native))
+            art.close()
+
+    def test_serial_and_threaded(self):
+        art = self._open(False, size=self.size, tile_size=8)
+        art.redraw()
+        self.assertTrue(art.is_complete())
+        self.assertEqual(list(art.target), self._reference(False))
+        art.close()
+        os.unlink(self.path)
+        art = self._open(True, size=self.size, tile_size=8)
+        art.redraw_threaded(threads=2, band_size=4)
+        self.assertTrue(art.is_complete())
+        self.assertEqual(list(art.target), self._reference(True))
+        art.close()
+
+    def test_readable_as_slab(self):
+        art = self._open(True, size=self.size)
+        art.redraw()
+        art.close()
+        with open_slab(self.path) as slab:
+            self.assertEqual(list(slab.pixels), self._reference(True))
+
+    def test_size_mismatch(self):
+        self._open(False, size=self.size).close()
+        with self.assertRaises(ValueError):
+            MappedSlabArt(self.path, size=self.size + 1)
@@ -0,0 +1,66 @@
+import unittest
+from randomart import (
+    MemorySlabArt, Constant, Level, Mix, Product, Sum, Well, VariableX,
+    VariableY)
+from randomart.formats import qcolor
+from randomart.optimize import optimize, count_nodes
+from randomart.tests import seeded_trees
+
+
+class OptimizeTestCase(unittest.TestCase):
+    locations = [
+        (0.646202, -0.289811),
+        (-0.104839, -0.52361),
+        (0.925392, -0.30059),
+        (-0.455872, 0.545205),
+        (0.58055, 0.34685),
+        (-0.37949, -0.45593),
+        (0.448511, 0.58542),
+        (0.769115, -0.121607),
+        (0.379993, 0.511257),
+        (-0.756162, -0.12058)
+    ]
+
+    def test_fold_constants(self):
+        tree = Sum(
+            Well(Constant(qcolor(0.1, 0.2, 0.3))),
+            Constant(qcolor(0.4, 0.5, 0.6)))
+        folded = optimize(tree)
+        self.assertIsInstance(folded, Constant)
+        self.assertEqual(folded.c, tree.eval(0.0, 0.0))
+        self.assertEqual(count_nodes(tree), 4)
+        self.assertEqual(count_nodes(folded), 1)
+
+    def test_identities(self):
+        x = VariableX()
+        y = VariableY()
+        level = Level(Constant(qcolor(0.1, 0.2, 0.3)), x, y)
+        level.treshold = 0.5
+        self.assertIsInstance(optimize(level), VariableX)
+        level.treshold = -0.5
+        self.assertIsInstance(optimize(level), VariableY)
+        mix = Mix(Constant(qcolor(1, 0, 0)), x, y)
+        self.assertIsInstance(optimize(mix), VariableX)
+        product = Product(y, Constant(qcolor(1, 1, 1)))
+        self.assertIsInstance(optimize(product), VariableY)
+
+    def test_leaves_original(self):
+        tree = Sum(Constant(), Constant())
+        optimize(tree)
+        self.assertIsInstance(tree, Sum)
+
+    def test_matches_eval(self):
+        trees = seeded_trees(0x5eed, 50, (5, 80))
+        for tree in trees:
+            optimized = optimize(tree)
+            self.assertLessEqual(count_nodes(optimized), count_nodes(tree))
+            (reified, optimized_reified) = (tree.reify(), optimized.reify())
+            for x, y in self.locations:
+                self.assertEqual(optimized.eval(x, y), tree.eval(x, y))
+                self.assertEqual(
+                    optimized_reified.eval(x, y), reified.eval(x, y))
+
+    def test_base_art(self):
+        art = MemorySlabArt(4)
+        art.set_art(Sum(VariableX(), Sum(Constant(), Constant())))
+        self.assertEqual(art.optimize(), (5, 3))
@@ -0,0 +1,76 @@
+import unittest
+from cStringIO import StringIO
+from PIL import Image
+from randomart import pil_create_image, _PILArt, Sum, VariableX
+from randomart import serial
+from randomart.tiled import render_tile
+from randomart.tests import seeded_trees
+
+
+class PILArtTestCase(unittest.TestCase):
+    size = (40, 24)
+
+    def setUp(self):
+        self.trees = seeded_trees(0x5eed, 4, (10, 50))
+
+    def _art(self, tree, backend=None, target=None):
+        art = _PILArt(target or self.size)
+        art.set_art(tree)
+        if backend is not None:
+            getattr(art, backend)()
+        return art
+
+    def test_axes_span_image(self):
+        art = self._art(Sum(VariableX(), VariableX()), 'reify')
+        art.redraw()
+        image = art.image()
+        self.assertEqual(image.size, self.size)
+        (width, height) = self.size
+        for x in (0, 17, width - 1):
+            column = set(image.getpixel((x, y)) for y in xrange(height))
+            self.assertEqual(len(column), 1)
+        self.assertEqual(image.getpixel((0, 0)), (0, 0, 0))
+
+    def test_backends_agree(self):
+        (width, height) = self.size
+        for tree in self.trees:
+            for backend in ('reify', 'compile'):
+                art = self._art(tree, backend)
+                art.redraw()
+                self.assertEqual(
+                    bytes(art.pixels),
+                    render_tile(art, (0, 0, width, height), 'rgb'))
+                threaded = self._art(tree, backend)
+                threaded.redraw_threaded(threads=2, band_size=5)
+                self.assertEqual(threaded.pixels, art.pixels)
+            evaluated = self._art(tree)
+            evaluated.redraw()
+            progressive = self._art(tree)
+            for _ in progressive.redraw_progressive(16, 2):
+                pass
+            self.assertEqual(progressive.pixels, evaluated.pixels)
+
+    def test_tiled(self):
+        art = self._art(self.trees[0], 'compile')
+        art.redraw()
+        tiled = self._art(self.trees[0], 'compile')
+        tiled.redraw_tiled(tile_size=16, processes=2)
+        self.assertEqual(tiled.pixels, art.pixels)
+
+    def test_target(self):
+        for backend in (None, 'compile'):
+            target = Image.new('RGB', self.size)
+            art = self._art(self.trees[1], backend, target)
+            art.redraw()
+            self.assertEqual(target.tobytes(), art.image().tobytes())
+
+    def test_create_image(self):
+        data = serial.dumps(self.trees[2])
+        image = pil_create_image(self.size, StringIO(data))
+        self.assertEqual((image.mode, image.size), ('RGB', self.size))
+        square = pil_create_image(16, StringIO(data))
+        self.assertEqual(square.size, (16, 16))
+
+
+if __name__ == '__main__':
+    unittest.main()
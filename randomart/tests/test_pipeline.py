@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+from PIL import Image
+from randomart.pipeline import run_pipeline
+
+
+class PipelineTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.pattern = os.path.join(self.tmpdir, 'out%08x.png')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_run(self):
+        seen = []
+        stats = run_pipeline(
+            start=0xfe, count=6, size=24, pattern=self.pattern,
+            generators=2, renderers=2, encoders=2, queue_size=1,
+            tree_sizes=(5, 20), progress=lambda i, path: seen.append(i))
+        self.assertEqual(stats.images, 6)
+        self.assertEqual(stats.resume_index, 0xfe + 6)
+        self.assertEqual(sorted(seen), range(0xfe, 0xfe + 6))
+        self.assertEqual(
+            sorted(os.listdir(self.tmpdir)),
+            ['out%08x.png' % i for i in range(0xfe, 0xfe + 6)])
+        for i in seen:
+            image = Image.open(self.pattern % i)
+            self.assertEqual(image.size, (24, 24))
+            image.load()
+        self.assertGreater(stats.render_time, 0)
+        self.assertIn('resume from 104', stats.summary())
+
+    def test_seeded(self):
+        outputs = []
+        for run in range(2):
+            pattern = os.path.join(self.tmpdir, 'run%d_%%08x.png' % run)
+            run_pipeline(
+                start=3, count=3, size=16, pattern=pattern, renderers=2,
+                tree_sizes=(5, 20), seed=0x5eed)
+            outputs.append([
+                open(pattern % i, 'rb').read() for i in range(3, 6)])
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(len(set(outputs[0])), 3)
+
+    def test_max_cost(self):
+        stats = run_pipeline(
+            start=0, count=3, size=16, pattern=self.pattern, renderers=1,
+            tree_sizes=(5, 20), max_cost=0.0)
+        self.assertEqual((stats.images, stats.rejected), (0, 3))
+        self.assertEqual(stats.resume_index, 3)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_nothing(self):
+        stats = run_pipeline(count=0, size=8, pattern=self.pattern)
+        self.assertEqual((stats.images, stats.resume_index), (0, 0))
@@ -0,0 +1,68 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from randomart import Constant, Sum, VariableX, VariableY, Well
+from randomart.pipeline import run_pipeline
+from randomart.probe import (
+    ProbeReport, Thresholds, generate_acceptable, pixel_stats, probe)
+
+
+class ProbeTestCase(unittest.TestCase):
+    def test_pixel_stats(self):
+        self.assertEqual(pixel_stats(b'\x40\x80\xc0' * 16, 4, 4),
+                         (0.0, 1, 0.0))
+        # a horizontal gradient of grey: 0, 85, 170, 255 on each row
+        row = b''.join(chr(v) * 3 for v in (0, 85, 170, 255))
+        (variance, colors, edges) = pixel_stats(row * 4, 4, 4)
+        self.assertAlmostEqual(variance, 85 * 85 * 1.25)
+        self.assertEqual(colors, 4)
+        # 3 of the 6 neighbouring pairs per column and row differ by 85
+        self.assertAlmostEqual(edges, 85 / 2.0)
+
+    def test_probe(self):
+        thresholds = Thresholds()
+        for backend in (None, 'reify', 'compile', 'compile_python'):
+            flat = probe(Constant(), backend)
+            self.assertEqual(flat[:3], (0.0, 1, 0.0))
+            self.assertFalse(thresholds.accepts(flat))
+            art = Well(Sum(VariableX(), VariableY()))
+            self.assertTrue(thresholds.accepts(probe(art, backend)))
+
+    def test_generate_acceptable(self):
+        report = ProbeReport()
+        thresholds = Thresholds()
+        rng = random.Random(0x5eed)
+        for _ in range(5):
+            art = generate_acceptable(thresholds, rng, report=report)
+            self.assertTrue(thresholds.accepts(probe(art)))
+        self.assertEqual(report.probed - report.rejected, 5)
+        self.assertGreater(report.probe_time, 0)
+        if report.rejected:
+            self.assertGreater(report.render_time_avoided, 0)
+        self.assertIn('of %d trees degenerate' % report.probed,
+                      report.summary())
+
+    def test_pipeline(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            pattern = os.path.join(tmpdir, 'out%08x.png')
+            # nothing passes, so every tree is probed once and skipped
+            stats = run_pipeline(
+                count=3, size=16, pattern=pattern, renderers=1,
+                tree_sizes=(5, 20), seed=0x5eed,
+                thresholds=Thresholds(1e9, 0, 0),
+                regenerate=False)
+            self.assertEqual((stats.images, stats.degenerate), (0, 3))
+            self.assertEqual(stats.resume_index, 3)
+            self.assertEqual(
+                (stats.probes.probed, stats.probes.rejected), (3, 3))
+            stats = run_pipeline(
+                count=3, size=16, pattern=pattern, renderers=1,
+                tree_sizes=(5, 20), seed=0x5eed, thresholds=Thresholds())
+            self.assertEqual((stats.images, stats.degenerate), (3, 0))
+            self.assertEqual(
+                stats.probes.probed - stats.probes.rejected, 3)
+        finally:
+            shutil.rmtree(tmpdir)
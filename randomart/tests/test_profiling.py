@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+import unittest
+from randomart import BaseArt, Mod, Sum, VariableX, VariableY, Well
+from randomart import formats, profiling
+from randomart.tiled import render_tile
+
+
+class ProfilingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.art_impl = BaseArt(8)
+        self.art_impl.set_art(
+            Sum(Well(VariableX()), Mod(VariableY(), VariableX())))
+
+    def render(self):
+        render_tile(self.art_impl, (0, 0, 8, 8), 'rgb')
+
+    def test_tree(self):
+        self.art_impl.reify()
+        reified = self.art_impl.art_reified
+        formats.profile_tree(reified)
+        try:
+            profiling.reset(self.art_impl)
+            self.render()
+            entries = profiling.node_entries(self.art_impl)
+        finally:
+            formats.profile_tree(reified, False)
+        self.assertEqual(
+            [(depth, e.name, e.calls) for (depth, _, e) in entries],
+            [(0, 'ra_sum', 64), (1, 'ra_well', 64),
+             (2, 'ra_variable_x', 64), (1, 'ra_mod', 64),
+             (2, 'ra_variable_y', 64), (2, 'ra_variable_x', 64)])
+        (root, inner) = (entries[0][2], entries[1:])
+        self.assertGreater(root.total_time, 0)
+        self.assertLessEqual(root.self_time, root.total_time)
+        types = dict((e.name, e) for e in profiling.by_type(
+            e for (_, _, e) in entries))
+        self.assertEqual(
+            (types['ra_variable_x'].nodes, types['ra_variable_x'].calls),
+            (2, 128))
+        self.assertIn('ra_mod(ra_variable_y, ra_variable_x)',
+                      profiling.report(self.art_impl))
+        # no longer counted
+        self.render()
+        self.assertEqual(reified.profile.calls, 64)
+
+    def test_vm(self):
+        self.art_impl.compile()
+        formats.profile_set(True)
+        try:
+            profiling.reset(self.art_impl)
+            formats.profile_vm(reset=True)
+            self.render()
+        finally:
+            formats.profile_set(False)
+        opcodes = dict((e.name, e.calls) for e in profiling.opcode_entries())
+        # Mod takes both operands from e1
+        self.assertEqual(opcodes, {
+            'var_x': 64, 'var_y': 64, 'well': 64, 'mod': 64, 'sum': 64})
+        self.assertIn('by opcode', profiling.report(self.art_impl))
+        formats.profile_vm(reset=True)
+
+    def test_enabled(self):
+        env = dict(os.environ, RA_PROFILE='1')
+        out = subprocess.check_output(
+            [sys.executable, '-m', 'randomart.profiling', '--size', '8'],
+            env=env)
+        self.assertIn('by node type', out)
+        self.assertIn('by subtree', out)
+        self.assertIn('by transforms implementation', out)
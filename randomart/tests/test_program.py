@@ -0,0 +1,57 @@
+import unittest
+from randomart import MemorySlabArt, Sum, Sin, VariableX, Constant
+from randomart.formats import qcolor
+from randomart.program import compile_art
+from randomart.tests import seeded_trees
+
+
+class ProgramTestCase(unittest.TestCase):
+    locations = [
+        (0.646202, -0.289811),
+        (-0.104839, -0.52361),
+        (0.925392, -0.30059),
+        (-0.455872, 0.545205),
+        (0.58055, 0.34685),
+        (-0.37949, -0.45593),
+        (0.448511, 0.58542),
+        (0.769115, -0.121607),
+        (0.379993, 0.511257),
+        (-0.756162, -0.12058)
+    ]
+
+    def setUp(self):
+        self.trees = seeded_trees(0x5eed, 20, (5, 80))
+
+    def test_matches_eval(self):
+        for tree in self.trees:
+            prog = compile_art(tree).native()
+            for x, y in self.locations:
+                self.assertEqual(prog.eval(x, y), tree.eval(x, y))
+
+    def test_registers(self):
+        prog = compile_art(Sum(VariableX(), Sum(VariableX(), VariableX())))
+        self.assertEqual(prog.registers, 3)
+        self.assertEqual(prog.code[-1][1], 0)
+
+    def test_disassemble(self):
+        tree = Sin(Sum(VariableX(), Constant(qcolor(0.25, 0.5, 0.75))))
+        tree.phase = 1.5
+        tree.freq = 2.0
+        self.assertEqual(compile_art(tree).disassemble(), '\n'.join([
+            '0000  var_x    r0',
+            '0001  constant r1, 0.25, 0.5, 0.75',
+            '0002  sum      r0, r0, r1',
+            '0003  sin      r0, r0, 1.5, 2',
+        ]))
+
+    def test_render(self):
+        size = 70
+        for tree in self.trees[:5]:
+            compiled = MemorySlabArt(size)
+            compiled.set_art(tree)
+            compiled.compile()
+            compiled.redraw()
+            reference = MemorySlabArt(size)
+            reference.set_art(tree)
+            reference.redraw()
+            self.assertEqual(compiled.target, reference.target)
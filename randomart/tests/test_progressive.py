@@ -0,0 +1,54 @@
+import random
+import unittest
+from randomart import generate, MemorySlabArt
+
+
+class CountingArt(MemorySlabArt):
+    def __init__(self, size):
+        super(CountingArt, self).__init__(size)
+        self.samples = 0
+
+    def get_pixel(self, location, d):
+        self.samples += 1
+        return super(CountingArt, self).get_pixel(location, d)
+
+
+class ProgressiveTestCase(unittest.TestCase):
+    size = 37
+
+    def setUp(self):
+        self.art = generate(40, random.Random(0x5eed))
+
+    def test_matches_redraw(self):
+        art = CountingArt(self.size)
+        art.set_art(self.art)
+        rounds = list(art.redraw_progressive(16, 4))
+        self.assertEqual(rounds, [16, 4, 1])
+        self.assertEqual(art.samples, self.size * self.size)
+        reference = MemorySlabArt(self.size)
+        reference.set_art(self.art)
+        reference.redraw()
+        self.assertEqual(art.target, reference.target)
+
+    def test_powers_of_factor(self):
+        art = CountingArt(self.size)
+        art.set_art(self.art)
+        rounds = list(art.redraw_progressive(27, 3))
+        self.assertEqual(rounds, [27, 9, 3, 1])
+        self.assertEqual(art.samples, self.size * self.size)
+        for (square_size, factor) in ((64, 3), (12, 4), (16, 1)):
+            # raised by the call, before any round is asked for
+            self.assertRaises(
+                ValueError, art.redraw_progressive, square_size, factor)
+
+    def test_preview(self):
+        art = MemorySlabArt(self.size)
+        art.set_art(self.art)
+        art.reify()
+        rounds = art.redraw_progressive(16, 4)
+        next(rounds)
+        for x in range(self.size):
+            for y in range(self.size):
+                corner = (x - x % 16) * self.size + y - y % 16
+                self.assertEqual(
+                    art.target[x * self.size + y], art.target[corner])
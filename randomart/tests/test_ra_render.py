@@ -0,0 +1,56 @@
+import random
+import unittest
+from array import array
+from randomart import generate, MemorySlabArt
+from randomart.formats import render_rgb, render_packed
+
+
+class RaRenderTestCase(unittest.TestCase):
+    size = 16
+
+    def setUp(self):
+        self.art = generate(40, random.Random(0x5eed))
+        self.reference = MemorySlabArt(self.size)
+        self.reference.set_art(self.art)
+        self.reference.reify()
+        for _ in self.reference._do_draw_rounds():
+            pass
+
+    def test_packed(self):
+        out = array('i', [0] * (self.size * self.size))
+        render_packed(self.art.reify(), self.size, out)
+        self.assertEqual(out, self.reference.target)
+
+    def test_rgb(self):
+        out = bytearray(self.size * self.size * 3)
+        render_rgb(self.art.reify(), self.size, out)
+        for x in range(self.size):
+            for y in range(self.size):
+                offset = 3 * (y * self.size + x)
+                packed = self.reference.target[x * self.size + y]
+                self.assertEqual(
+                    tuple(out[offset:offset + 3]),
+                    (packed >> 16, (packed >> 8) & 0xff, packed & 0xff))
+
+    def test_region(self):
+        (x0, y0, width, height) = (3, 5, 7, 4)
+        out = array('i', [0] * (width * height))
+        render_packed(
+            self.art.reify(), self.size, out, (x0, y0, width, height))
+        for x in range(width):
+            for y in range(height):
+                self.assertEqual(
+                    out[x * height + y],
+                    self.reference.target[(x0 + x) * self.size + y0 + y])
+
+    def test_region_out_of_bounds(self):
+        out = array('i', [0] * 64)
+        with self.assertRaises(ValueError):
+            render_packed(self.art.reify(), self.size, out, (12, 0, 8, 8))
+
+    def test_memoryslab_reified(self):
+        art = MemorySlabArt(self.size)
+        art.set_art(self.art)
+        art.reify()
+        art.redraw()
+        self.assertEqual(art.target, self.reference.target)
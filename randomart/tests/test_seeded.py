@@ -0,0 +1,54 @@
+import random
+import unittest
+from randomart import generate, generate_seeded, operators
+from randomart import serial
+
+
+class SeededGenerationTestCase(unittest.TestCase):
+    seeds = [0, 1, 0x5eed, 2 ** 63 + 12345, 2 ** 64 - 1]
+
+    def test_reproducible(self):
+        for seed in self.seeds:
+            self.assertEqual(
+                serial.dumps(generate_seeded(seed)),
+                serial.dumps(generate_seeded(seed)))
+
+    def test_distinct(self):
+        hashes = set(
+            serial.content_hash(generate_seeded(seed)) for seed in self.seeds)
+        self.assertEqual(len(hashes), len(self.seeds))
+
+    def test_sizes(self):
+        small = generate_seeded(7, 3, 4)
+        self.assertNotEqual(
+            serial.dumps(small), serial.dumps(generate_seeded(7)))
+
+    def test_global_state_untouched(self):
+        state = random.getstate()
+        generate_seeded(42)
+        generate(30, random.Random(42))
+        self.assertEqual(random.getstate(), state)
+
+    def test_matches_global_generation(self):
+        rng_state = random.getstate()
+        random.seed(0x5eed)
+        try:
+            expected = generate(60)
+        finally:
+            random.setstate(rng_state)
+        tree = generate(60, random.Random(0x5eed))
+        self.assertEqual(serial.dumps(tree), serial.dumps(expected))
+
+    def test_operators_take_rng(self):
+        rng = random.Random(3)
+        seen = set()
+        for _ in range(20):
+            seen.update(type(node) for node in _walk(generate(40, rng)))
+        self.assertEqual(seen, set(operators))
+
+
+def _walk(art):
+    yield art
+    for name in art.subexprs:
+        for node in _walk(getattr(art, name)):
+            yield node
@@ -0,0 +1,89 @@
+import unittest
+from randomart import (
+    MemorySlabArt, Lookup, Constant, Sum, Product, Tent, VariableX, VariableY)
+from randomart.formats import qcolor
+from randomart.separable import (
+    dependency, separate, separable_stats,
+    CONSTANT, X_ONLY, Y_ONLY, XY)
+from randomart.tests import seeded_trees
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class SeparableTestCase(unittest.TestCase):
+    locations = [
+        (0.646202, -0.289811),
+        (-0.104839, -0.52361),
+        (0.925392, -0.30059),
+        (-0.455872, 0.545205),
+        (0.58055, 0.34685),
+        (-0.37949, -0.45593),
+        (0.448511, 0.58542),
+        (0.769115, -0.121607),
+        (0.379993, 0.511257),
+        (-0.756162, -0.12058)
+    ]
+    size = 16
+
+    def setUp(self):
+        self.trees = seeded_trees(0x5eed, 10, (20, 80))
+
+    def test_dependency(self):
+        c = Constant(qcolor(0.1, 0.2, 0.3))
+        self.assertEqual(dependency(Tent(c)), CONSTANT)
+        self.assertEqual(dependency(Sum(c, VariableX())), X_ONLY)
+        self.assertEqual(dependency(Tent(VariableY())), Y_ONLY)
+        self.assertEqual(dependency(Sum(VariableX(), VariableY())), XY)
+
+    def test_separate(self):
+        tree = Product(Tent(VariableX()), Tent(VariableY()))
+        separated = separate(tree, self.size)
+        self.assertIsInstance(separated.e1, Lookup)
+        self.assertEqual(separated.e1.axis, 0)
+        self.assertIsInstance(separated.e2, Lookup)
+        self.assertEqual(separated.e2.axis, 1)
+        stats = separable_stats(tree, separated)
+        self.assertEqual((stats.x_nodes, stats.y_nodes, stats.xy_nodes),
+                         (2, 2, 1))
+        self.assertEqual(stats.lookups, 2)
+        self.assertEqual(
+            stats.evaluations_avoided, 2 * 2 * self.size * (self.size - 1))
+
+    def test_off_grid(self):
+        for tree in self.trees:
+            separated = separate(tree, self.size)
+            (reified, separated_reified) = (tree.reify(), separated.reify())
+            for x, y in self.locations:
+                self.assertEqual(separated.eval(x, y), tree.eval(x, y))
+                self.assertEqual(
+                    separated_reified.eval(x, y), reified.eval(x, y))
+
+    def _render(self, tree, backend, separated):
+        art = MemorySlabArt(self.size)
+        art.set_art(tree)
+        if separated:
+            art.separate()
+        if backend is not None:
+            getattr(art, backend)()
+        art.redraw()
+        return art.target
+
+    def test_render(self):
+        for tree in self.trees:
+            for backend in (None, 'reify', 'compile'):
+                self.assertEqual(
+                    self._render(tree, backend, True),
+                    self._render(tree, backend, False))
+
+    @unittest.skipIf(numpy is None, "numpy is not available")
+    def test_eval_grid(self):
+        art = MemorySlabArt(self.size)
+        for tree in self.trees:
+            art.set_art(tree)
+            expected = art.get_grid()
+            art.separate()
+            for (a, b) in zip(art.get_grid(), expected):
+                self.assertTrue(numpy.allclose(a, b, rtol=0, atol=0.00001))
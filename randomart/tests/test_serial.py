@@ -0,0 +1,168 @@
+import pickle
+import random
+import struct
+import unittest
+from cStringIO import StringIO
+from randomart import (
+    memoryslab_create_image, MemorySlabArt, Sin, Sum, VariableX,
+    VariableY, Constant, Shared, Tent)
+from randomart import serial
+from randomart.formats import qcolor
+from randomart.tests import seeded_trees
+
+
+class SerialTestCase(unittest.TestCase):
+    locations = [
+        (0.646202, -0.289811),
+        (-0.104839, -0.52361),
+        (0.925392, -0.30059),
+        (-0.455872, 0.545205),
+        (0.58055, 0.34685),
+        (-0.37949, -0.45593),
+        (0.448511, 0.58542),
+        (0.769115, -0.121607),
+        (0.379993, 0.511257),
+        (-0.756162, -0.12058)
+    ]
+
+    def setUp(self):
+        self.trees = seeded_trees(0x5eed, 20, (5, 80))
+
+    def assertSameArt(self, a, b):
+        self.assertEqual(repr(a), repr(b))
+        for x, y in self.locations:
+            self.assertEqual(a.eval(x, y).to_tuple(), b.eval(x, y).to_tuple())
+
+    def test_roundtrip(self):
+        for tree in self.trees:
+            self.assertSameArt(serial.loads(serial.dumps(tree)), tree)
+
+    def test_roundtrip_many(self):
+        data = serial.dumps_many(self.trees)
+        self.assertEqual(serial.read_header(data), len(self.trees))
+        for (a, b) in zip(serial.loads_many(data), self.trees):
+            self.assertSameArt(a, b)
+
+    def test_roundtrip_text(self):
+        for tree in self.trees:
+            text = serial.dumps_text(tree)
+            self.assertSameArt(serial.loads_text(text), tree)
+
+    def test_text(self):
+        tree = Sin(Sum(VariableX(), Constant(qcolor(0.25, 0.5, 0.75))))
+        tree.phase = 1.5
+        tree.freq = 2.0
+        self.assertEqual(
+            serial.dumps_text(tree),
+            'ra1 sin 1.5 2.0 sum x constant 0.25 0.5 0.75')
+
+    def test_smaller_than_pickle(self):
+        for tree in self.trees:
+            self.assertLess(
+                len(serial.dumps(tree)), len(pickle.dumps(tree, 2)))
+
+    def test_decoding_leaves_random_alone(self):
+        data = serial.dumps_many(self.trees)
+        state = random.getstate()
+        serial.loads_many(data)
+        self.assertEqual(random.getstate(), state)
+
+    def test_dag_and_lookups(self):
+        for tree in self.trees[:5]:
+            art = MemorySlabArt(32)
+            art.set_art(tree)
+            art.share()
+            art.separate()
+            data = serial.dumps(art.art)
+            self.assertSameArt(serial.loads(data), art.art)
+            self.assertSameArt(
+                serial.loads_text(serial.dumps_text(art.art)), art.art)
+            self.assertEqual(
+                serial.content_hash(art.art), serial.content_hash(tree))
+
+    def test_shared_stays_shared(self):
+        e = Sin(Sum(VariableX(), VariableY()))
+        tree = Sum(e, e)
+        dag = Sum(Shared(e), None)
+        dag.e2 = dag.e1
+        loaded = serial.loads(serial.dumps(dag))
+        self.assertIs(loaded.e1, loaded.e2)
+        self.assertIsInstance(loaded.e1, Shared)
+        self.assertLess(len(serial.dumps(dag)), len(serial.dumps(tree)))
+        loaded = serial.loads_text(serial.dumps_text(dag))
+        self.assertIs(loaded.e1, loaded.e2)
+        self.assertEqual(serial.content_hash(dag), serial.content_hash(tree))
+
+    def test_content_hash(self):
+        hashes = set(serial.content_hash(tree) for tree in self.trees)
+        self.assertEqual(len(hashes), len(self.trees))
+        for tree in self.trees:
+            loaded = serial.loads(serial.dumps(tree))
+            self.assertEqual(
+                serial.content_hash(loaded), serial.content_hash(tree))
+        tree = Sin(VariableX())
+        before = serial.content_hash(tree)
+        tree.freq += 1e-9
+        self.assertNotEqual(serial.content_hash(tree), before)
+
+    def test_reify_bytes(self):
+        for tree in self.trees:
+            reified = serial.reify_bytes(serial.dumps(tree))
+            expected = tree.reify()
+            for x, y in self.locations:
+                self.assertEqual(reified.eval(x, y), expected.eval(x, y))
+
+    def test_errors(self):
+        data = serial.dumps(self.trees[0])
+        for bad in (b'', b'garbage' * 4, data[:-1], data + b'\x00',
+                    data[:serial.HEADER_SIZE + 4] + b'\xfe' + data[21:]):
+            self.assertRaises(serial.SerialFormatError, serial.loads, bad)
+        self.assertRaises(serial.SerialFormatError, serial.loads_text, 'ra1')
+        self.assertRaises(
+            serial.SerialFormatError, serial.loads_text, 'ra1 sin x')
+        self.assertRaises(serial.SerialFormatError, serial.loads_text, 'x')
+
+    def _file(self, record):
+        return (serial._header.pack(serial.MAGIC, serial.VERSION, 0, 1) +
+                serial._length.pack(len(record)) + record)
+
+    def test_depth(self):
+        deep = 'ra1 ' + 'tent ' * 5000 + 'x'
+        self.assertRaises(serial.SerialFormatError, serial.loads_text, deep)
+        self.assertRaises(serial.SerialFormatError, serial.loads,
+                          self._file(chr(7) * 5000 + chr(0)))
+        limit = serial.MAX_DEPTH - 1
+        tree = serial.loads_text('ra1 ' + 'tent ' * limit + 'x')
+        self.assertEqual(
+            serial.content_hash(
+                serial.loads(self._file(chr(7) * limit + chr(0)))),
+            serial.content_hash(tree))
+        for text in ('ra1 ' + 'tent ' * (limit + 1) + 'x',
+                     'ra1 ' + 'shared ' * (limit + 1) + 'x'):
+            self.assertRaises(
+                serial.SerialFormatError, serial.loads_text, text)
+        # hashing does not recurse
+        chain = VariableX()
+        for _ in xrange(5000):
+            chain = Tent(chain)
+        self.assertEqual(len(serial.content_hash(chain)), 64)
+
+    def test_lookup_params(self):
+        self.assertEqual(
+            serial.loads_text('ra1 lookup 1 16 x').size, 16)
+        for text in ('ra1 lookup 0 4000000000 x', 'ra1 lookup 0 0 x',
+                     'ra1 lookup 0 -3 x', 'ra1 lookup 2 16 x'):
+            self.assertRaises(
+                serial.SerialFormatError, serial.loads_text, text)
+        for (axis, size) in ((0, 1 << 25), (0, 0), (3, 16)):
+            record = struct.pack('<BBI', 12, axis, size) + chr(0)
+            self.assertRaises(
+                serial.SerialFormatError, serial.loads, self._file(record))
+
+    def test_create_image(self):
+        tree = self.trees[0]
+        from_pickle = memoryslab_create_image(
+            24, StringIO(pickle.dumps(tree)))
+        from_serial = memoryslab_create_image(
+            24, StringIO(serial.dumps(tree)))
+        self.assertEqual(from_pickle.target, from_serial.target)
@@ -0,0 +1,152 @@
+import httplib
+import threading
+import time
+import unittest
+from PIL import Image
+from cStringIO import StringIO
+from randomart import generate_seeded, _PILArt
+from randomart import serial
+from randomart.service import make_server
+from randomart.tests import seeded_trees
+
+
+class RenderServiceTestCase(unittest.TestCase):
+    size = 32
+
+    def setUp(self):
+        self.trees = seeded_trees(0x5eed, 2, (5, 40))
+        self.server = make_server(
+            port=0, quiet=True, processes=1, max_pending=2)
+        self.service = self.server.service
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        self.service.close()
+
+    def _request(self, method, path, body=None):
+        conn = httplib.HTTPConnection(*self.server.server_address)
+        try:
+            conn.request(method, path, body)
+            response = conn.getresponse()
+            return (response.status, response.read())
+        finally:
+            conn.close()
+
+    def _block_workers(self, seconds=0.5):
+        # occupy the single worker so that requests queue up behind it
+        self.service.pool.apply_async(time.sleep, (seconds, ))
+
+    def test_render(self):
+        tree = self.trees[0]
+        (status, png) = self._request(
+            'POST', '/render.png?size=%d' % self.size, serial.dumps(tree))
+        self.assertEqual(status, 200)
+        image = Image.open(StringIO(png))
+        self.assertEqual(image.size, (self.size, self.size))
+        reference = Image.new('RGB', (self.size, self.size))
+        art = _PILArt(reference)
+        art.set_art(tree)
+        art.compile()
+        art.redraw()
+        self.assertEqual(image.convert('RGB').tobytes(), reference.tobytes())
+
+    def test_stored_tile(self):
+        tree = self.trees[1]
+        (status, digest) = self._request(
+            'POST', '/art', serial.dumps_text(tree))
+        self.assertEqual(status, 201)
+        self.assertEqual(digest.strip(), serial.content_hash(tree))
+        (status, full) = self._request(
+            'GET', '/art/%s.png?size=%d' % (digest.strip(), self.size))
+        (status, png) = self._request(
+            'GET', '/art/%s.png?size=%d&tile=8,4,10,20' % (
+                digest.strip(), self.size))
+        self.assertEqual(status, 200)
+        tile = Image.open(StringIO(png)).convert('RGB')
+        self.assertEqual(tile.size, (10, 20))
+        expected = Image.open(StringIO(full)).convert('RGB').crop(
+            (8, 4, 18, 24))
+        self.assertEqual(tile.tobytes(), expected.tobytes())
+
+    def test_seed(self):
+        (status, png) = self._request('GET', '/seed/0x5eed.png?size=16')
+        self.assertEqual(status, 200)
+        digest = serial.content_hash(generate_seeded(0x5eed))
+        (status, stored) = self._request('GET', '/art/%s.png?size=16' % digest)
+        self.assertEqual(png, stored)
+        self.assertEqual(self._request('GET', '/seed/x.png?size=16')[0], 400)
+
+    def test_errors(self):
+        digest = serial.content_hash(self.trees[0])
+        self.assertEqual(
+            self._request('GET', '/art/%s.png?size=8' % digest)[0], 404)
+        self.assertEqual(self._request('POST', '/art', 'junk')[0], 400)
+        self.assertEqual(self._request(
+            'POST', '/render.png', serial.dumps(self.trees[0]))[0], 400)
+        self.assertEqual(self._request(
+            'POST', '/render.png?size=8&tile=4,4,8,8',
+            serial.dumps(self.trees[0]))[0], 400)
+        self.assertEqual(self._request('GET', '/nothing')[0], 404)
+
+    def test_hostile_bodies(self):
+        deep = 'ra1 ' + 'tent ' * 5000 + 'x'
+        self.assertEqual(self._request('POST', '/art', deep)[0], 400)
+        self.assertEqual(self._request(
+            'POST', '/art', serial.dumps(self.trees[0])[:-3])[0], 400)
+        lookup = 'ra1 lookup 0 %d x' % (self.service.max_size + 1)
+        self.assertEqual(self._request('POST', '/art', lookup)[0], 400)
+        self.assertEqual(
+            self._request('POST', '/art', 'ra1 lookup 0 64 x')[0], 201)
+        self.service.max_body = 100
+        self.assertEqual(self._request('POST', '/art', 'x' * 1000)[0], 413)
+        self.assertEqual(self.service.stats().renders, 0)
+
+    def _concurrently(self, requests):
+        results = [None] * len(requests)
+
+        def run(i, args):
+            results[i] = self._request(*args)
+        threads = [threading.Thread(target=run, args=(i, args))
+                   for (i, args) in enumerate(requests)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_coalescing(self):
+        digest = self.service.store(serial.dumps(self.trees[0]))
+        self._block_workers()
+        path = '/art/%s.png?size=%d' % (digest, self.size)
+        results = self._concurrently([('GET', path)] * 6)
+        self.assertEqual([status for (status, _) in results], [200] * 6)
+        self.assertEqual(len(set(png for (_, png) in results)), 1)
+        stats = self.service.stats()
+        self.assertEqual((stats.requests, stats.renders), (6, 1))
+        self.assertEqual(stats.coalesced, 5)
+
+    def test_timeout_frees_slot(self):
+        digest = self.service.store(serial.dumps(self.trees[0]))
+        self.service.timeout = 0.1
+        self._block_workers()
+        path = '/art/%s.png?size=%d' % (digest, self.size)
+        self.assertEqual(self._request('GET', path)[0], 504)
+        self.assertEqual(self.service._pending, {})
+        # the late callback of the timed out render leaves others alone
+        self.service.timeout = 5
+        self.assertEqual(self._request('GET', path)[0], 200)
+        self.assertEqual(self.service._pending, {})
+
+    def test_admission(self):
+        digest = self.service.store(serial.dumps(self.trees[0]))
+        self._block_workers()
+        results = self._concurrently([
+            ('GET', '/art/%s.png?size=%d' % (digest, size))
+            for size in (8, 9, 10)])
+        statuses = sorted(status for (status, _) in results)
+        self.assertEqual(statuses, [200, 200, 503])
+        self.assertEqual(self.service.stats().rejected, 1)
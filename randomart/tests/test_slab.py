@@ -0,0 +1,70 @@
+import os
+import random
+import shutil
+import struct
+import tempfile
+import unittest
+from array import array
+from cStringIO import StringIO
+from randomart import generate, MemorySlabArt
+from randomart.slab import (
+    open_slab, read_header, SlabFormatError,
+    HEADER_SIZE, VERSION, LAYOUT_PACKED_COLUMNS)
+
+
+class SlabTestCase(unittest.TestCase):
+    size = 19
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.art = MemorySlabArt(self.size)
+        self.art.set_art(generate(30, random.Random(0x5eed)))
+        self.art.reify()
+        self.art.redraw()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, data):
+        path = os.path.join(self.tmpdir, 'image.slab')
+        with open(path, 'wb') as fh:
+            fh.write(data)
+        return path
+
+    def test_header(self):
+        out = StringIO()
+        self.art.save(out)
+        data = out.getvalue()
+        self.assertEqual(len(data), HEADER_SIZE + 4 * self.size * self.size)
+        (version, layout, _, width, height, offset) = read_header(data)
+        self.assertEqual(
+            (version, layout, width, height, offset),
+            (VERSION, LAYOUT_PACKED_COLUMNS, self.size, self.size,
+             HEADER_SIZE))
+
+    def test_roundtrip(self):
+        out = StringIO()
+        self.art.save(out)
+        with open_slab(self._write(out.getvalue())) as slab:
+            self.assertEqual((slab.width, slab.height), (self.size, self.size))
+            self.assertEqual(list(slab.pixels), list(self.art.target))
+            self.assertEqual(slab.pixel(3, 5),
+                             self.art.target[3 * self.size + 5])
+
+    def test_legacy(self):
+        data = struct.pack('!II', self.size, self.size) + b''.join(
+            struct.pack('!I', p) for p in self.art.target)
+        with open_slab(self._write(data)) as slab:
+            self.assertEqual(slab.version, 0)
+            self.assertEqual(list(slab.pixels), list(self.art.target))
+
+    def test_truncated(self):
+        out = StringIO()
+        self.art.save(out)
+        with self.assertRaises(SlabFormatError):
+            open_slab(self._write(out.getvalue()[:-4]))
+
+    def test_size_mismatch(self):
+        from randomart.slab import save
+        with self.assertRaises(ValueError):
+            save(StringIO(), 2, 2, array('i', [0] * 3))
@@ -0,0 +1,69 @@
+import random
+import unittest
+from cStringIO import StringIO
+from randomart import (
+    generate, stream_create_image, BaseArt, MemorySlabArt)
+from randomart import serial
+from randomart.stream import write_png, write_slab
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+class StreamTestCase(unittest.TestCase):
+    size = 37
+
+    def setUp(self):
+        self.art = generate(40, random.Random(0x5eed))
+        self.reference = MemorySlabArt(self.size)
+        self.reference.set_art(self.art)
+        self.reference.redraw()
+
+    def _art(self, native):
+        art = BaseArt(self.size)
+        art.set_art(self.art)
+        if native:
+            art.reify()
+            self.reference.reify()
+            self.reference.redraw()
+        return art
+
+    def test_slab(self):
+        for native in (False, True):
+            out = StringIO()
+            write_slab(self._art(native), out, band_size=5)
+            expected = StringIO()
+            self.reference.save(expected)
+            self.assertEqual(out.getvalue(), expected.getvalue())
+
+    @unittest.skipIf(Image is None, "PIL is not available")
+    def test_png(self):
+        for native in (False, True):
+            out = StringIO()
+            write_png(self._art(native), out, band_size=5)
+            out.seek(0)
+            image = Image.open(out)
+            self.assertEqual(image.size, (self.size, self.size))
+            for x in range(self.size):
+                for y in range(self.size):
+                    packed = self.reference.target[x * self.size + y]
+                    self.assertEqual(
+                        image.getpixel((x, y)),
+                        (packed >> 16, (packed >> 8) & 0xff, packed & 0xff))
+
+    def test_create_image(self):
+        data = serial.dumps(self.art)
+        for backend in (None, 'reify', 'compile'):
+            out = StringIO()
+            stream_create_image(
+                self.size, out, 'slab', StringIO(data), 5, backend)
+            reference = MemorySlabArt(self.size)
+            reference.set_art(self.art)
+            if backend is not None:
+                getattr(reference, backend)()
+            reference.redraw()
+            expected = StringIO()
+            reference.save(expected)
+            self.assertEqual(out.getvalue(), expected.getvalue())
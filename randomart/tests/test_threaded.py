@@ -0,0 +1,37 @@
+import random
+import unittest
+from randomart import generate, MemorySlabArt
+from randomart.threaded import iter_bands
+
+
+class IterBandsTestCase(unittest.TestCase):
+    def test_covers_image(self):
+        self.assertEqual(
+            list(iter_bands(10, 4)),
+            [(0, 4), (4, 4), (8, 2)])
+
+
+class ThreadedRenderTestCase(unittest.TestCase):
+    size = 20
+
+    def setUp(self):
+        self.art = generate(30, random.Random(0x5eed))
+
+    def _art(self):
+        art = MemorySlabArt(self.size)
+        art.set_art(self.art)
+        art.reify()
+        return art
+
+    def test_matches_serial(self):
+        threaded = self._art()
+        threaded.redraw_threaded(threads=3, band_size=3)
+        serial = self._art()
+        serial.redraw()
+        self.assertEqual(threaded.target, serial.target)
+
+    def test_requires_reified(self):
+        art = MemorySlabArt(self.size)
+        art.set_art(self.art)
+        with self.assertRaises(ValueError):
+            art.redraw_threaded()
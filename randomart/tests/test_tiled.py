@@ -0,0 +1,40 @@
+import random
+import unittest
+from randomart import generate, MemorySlabArt
+from randomart.tiled import iter_tiles
+
+
+class IterTilesTestCase(unittest.TestCase):
+    def test_covers_image(self):
+        covered = set()
+        for (x0, y0, width, height) in iter_tiles(10, 4):
+            for x in range(x0, x0 + width):
+                for y in range(y0, y0 + height):
+                    self.assertNotIn((x, y), covered)
+                    covered.add((x, y))
+        self.assertEqual(len(covered), 100)
+
+
+class TiledRenderTestCase(unittest.TestCase):
+    size = 20
+
+    def setUp(self):
+        self.art = generate(30, random.Random(0x5eed))
+
+    def _render(self, native, tiled):
+        art = MemorySlabArt(self.size)
+        art.set_art(self.art)
+        if native:
+            art.reify()
+        if tiled:
+            art.redraw_tiled(tile_size=7, processes=2)
+        else:
+            art.redraw()
+        return art.target
+
+    def test_native(self):
+        self.assertEqual(self._render(True, True), self._render(True, False))
+
+    def test_python(self):
+        self.assertEqual(
+            self._render(False, True), self._render(False, False))
@@ -0,0 +1,64 @@
+"""Multi-threaded rendering of a reified art tree.
+
+The ctypes calls into librandomart release the GIL, so bands of the image
+can be rendered concurrently by threads sharing one output buffer and one
+native tree, without copying either into other processes.
+"""
+from ctypes import sizeof, c_int32
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+
+from . import formats
+
+
+DEFAULT_BAND_SIZE = 32
+
+
+def iter_bands(size, band_size=DEFAULT_BAND_SIZE):
+    '''Yield (start, length) spans of band_size rows or columns.'''
+    if band_size <= 0:
+        raise ValueError("band_size must be positive")
+    for start in xrange(0, size, band_size):
+        yield (start, min(band_size, size - start))
+
+
+def _band_renderer(info, size, out, layout):
+    # Bands run along the contiguous axis of each layout: rows for the
+    # row-major RGB buffer, columns for the column-major packed one.
+    # Returns the renderer and the extent bands are cut from.
+    (width, height) = formats.image_size(size)
+    if layout == 'rgb':
+        def render(band):
+            (y0, rows) = band
+            formats.render_rgb(
+                info, size, out, (0, y0, width, rows), y0 * width * 3)
+        return (render, height)
+    elif layout == 'packed':
+        def render(band):
+            (x0, columns) = band
+            formats.render_packed(
+                info, size, out, (x0, 0, columns, height),
+                x0 * height * sizeof(c_int32))
+        return (render, width)
+    raise ValueError("unknown band layout {!r}".format(layout))
+
+
+def render_bands(info, size, out, layout,
+                 threads=None, band_size=DEFAULT_BAND_SIZE):
+    '''Render the reified tree `info` into `out`, laid out as for
+    formats.render_rgb ('rgb') or formats.render_packed ('packed'), using
+    `threads` threads (one per CPU by default). size is as for
+    formats.render_rgb.'''
+    (render, extent) = _band_renderer(info, size, out, layout)
+    if threads is None:
+        threads = cpu_count()
+    if threads == 1:
+        for band in iter_bands(extent, band_size):
+            render(band)
+        return
+    pool = ThreadPool(threads)
+    try:
+        pool.map(render, list(iter_bands(extent, band_size)), chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,155 @@
+"""Tiled rendering across a pool of worker processes.
+
+The art tree is sent to each worker once, when the pool starts; afterwards
+only tile regions go out and rendered pixel data comes back, which the
+parent copies into the target with the art object's _draw_tile.
+"""
+from array import array
+from multiprocessing import Pool
+
+from . import formats
+
+
+DEFAULT_TILE_SIZE = 128
+
+# Per-process state, set up by _init_worker
+_worker_art = None
+_worker_layout = None
+
+
+def iter_tiles(size, tile_size=DEFAULT_TILE_SIZE):
+    '''Yield (x0, y0, width, height) regions covering an image of size, a
+    side length or a (width, height) pair.'''
+    if tile_size <= 0:
+        raise ValueError("tile_size must be positive")
+    (size_x, size_y) = formats.image_size(size)
+    for y0 in xrange(0, size_y, tile_size):
+        for x0 in xrange(0, size_x, tile_size):
+            yield (
+                x0, y0,
+                min(tile_size, size_x - x0),
+                min(tile_size, size_y - y0))
+
+
+def _native_backend(art_impl):
+    # Name of the BaseArt method that built art_impl.art_reified, or
+    # art_impl.art_compiled
+    if art_impl.art_reified is None:
+        if art_impl.art_compiled is not None:
+            return 'compile_python'
+        return None
+    if isinstance(art_impl.art_reified, formats.ra_program):
+        return 'compile'
+    return 'reify'
+
+
+def default_backend():
+    '''The fastest BaseArt method to prepare art with: 'compile' if
+    librandomart is loaded, 'compile_python' if not.'''
+    from .transforms import librandomart
+    if librandomart is not None:
+        return 'compile'
+    return 'compile_python'
+
+
+def _init_worker(art, size, backend, layout):
+    global _worker_art, _worker_layout
+    from . import BaseArt
+    _worker_art = BaseArt(*formats.image_size(size))
+    _worker_art.set_art(art)
+    if backend is not None:
+        getattr(_worker_art, backend)()
+    _worker_layout = layout
+
+
+def render_tile(art_impl, region, layout):
+    '''Render one region of art_impl. With layout 'rgb' the result is
+    row-major RGB bytes, with 'packed' a column-major array('i') of packed
+    RGB values, matching formats.render_rgb and formats.render_packed.'''
+    (x0, y0, width, height) = region
+    reified = art_impl.art_reified
+    if layout == 'rgb':
+        out = bytearray(width * height * 3)
+        if reified is not None:
+            formats.render_rgb(
+                reified, (art_impl.width, art_impl.height), out, region)
+        else:
+            i = 0
+            for y in xrange(y0, y0 + height):
+                for x in xrange(x0, x0 + width):
+                    px_color = art_impl.get_pixel((x, y), 1).to_color()
+                    out[i:i + 3] = px_color.to_tuple()
+                    i += 3
+        return bytes(out)
+    elif layout == 'packed':
+        out = array('i', [0]) * (width * height)
+        if reified is not None:
+            formats.render_packed(
+                reified, (art_impl.width, art_impl.height), out, region)
+        else:
+            i = 0
+            for x in xrange(x0, x0 + width):
+                for y in xrange(y0, y0 + height):
+                    px_color = art_impl.get_pixel((x, y), 1).to_color()
+                    out[i] = px_color.pack_rgb()
+                    i += 1
+        return out
+    raise ValueError("unknown tile layout {!r}".format(layout))
+
+
+def _render_worker_tile(region):
+    return (region, render_tile(_worker_art, region, _worker_layout))
+
+
+def render_tiled(art_impl, tile_size=DEFAULT_TILE_SIZE, processes=None):
+    '''Render art_impl in tiles on a pool of `processes` workers (one per
+    CPU by default), drawing each finished tile into art_impl.'''
+    backend = _native_backend(art_impl)
+    size = (art_impl.width, art_impl.height)
+    pool = Pool(
+        processes, _init_worker,
+        (art_impl.art, size, backend, art_impl.tile_layout))
+    try:
+        tiles = iter_tiles(size, tile_size)
+        for (region, data) in pool.imap_unordered(_render_worker_tile, tiles):
+            art_impl._draw_tile(region, data)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def _init_mapped_worker(art, path, backend):
+    global _worker_art
+    from . import MappedSlabArt
+    _worker_art = MappedSlabArt(path)
+    _worker_art.set_art(art)
+    if backend is not None:
+        getattr(_worker_art, backend)()
+
+
+def _render_mapped_tile(index):
+    _worker_art.draw_tile(index)
+    return index
+
+
+def render_tiled_mapped(art_impl, processes=None):
+    '''Render the missing tiles of a MappedSlabArt on a pool of workers
+    that each map the same slab and write their tiles into it directly.'''
+    art_impl.flush()
+    backend = _native_backend(art_impl)
+    pool = Pool(
+        processes, _init_mapped_worker,
+        (art_impl.art, art_impl.path, backend))
+    try:
+        for _ in pool.imap_unordered(
+                _render_mapped_tile, art_impl.missing_tiles()):
+            pass
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
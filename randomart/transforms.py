@@ -2,7 +2,13 @@ import ctypes
 import os
 import math
 
-from .formats import qcolor
+from . import profiling
+from .formats import qcolor, qcolor_soa
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 # Shared library loader
@@ -39,7 +45,7 @@ def _ll_loadcomonent(symbol_name, argtypes):
     return impl
 
 
-def _loadcomponent(python_function, symbol_name, argtypes):
+def _selectcomponent(python_function, symbol_name, argtypes):
     if bool(int(os.environ.get('RA_NONATIVE', '0'))):
         return python_function
     if symbol_name in blacklist_natives:
@@ -52,6 +58,16 @@ def _loadcomponent(python_function, symbol_name, argtypes):
     return impl
 
 
+def _loadcomponent(python_function, symbol_name, argtypes):
+    impl = _selectcomponent(python_function, symbol_name, argtypes)
+    if profiling.ENABLED:
+        name = python_function.__name__
+        if impl is not python_function:
+            name = symbol_name
+        return profiling.timed_component(name, impl)
+    return impl
+
+
 # Utility functions
 
 def _well(x):
@@ -164,7 +180,297 @@ level_impl = _loadcomponent(
     ))
 
 
+# Batch implementations
+#
+# These mirror the scalar implementations over n points, taking each color
+# as an (r, g, b) tuple of buffers of n doubles: one-dimensional float64
+# NumPy arrays or array('d'). Results are written into the buffers of `out`,
+# which may be those of an input. The native versions read and write the
+# buffers in place, without copying them, and also take contiguous NumPy
+# arrays of any shape.
+
+def _channel(buf):
+    # (length, address) of a buffer of doubles
+    if numpy is not None and isinstance(buf, numpy.ndarray):
+        if buf.dtype.char != 'd' or not buf.flags.c_contiguous:
+            raise ValueError("channels must be contiguous float64 arrays")
+        try:
+            # much quicker than buf.ctypes.data, but needs a writable buffer
+            address = ctypes.addressof(ctypes.c_char.from_buffer(buf))
+        except (TypeError, ValueError):
+            address = buf.__array_interface__['data'][0]
+        return (buf.size, address)
+    if getattr(buf, 'typecode', None) != 'd':
+        raise ValueError("channels must be float64 arrays or array('d')")
+    (address, length) = buf.buffer_info()
+    return (length, address)
+
+
+def _batch_factory(natfunc):
+    def batch(*args):
+        n = None
+        native_args = []
+        for arg in args:
+            if isinstance(arg, tuple):
+                channels = [_channel(buf) for buf in arg]
+                arg = qcolor_soa(
+                    (channels[0][1], channels[1][1], channels[2][1]))
+            elif isinstance(arg, (int, long, float)):
+                channels = ()
+            else:
+                channels = [_channel(arg)]
+                arg = channels[0][1]
+            for (size, _) in channels:
+                if n is None:
+                    n = size
+                elif size != n:
+                    raise ValueError("buffers differ in size")
+            native_args.append(arg)
+        natfunc(n or 0, *native_args)
+    return batch
+
+
+_batch_symbols = []
+_native_batches = []
+
+
+def _loadbatch(python_function, symbol_name, argtypes):
+    _batch_symbols.append(symbol_name)
+    if bool(int(os.environ.get('RA_NONATIVE', '0'))):
+        impl = python_function
+    elif symbol_name in blacklist_natives:
+        impl = python_function
+    else:
+        impl = _ll_loadcomonent(symbol_name, (ctypes.c_size_t, ) + argtypes)
+        if impl is None:
+            impl = python_function
+        else:
+            impl = _batch_factory(impl)
+            _native_batches.append(symbol_name)
+    if profiling.ENABLED:
+        name = python_function.__name__
+        if impl is not python_function:
+            name = symbol_name
+        return profiling.timed_component(name, impl)
+    return impl
+
+
+def _py_average_batch(c1, c2, weight, out):
+    for (a, b, d) in zip(c1, c2, out):
+        for i in xrange(len(d)):
+            d[i] = weight * a[i] + (1 - weight) * b[i]
+
+
+average_batch = _loadbatch(
+    _py_average_batch,
+    'qcolor_average_n', (
+        qcolor_soa, qcolor_soa,
+        ctypes.c_double,
+        qcolor_soa
+    ))
+
+
+def _py_average_weights_batch(c1, c2, weights, out):
+    for (a, b, d) in zip(c1, c2, out):
+        for i in xrange(len(d)):
+            d[i] = weights[i] * a[i] + (1 - weights[i]) * b[i]
+
+
+average_weights_batch = _loadbatch(
+    _py_average_weights_batch,
+    'qcolor_average_weights_n', (
+        qcolor_soa, qcolor_soa,
+        ctypes.c_void_p,
+        qcolor_soa
+    ))
+
+
+def _py_tent_batch(c1, out):
+    for (a, d) in zip(c1, out):
+        for i in xrange(len(d)):
+            d[i] = _tent(a[i])
+
+
+tent_batch = _loadbatch(
+    _py_tent_batch,
+    'qcolor_tent_n', (
+        qcolor_soa, qcolor_soa
+    ))
+
+
+def _py_well_batch(c1, out):
+    for (a, d) in zip(c1, out):
+        for i in xrange(len(d)):
+            d[i] = _well(a[i])
+
+
+well_batch = _loadbatch(
+    _py_well_batch,
+    'qcolor_well_n', (
+        qcolor_soa, qcolor_soa
+    ))
+
+
+def _py_prod_batch(c1, c2, out):
+    for (a, b, d) in zip(c1, c2, out):
+        for i in xrange(len(d)):
+            d[i] = a[i] * b[i]
+
+
+prod_batch = _loadbatch(
+    _py_prod_batch,
+    'qcolor_product_n', (
+        qcolor_soa, qcolor_soa,
+        qcolor_soa
+    ))
+
+
+def _py_mod_batch(c1, c2, out):
+    # like qcolor_mod in librandomart and grid_mod_impl, unlike _py_mod_impl
+    zeroish = 0.0001
+    for i in xrange(len(out[0])):
+        divisors = [b[i] for b in c2]
+        if min(divisors) < zeroish:
+            values = [0.0, 0.0, 0.0]
+        else:
+            values = [math.fmod(a[i], b) for (a, b) in zip(c1, divisors)]
+        for (d, value) in zip(out, values):
+            d[i] = value
+
+
+mod_batch = _loadbatch(
+    _py_mod_batch,
+    'qcolor_mod_n', (
+        qcolor_soa, qcolor_soa,
+        qcolor_soa
+    ))
+
+
+def _py_sin_batch(c, phase, freq, out):
+    for (a, d) in zip(c, out):
+        for i in xrange(len(d)):
+            d[i] = math.sin(phase + freq * a[i])
+
+
+sin_batch = _loadbatch(
+    _py_sin_batch,
+    'qcolor_sin_n', (
+        qcolor_soa, ctypes.c_double, ctypes.c_double,
+        qcolor_soa
+    ))
+
+
+def _py_level_batch(threshold, c1, c2, c3, out):
+    for (l, a, b, d) in zip(c1, c2, c3, out):
+        for i in xrange(len(d)):
+            d[i] = a[i] if l[i] < threshold else b[i]
+
+
+level_batch = _loadbatch(
+    _py_level_batch,
+    'qcolor_level_n', (
+        ctypes.c_double,
+        qcolor_soa, qcolor_soa, qcolor_soa,
+        qcolor_soa
+    ))
+
+
+# Whole-grid implementations
+#
+# These operate on colors represented as (r, g, b) tuples of equally shaped
+# NumPy arrays, so that an entire image can be evaluated with one walk of the
+# expression tree. They mirror the scalar implementations above, and run on
+# the native batch implementations when those are loaded.
+
+_native_grid = numpy is not None and _native_batches == _batch_symbols
+
+# Below this many points NumPy's own operations are as fast, as each batch
+# call costs some 20us in ctypes
+_GRID_BATCH_MIN = 4096
+
+
+def _use_batch(c):
+    return _native_grid and c[0].size >= _GRID_BATCH_MIN
+
+
+def _grid_batch(batch, *args):
+    # the batch implementation's result for grid colors among args
+    like = None
+    batch_args = []
+    for arg in args:
+        if isinstance(arg, tuple):
+            arg = tuple(numpy.ascontiguousarray(a, dtype=float) for a in arg)
+            like = arg[0]
+        batch_args.append(arg)
+    out = (numpy.empty_like(like), numpy.empty_like(like),
+           numpy.empty_like(like))
+    batch(*(batch_args + [out]))
+    return out
+
+def grid_constant_impl(c, like):
+    return (
+        numpy.full(like.shape, c.r),
+        numpy.full(like.shape, c.g),
+        numpy.full(like.shape, c.b))
+
+
+def grid_average_impl(c1, c2, weight):
+    if _use_batch(c1):
+        if numpy.ndim(weight) == 0:
+            return _grid_batch(average_batch, c1, c2, float(weight))
+        weight = numpy.ascontiguousarray(weight, dtype=float)
+        return _grid_batch(average_weights_batch, c1, c2, weight)
+    return tuple(weight * a + (1 - weight) * b for (a, b) in zip(c1, c2))
+
+
+def grid_tent_impl(c1):
+    if _use_batch(c1):
+        return _grid_batch(tent_batch, c1)
+    return tuple(1 - 2 * numpy.abs(a) for a in c1)
+
+
+def grid_well_impl(c1):
+    if _use_batch(c1):
+        return _grid_batch(well_batch, c1)
+    return tuple(1 - 2 / (1 + a * a) ** 8 for a in c1)
+
+
+def grid_prod_impl(c1, c2):
+    if _use_batch(c1):
+        return _grid_batch(prod_batch, c1, c2)
+    return tuple(a * b for (a, b) in zip(c1, c2))
+
+
+def grid_mod_impl(c1, c2):
+    if _use_batch(c1):
+        return _grid_batch(mod_batch, c1, c2)
+    zeroish = 0.0001
+    degenerate = (c2[0] < zeroish) | (c2[1] < zeroish) | (c2[2] < zeroish)
+    out = []
+    for (a, b) in zip(c1, c2):
+        safe_b = numpy.where(degenerate, 1.0, b)
+        out.append(numpy.where(degenerate, 0.0, numpy.fmod(a, safe_b)))
+    return tuple(out)
+
+
+def grid_sin_impl(c, phase, freq):
+    if _use_batch(c):
+        return _grid_batch(sin_batch, c, phase, freq)
+    return tuple(numpy.sin(phase + freq * a) for a in c)
+
+
+def grid_level_impl(threshold, c1, c2, c3):
+    if _use_batch(c1):
+        return _grid_batch(level_batch, threshold, c1, c2, c3)
+    return tuple(
+        numpy.where(a < threshold, b, c) for (a, b, c) in zip(c1, c2, c3))
+
+
 __all__ = """
     average_impl tent_impl well_impl prod_impl mod_impl
     sin_impl level_impl
+    average_batch average_weights_batch tent_batch well_batch prod_batch
+    mod_batch sin_batch level_batch
+    grid_constant_impl grid_average_impl grid_tent_impl grid_well_impl
+    grid_prod_impl grid_mod_impl grid_sin_impl grid_level_impl
 """.split()
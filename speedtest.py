@@ -1,12 +1,15 @@
 #!/usr/bin/python
-from itertools import count
+from time import time
 from randomart import memoryslab_create_image
 from cStringIO import StringIO
 
 
 with open('testspeed.art.pickle', 'rb') as artfh:
-    with open('/dev/null', 'w+') as fh:
-        out = StringIO()
-        memoryslab_create_image(1024, artfh).save(out)
-        print("len = %d" % out.tell())
-
+    out = StringIO()
+    t_i = time()
+    art_impl = memoryslab_create_image(1024, artfh)
+    t_m = time()
+    art_impl.save(out)
+    t_f = time()
+    print("len = %d" % out.tell())
+    print("rendered in %gs, saved in %gs" % (t_m - t_i, t_f - t_m))